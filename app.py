@@ -1,58 +1,171 @@
-import requests
-import pandas as pd
-import plotly.express as px
 import folium
-from folium.plugins import HeatMap
 import streamlit as st
-from streamlit_folium import folium_static
-
-
-traducao = {
-    'ACIDENT_MINOR': 'Acidente Menor',
-    'ACCIDENT_MAJOR': 'Acidente Maior',
-    'NO_SUBTYPE': 'Sem Subtipo',
-    'JAM_MODERATE_TRAFFIC': 'Tráfego Moderado',
-    'JAM_HEAVY_TRAFFIC': 'Tráfego Intenso',
-    'JAM_STAND_STILL_TRAFFIC': 'Tráfego Parado',
-    'JAM_LIGHT_TRAFFIC': 'Tráfego Leve',
-    'HAZARD_ON_ROAD': 'Perigo na Estrada',
-    'HAZARD_ON_SHOULDER': 'Perigo no Acostamento',
-    'HAZARD_WEATHER': 'Condições Climáticas Adversas',
-    'HAZARD_ON_ROAD_OBJECT': 'Objeto na Estrada',
-    'HAZARD_ON_ROAD_POT_HOLE': 'Buraco na Estrada',
-    'HAZARD_ON_ROAD_ROAD_KILL': 'Animal Morto na Estrada',
-    'HAZARD_ON_SHOULDER_CAR_STOPPED': 'Carro Parado no Acostamento',
-    'HAZARD_ON_SHOULDER_ANIMALS': 'Animais no Acostamento',
-    'HAZARD_ON_SHOULDER_MISSING_SIGN': 'Placa Faltando no Acostamento',
-    'HAZARD_WEATHER_FOG': 'Nevoeiro',
-    'HAZARD_WEATHER_HAIL': 'Granizo',
-    'HAZARD_WEATHER_HEAVY_RAIN': 'Chuva Intensa',
-    'HAZARD_WEATHER_HEAVY_SNOW': 'Neve Intensa',
-    'HAZARD_WEATHER_FLOOD': 'Enchente',
-    'HAZARD_WEATHER_MONSOON': 'Monção',
-    'HAZARD_WEATHER_TORNADO': 'Tornado',
-    'HAZARD_WEATHER_HEAT_WAVE': 'Onda de Calor',
-    'HAZARD_WEATHER_HURRICANE': 'Furacão',
-    'HAZARD_WEATHER_FREEZING_RAIN': 'Chuva Congelante',
-    'HAZARD_ON_ROAD_LANE_CLOSED': 'Faixa Fechada na Estrada',
-    'HAZARD_ON_ROAD_OIL': 'Óleo na Estrada',
-    'HAZARD_ON_ROAD_ICE': 'Gelo na Estrada',
-    'HAZARD_ON_ROAD_CONSTRUCTION': 'Obra na Estrada',
-    'HAZARD_ON_ROAD_CAR_STOPPED': 'Carro Parado na Estrada',
-    'HAZARD_ON_ROAD_TRAFFIC_LIGHT_FAULT': 'Semáforo com Defeito',
-    'ROAD_CLOSED_HAZARD': 'Via Fechada por Perigo',
-    'ROAD_CLOSED_CONSTRUCTION': 'Via Fechada por Obras',
-    'ROAD_CLOSED_EVENT': 'Via Fechada por Evento'
-}
-
-traducao_tipo = {
-    'JAM': 'Engarrafamento',
-    'ACCIDENT': 'Acidente',
-    'ROAD_CLOSED': 'Estrada Fechada',
-    'HAZARD': 'Perigo'
-}
+import streamlit.components.v1 as components
+from streamlit.errors import StreamlitAPIException
+from streamlit_folium import st_folium
+
+from waze import config
+from waze.arcgis import baixar_camada
+from waze.autenticacao import GerenciadorToken
+from waze.cache import cache_camadas, chave_camada
+from waze.camadas import ALERTAS, CAMADAS, ENGARRAFAMENTOS
+from waze.consolidacao import obter_consolidados
+from waze.diagnostico import configurar_log, etapas, iniciar_rodada, medir, resumo
+from waze.estatisticas import CAMPOS_ALERTAS, CAMPOS_ENGARRAFAMENTOS, obter_motor_servidor
+from waze.malha import obter_malha
+from waze.metricas import obter_motor
+from waze.paineis import (CENTRO_ALERTAS, CENTRO_ENGARRAFAMENTOS, camada_alertas, camada_engarrafamentos_filtrados,
+                          MEDIDAS_TENDENCIA, cards_alertas, cards_engarrafamentos, cards_tendencia,
+                          comprimento_total_km, faixas_comprimento, figura_categorias, figura_comprimentos,
+                          figura_subtipos, figura_tendencia, mapa_base, tabela_trechos_alertas,
+                          tabela_trechos_engarrafamentos)
+from waze.series import obter_serie
+from waze.snapshot import idade_segundos, obter_leitor
+from waze.vista import ajustar_envelope, envelope_do_retorno, envelope_inicial
+
+
 st.set_page_config(layout="wide")
 
+# Logs no nível de WAZE_LOG_NIVEL; as etapas medidas nesta execução do script ficam nesta rodada
+configurar_log()
+rodada = iniciar_rodada()
+
+
+# Token único do processo, usado pelas duas páginas e renovado perto de expirar
+@st.cache_resource
+def obter_gerenciador_token():
+    # Credenciais de login
+    return GerenciadorToken(st.secrets["API"]["user"], st.secrets["API"]["password"])
+
+
+# Lendo só as cópias do coletor externo, o app não consulta o servidor nem precisa de credenciais
+# (a não ser no modo agregado, em que as estatísticas vêm do servidor)
+tokens = obter_gerenciador_token() if config.MODO_AGREGADO or not config.COLETOR_EXTERNO else None
+
+
+# Linhas da camada, compartilhadas por todas as sessões; quando o cache expira, só o que mudou é baixado.
+# Com o coletor externo, apenas a última cópia que ele publicou, sem consultar o servidor.
+def carregar_camada(camada):
+    if config.COLETOR_EXTERNO:
+        dados, _ = obter_leitor(camada.nome).atual()
+        if dados is None:
+            st.info("Aguardando a primeira coleta dos dados (python -m waze.coletor).")
+            st.stop()
+        return dados
+    return cache_camadas.obter(chave_camada(camada.url, camada.campos), sincronizar(camada))
+
+
+def sincronizar(camada):
+    sincronizador = camada.sincronizador()
+    return lambda: sincronizador.atualizar(tokens)
+
+
+# As duas camadas começam a carregar juntas, em segundo plano, já na primeira execução (e de novo
+# quando o cache expira): a página aberta espera só pela sua e a troca de página encontra a outra pronta.
+# No modo agregado as linhas só vêm com o mapa; com o coletor externo, as cópias já estão em disco.
+def precarregar_camadas():
+    if config.COLETOR_EXTERNO or config.MODO_AGREGADO:
+        return
+    for camada in CAMADAS:
+        cache_camadas.precarregar(chave_camada(camada.url, camada.campos), sincronizar(camada))
+
+
+precarregar_camadas()
+
+
+# Quando os dados vêm do coletor externo, a idade da cópia em uso (um coletor parado deixa de atualizá-la)
+def exibir_idade_dados(camada):
+    if config.COLETOR_EXTERNO and obter_leitor(camada.nome).entrada is not None:
+        idade = idade_segundos(obter_leitor(camada.nome).entrada)
+        st.sidebar.caption(f"Dados coletados há {idade / 60:.0f} min")
+
+
+# Só os registros que tocam o envelope, por consulta espacial ao servidor (cada envelope fica no cache)
+def carregar_envelope(camada, envelope, where="1=1"):
+    return cache_camadas.obter(
+        (*chave_camada(camada.url, camada.campos), where, envelope),
+        lambda: camada.preparar(baixar_camada(camada.url, camada.campos, tokens, where=where, envelope=envelope))
+    )
+
+
+# Envelope e zoom da área visível do mapa interativo (ou da vista inicial, antes de qualquer interação)
+def vista_do_mapa(chave, centro, zoom):
+    vista = st.session_state.get(chave)
+    if vista is None:
+        return ajustar_envelope(envelope_inicial(centro, zoom, 1400, 800), zoom), zoom
+    return vista
+
+
+# Mapa interativo: os dados vão num grupo à parte, trocado sem recriar o mapa. Quando a área
+# visível muda, guarda a nova vista e roda de novo só a seção do mapa para carregar o que ficou visível.
+def exibir_mapa_interativo(mapa, grupo, chave, chave_vista):
+    with medir("mapa.st_folium"):
+        retorno = st_folium(mapa, key=chave, width=1400, height=800,
+                            returned_objects=["bounds", "zoom"], feature_group_to_add=grupo)
+    envelope = envelope_do_retorno(retorno)
+    if envelope is None or retorno.get("zoom") is None:
+        return
+    vista = (ajustar_envelope(envelope, retorno["zoom"]), retorno["zoom"])
+    if vista != st.session_state.get(chave_vista):
+        st.session_state[chave_vista] = vista
+        try:
+            st.rerun(scope="fragment")
+        except StreamlitAPIException:
+            # Na execução da página inteira (ex.: logo após trocar um filtro) só dá para rodar tudo
+            st.rerun()
+
+
+# Mapa estático: o HTML é gerado aqui (como no folium_static) para medir o tempo e o tamanho enviado
+def exibir_mapa_estatico(mapa):
+    with medir("mapa.html") as atributos:
+        html = folium.Figure().add_child(mapa).render()
+        atributos["bytes"] = len(html.encode("utf-8"))
+    components.html(html, height=810, width=1400)
+
+
+def exibir_grafico(fig):
+    with medir("grafico.render"):
+        st.plotly_chart(fig)
+
+
+# Cards em linhas de três colunas; devolve as colunas, para completar algum card
+def exibir_cards(linhas):
+    todas = []
+    for linha in linhas:
+        colunas = st.columns(3)
+        for coluna, card in zip(colunas, linha):
+            with coluna:
+                if card.delta is None:
+                    st.metric(label=card.rotulo, value=card.valor)
+                else:
+                    st.metric(label=card.rotulo, value=card.valor, delta=card.delta, delta_color='inverse')
+        todas.append(colunas)
+    return todas
+
+
+# Filtros ativos (coluna -> valor) a partir do que está escolhido em cada selectbox
+def filtros_escolhidos(chaves):
+    return {coluna: st.session_state[chave] for coluna, chave in chaves.items()
+            if st.session_state.get(chave, "Todos") != "Todos"}
+
+
+# Selectbox que oferece só os valores presentes com os demais filtros, com a contagem de cada um
+def filtro_em_cascata(rotulo, motor, coluna, chave, filtros):
+    contagens = motor.opcoes(coluna, filtros)
+    atual = filtros.get(coluna, "Todos")
+    opcoes = ["Todos"] + list(contagens)
+    # A escolha atual continua na lista mesmo sem ocorrências com os outros filtros
+    if atual not in opcoes:
+        opcoes.append(atual)
+    # Quando as opções mudam o Streamlit recria o widget; o index mantém a escolha
+    return st.sidebar.selectbox(
+        rotulo,
+        options=opcoes,
+        index=opcoes.index(atual),
+        format_func=lambda valor: valor if valor == "Todos" else f"{valor} ({contagens.get(valor, 0)})",
+        key=chave
+    )
+
 # Filtro - PAGINA
 pagina = st.sidebar.selectbox("Escolha a Página", ["Página 1: Geral", "Página 2: Engarrafamentos"])
 if pagina == "Página 1: Geral":
@@ -77,154 +190,38 @@ if pagina == "Página 1: Geral":
     )
     
 
-    fields = [
-        'objectid', 'type', 'subtype', 'rodovia', 'mesorregiao', 'municipio',
-        'regional', 'jurisdicao', 'x', 'y'
-    ]
-
-    
-
-    # Parâmetros para consultar o FeatureLayer
-    query_params = {
-        "where": "1=1",  # Consulta para retornar todos os dados
-        "outFields": ",".join(fields),  # Retornar todos os campos
-        "returnGeometry": "true",  # Incluir geometria dos objetos
-        "f": "json",  # Formato da resposta (JSON)
-        "token": token,  # Token de autenticação
-        "resultRecordCount": 2000,  # Máximo de registros por página
-        "resultOffset": 0  # Offset inicial (começa no primeiro registro)
-    }
-
-    all_data = []  # Lista para armazenar todos os dados
-
-    # Paginação para obter todos os dados
-    while True:
-        response = requests.get(feature_layer_url, params=query_params)
-        if response.status_code == 200:
-            data = response.json()  # Parse do JSON
-            features = data.get("features", [])
-            
-            if not features:
-                break  # Se não houver mais dados, parar o loop
-            
-            # Extrair atributos e adicionar à lista all_data
-            attributes = [feature["attributes"] for feature in features]
-            all_data.extend(attributes)
-            
-            # Atualizar o offset para a próxima página
-            query_params["resultOffset"] += query_params["resultRecordCount"]
-        else:
-            print(f"Erro na requisição dos dados: {response.status_code}")
-            break
-
-    # Transformar os dados em DataFrame
-    dados = pd.DataFrame(all_data)
+    # Alertas repetidos (mesmo tipo e subtipo, próximos) contados uma vez só, com os relatos somados
+    consolidar = not config.MODO_AGREGADO and st.sidebar.checkbox(
+        "Agrupar alertas repetidos", value=config.CONSOLIDAR_ALERTAS, key='alertas_consolidar')
 
-    dados['subtype'] = dados['subtype'].astype(str)
-    dados['regional'] = dados['regional'].astype(str)
-    dados['subtype'] = dados['subtype'].replace(traducao)
-    dados['type'] = dados['type'].replace(traducao_tipo)
+    def carregar_alertas():
+        dados = carregar_camada(ALERTAS)
+        return obter_consolidados(dados) if consolidar else dados
 
-    # Seleção e renomeação de colunas
-    dados = dados[['objectid', 'type', 'subtype', 'rodovia', 'mesorregiao', 'municipio', 'regional', 'jurisdicao', 'x', 'y']].rename(
-        columns={
-            'objectid': 'Alerta', 'type': 'Tipo de Alerta', 'subtype': 'Subtipo de Alerta',
-            'rodovia': 'Rodovia', 'mesorregiao': 'Mesorregião', 'municipio': 'Município',
-            'regional': 'Regional', 'jurisdicao': 'Jurisdição', 'x': 'Longitude', 'y': 'Latitude'})
+    if config.MODO_AGREGADO:
+        # Contagens calculadas pelo servidor; as linhas só são baixadas para o mapa
+        motor = obter_motor_servidor(ALERTAS.url, CAMPOS_ALERTAS, tokens)
+    else:
+        motor = obter_motor(carregar_alertas())
+    exibir_idade_dados(ALERTAS)
 
     
 
     # Filtros - Sidebar
     st.sidebar.header("Filtros")
-    type_filter = st.sidebar.selectbox(
-        "Filtro por Tipo",
-        options=["Todos"] + list(dados['Tipo de Alerta'].dropna().unique())
-    )
-    subtype_filter = st.sidebar.selectbox(
-        "Filtro por Subtipo",
-        options=["Todos"] + list(dados['Subtipo de Alerta'].dropna().unique())
-    )
-    regional_filter = st.sidebar.selectbox(
-        "Filtro por Regional",
-        options=["Todos"] + list(dados['Regional'].dropna().unique())
-    )
-
-    # Aplicando os filtros
-    filtered_data = dados.copy()
-    if type_filter != "Todos":
-        filtered_data = filtered_data[filtered_data['Tipo de Alerta'] == type_filter]
-    if subtype_filter != "Todos":
-        filtered_data = filtered_data[filtered_data['Subtipo de Alerta'] == subtype_filter]
-    if regional_filter != "Todos":
-        filtered_data = filtered_data[filtered_data['Regional'] == regional_filter]
-
-    # Cálculo das métricas
-    if not filtered_data.empty:
-        # Rodovia com maior número de buracos
-        rodovia_com_mais_ocorrencias = (
-            filtered_data['Rodovia']
-            .value_counts()
-            .idxmax() if not filtered_data.empty else "N/A"
-        )
-        total_ocorrencias_rodovia = (
-            filtered_data['Rodovia']
-            .value_counts()
-            .max() if not filtered_data.empty else 0
-        )
-        # Regional com maior número de ocorrências
-        regional_com_mais_ocorrencias = (
-            filtered_data['Regional']
-            .value_counts()
-            .idxmax() if not filtered_data.empty else "N/A"
-        )
-        total_ocorrencias_regional = (
-            filtered_data['Regional']
-            .value_counts()
-            .max() if not filtered_data.empty else 0
-        )
-        # Municipio com maior número de ocorrências
-        municipio_com_mais_ocorrencias = (
-            filtered_data['Município']
-            .value_counts()
-            .idxmax() if not filtered_data.empty else "N/A"
-        )
-        total_ocorrencias_municipio = (
-            filtered_data['Município']
-            .value_counts()
-            .max() if not filtered_data.empty else 0
-        )
-        # Jurisdição com maior número de ocorrências
-        jurisdicao_com_mais_ocorrencias = (
-            filtered_data['Jurisdição']
-            .value_counts()
-            .idxmax() if not filtered_data.empty else "N/A"
-        )
-        total_ocorrencias_jurisdicao = (
-            filtered_data['Jurisdição']
-            .value_counts()
-            .max() if not filtered_data.empty else 0
-        )
-        # Mesorregião com maior número de ocorrências
-        mesorregiao_com_mais_ocorrencias = (
-            filtered_data['Mesorregião']
-            .value_counts()
-            .idxmax() if not filtered_data.empty else "N/A"
-        )
-        total_ocorrencias_mesorregiao = (
-            filtered_data['Mesorregião']
-            .value_counts()
-            .max() if not filtered_data.empty else 0
-        )
-
-
-        # Total de alertas no filtro
-        total_alertas = len(filtered_data)
+    filtros = filtros_escolhidos({'Tipo de Alerta': 'alertas_tipo', 'Subtipo de Alerta': 'alertas_subtipo',
+                                  'Regional': 'alertas_regional'})
+    filtro_em_cascata("Filtro por Tipo", motor, 'Tipo de Alerta', 'alertas_tipo', filtros)
+    filtro_em_cascata("Filtro por Subtipo", motor, 'Subtipo de Alerta', 'alertas_subtipo', filtros)
+    filtro_em_cascata("Filtro por Regional", motor, 'Regional', 'alertas_regional', filtros)
 
+    # Cálculo das métricas (memorizadas por combinação de filtros):
+    # total de alertas no filtro e campeões de cada dimensão
+    total_alertas, cards = cards_alertas(motor, filtros)
 
-        
+    if total_alertas:
         # Exibindo os cards
         st.subheader("Resumo das Ocorrências")
-        col1, col2, col3 = st.columns(3)
 
         st.write(
         """
@@ -236,129 +233,59 @@ if pagina == "Página 1: Geral":
         """,
         unsafe_allow_html=True,
         )
-        
-        with col1:
-            st.metric(
-                label="Total de Alertas",
-                value=f"{total_alertas} ocorrências ⚠️"
-            )
-        with col2:
-            st.metric(
-                label="Regional com Mais Ocorrências",
-                value=f"{regional_com_mais_ocorrencias} 📝",
-                delta=f"{total_ocorrencias_regional} ocorrências",
-                delta_color='inverse'
-            )
-        with col3:
-            st.metric(
-                label="Mesorregião com Mais Ocorrências",
-                value=f"{mesorregiao_com_mais_ocorrencias} 🗺️",
-                delta=f"{total_ocorrencias_mesorregiao} ocorrências",
-                delta_color='inverse'
-            )
-
-        col1, col2, col3 = st.columns(3)
-
-        with col1:
-            st.metric(
-                label="Rodovia com Mais Ocorrências",
-                value=f"{rodovia_com_mais_ocorrencias} 🛣️",
-                delta=f"{total_ocorrencias_rodovia} Ocorrências",
-                delta_color='inverse'
-            )
-
-        with col2:
-            st.metric(
-                label="Município com Mais Ocorrências",
-                value=f"{municipio_com_mais_ocorrencias} 🏙️",
-                delta=f"{total_ocorrencias_municipio} Ocorrências",
-                delta_color='inverse'
-            )
 
-        with col3:
-            st.metric(
-                label="Jurisdição com Mais Ocorrências",
-                value=f"{jurisdicao_com_mais_ocorrencias} 🏛️",
-                delta=f"{total_ocorrencias_jurisdicao} Ocorrências",
-                delta_color='inverse'
-            )    
+        exibir_cards(cards)
+        if consolidar:
+            st.caption(f"{int(motor.soma('Relatos', filtros))} relatos agrupados em {total_alertas} alertas")
 
 
     # Gráficos1
-    if not filtered_data.empty:
+    if total_alertas:
         st.subheader("Gráficos")
 
-    # Calcular as contagens de "Subtipo de Alerta" e ordenar pelo maior valor
-        subtipo_counts = (
-            filtered_data.groupby(["Subtipo de Alerta", "Tipo de Alerta"])
-            .size()
-            .reset_index(name="counts")
-            .sort_values(by="counts", ascending=False)
-        )
+        # Contagens de "Subtipo de Alerta", do maior para o menor valor
+        exibir_grafico(figura_subtipos(motor, filtros))
 
-        # Criar o gráfico ordenado
-        fig = px.histogram(
-            subtipo_counts,
-            x="Subtipo de Alerta",
-            y="counts",
-            color="Tipo de Alerta",
-            title="Distribuição por Subtipos de Alertas",
-            text_auto=True
-        )
+    # Gráfico (seção própria: os controles do gráfico só refazem o gráfico)
+    @st.fragment
+    def grafico_ocorrencias(motor, filtros):
+        st.subheader("Gráfico de Ocorrências")
+        columns_available = [col for col in motor.colunas
+                             if col not in ["Alerta", "Latitude", "Longitude", "pubmillis", "Relatos"]]
+        xaxis_column = st.selectbox("Eixo X", options=columns_available)
 
-        # Atualizar layout para melhorar visualização
-        fig.update_layout(
-            xaxis_categoryorder="total descending",  
-            xaxis_title="Subtipo de Alerta",
-            yaxis_title="Contagem"
-        )
+        # Agrupar os dados
+        plot_data = motor.contagens([xaxis_column], filtros, nome='Alerta')
 
-        st.plotly_chart(fig)
+        # Ordenar os dados do maior para o menor
+        plot_data = plot_data.sort_values(by='Alerta', ascending=False)
 
-    # Gráfico
+        # Filtro para Top N
+        top_n_filter = st.selectbox("Mostrar:", options=["Todos", "Top 5", "Top 10"], index=0, help="Selecione a quantidade de dados do ranking:")
 
-    st.subheader("Gráfico de Ocorrências")
-    columns_available = [col for col in filtered_data.columns if col not in ["Alerta", "Latitude", "Longitude"]]
-    xaxis_column = st.selectbox("Eixo X", options=columns_available)
+        if top_n_filter == "Top 5":
+            plot_data = plot_data.head(5)
+        elif top_n_filter == "Top 10":
+            plot_data = plot_data.head(10)
 
-    # Agrupar os dados
-    plot_data = filtered_data.groupby(xaxis_column)['Alerta'].count().reset_index()
+        # Seletor para tipo de gráfico (Barras ou Pizza)
+        chart_type = st.radio("Escolha o Tipo de Gráfico:", options=["Gráfico de Barras", "Gráfico de Pizza"])
 
-    # Ordenar os dados do maior para o menor
-    plot_data = plot_data.sort_values(by='Alerta', ascending=False)
+        # Exibir o gráfico com base na escolha do usuário
+        if not plot_data.empty:
+            exibir_grafico(figura_categorias(plot_data, xaxis_column, 'Alerta', chart_type))
 
-    # Filtro para Top N
-    top_n_filter = st.selectbox("Mostrar:", options=["Todos", "Top 5", "Top 10"], index=0, help="Selecione a quantidade de dados do ranking:")
-
-    if top_n_filter == "Top 5":
-        plot_data = plot_data.head(5)
-    elif top_n_filter == "Top 10":
-        plot_data = plot_data.head(10)
-
-    # Seletor para tipo de gráfico (Barras ou Pizza)
-    chart_type = st.radio("Escolha o Tipo de Gráfico:", options=["Gráfico de Barras", "Gráfico de Pizza"])
-
-    # Exibir o gráfico com base na escolha do usuário
-    if not plot_data.empty:
-        if chart_type == "Gráfico de Barras":
-            fig = px.bar(
-                plot_data,
-                x=xaxis_column,
-                y='Alerta',
-                title="Ocorrências por Categoria",
-                text_auto=True
-            )
-        elif chart_type == "Gráfico de Pizza":
-            fig = px.pie(
-                plot_data,
-                names=xaxis_column,
-                values='Alerta',
-                title="Distribuição de Ocorrências por Categoria"
-            )
-
-        st.plotly_chart(fig)
+    grafico_ocorrencias(motor, filtros)
 
+    # Alertas por km de cada trecho da malha viária de referência (com WAZE_MALHA_VIARIA; não no modo agregado)
+    malha = obter_malha()
+    if malha is not None and not config.MODO_AGREGADO and total_alertas:
+        st.subheader("Trechos com Mais Alertas por km")
+        st.dataframe(tabela_trechos_alertas(carregar_alertas(), filtros, malha), hide_index=True)
 
+    # Mapa (seção própria: trocar o tipo de mapa ou mover o mapa interativo só refaz o mapa)
+    @st.fragment
+    def mapa_ocorrencias(motor, filtros):
         # Mapa de Calor ou Mapa de Pontos
         st.subheader("Escolha o Tipo de Mapa")
 
@@ -372,35 +299,41 @@ if pagina == "Página 1: Geral":
                 index=0  # Valor inicial
             )
 
+        # No modo agregado, as linhas da camada só são baixadas se o mapa for pedido
+        with col2:
+            exibir_mapa = not config.MODO_AGREGADO or st.checkbox("Exibir mapa", value=False)
+
         # Criando o mapa com base na escolha do usuário
-        with st.container():
-            mapa = folium.Map(location=[-19.8157, -43.9542], zoom_start=6, tiles=None)  # Coordenadas iniciais de Minas Gerais
-
-            folium.TileLayer(
-            tiles="https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png",
-            attr='CartoDB © <a href="https://carto.com/">CartoDB</a>',
-            name="CartoDB.DarkMatter"
-                ).add_to(mapa)
-            
-            # Preparando os dados para o mapa
-            heat_data = filtered_data[['Latitude', 'Longitude']].dropna().values.tolist()
-            
-            if mapa_tipo == "Mapa de Calor":
-                # Adicionando o Mapa de Calor
-                HeatMap(heat_data, radius=10).add_to(mapa)
-            elif mapa_tipo == "Mapa de Pontos":
-                # Adicionando os pontos no Mapa
-                for lat, lon in heat_data:
-                    folium.CircleMarker(
-                        location=[lat, lon],
-                        radius=10,
-                        color="blue",
-                        fill=True,
-                        fill_opacity=1
-                    ).add_to(mapa)
-            
-            # Exibindo o mapa
-            folium_static(mapa, width=1400, height=800)
+        if exibir_mapa:
+            envelope = zoom = None
+            filtros_mapa = filtros
+            if config.MAPA_INTERATIVO:
+                # Só a área visível, no detalhe do zoom atual
+                envelope, zoom = vista_do_mapa('vista_alertas', CENTRO_ALERTAS, 6)
+            if config.MAPA_INTERATIVO and config.MODO_AGREGADO:
+                # Consulta espacial ao servidor, já com os filtros
+                dados = carregar_envelope(ALERTAS, envelope, motor.where(filtros))
+                filtros_mapa = {}
+            else:
+                dados = carregar_alertas()
+
+            with st.container():
+                mapa = mapa_base(CENTRO_ALERTAS, prefer_canvas=True)  # Coordenadas iniciais de Minas Gerais
+
+                # No mapa interativo, os dados vão num grupo à parte
+                destino = folium.FeatureGroup(name="Alertas") if config.MAPA_INTERATIVO else mapa
+
+                # Mapa de Calor ou Mapa de Pontos, com os filtros aplicados
+                camada_alertas(dados, filtros_mapa, mapa_tipo, envelope, zoom).add_to(destino)
+
+                # Exibindo o mapa
+                if config.MAPA_INTERATIVO:
+                    exibir_mapa_interativo(mapa, destino, 'mapa_alertas', 'vista_alertas')
+                else:
+                    exibir_mapa_estatico(mapa)
+
+    if total_alertas:
+        mapa_ocorrencias(motor, filtros)
 
 if pagina == "Página 2: Engarrafamentos":
     # HTML para personalizar o título
@@ -423,188 +356,31 @@ if pagina == "Página 2: Engarrafamentos":
         unsafe_allow_html=True
     )
 
-    # URLs do serviço e do endpoint de token
-    token_url = "https://observatorio.infraestrutura.mg.gov.br/portal/sharing/rest/generateToken"
-    feature_layer_url = "https://observatorio.infraestrutura.mg.gov.br/server/rest/services/00_PUBLICACOES/waze_tempo_real/FeatureServer/2/query"
+    def carregar_engarrafamentos():
+        return carregar_camada(ENGARRAFAMENTOS)
 
-    # Credenciais de login
-    user = st.secrets["API"]["user"]
-    password = st.secrets["API"]["password"]
-
-    # Parâmetros para obter o token
-    token_params = {
-        "username": user,
-        "password": password,
-        "referer": "https://observatorio.infraestrutura.mg.gov.br/portal",
-        "f": "json",
-    }
-
-    # Solicitar o token
-    token_response = requests.post(token_url, data=token_params)
-    if token_response.status_code == 200:
-        token_data = token_response.json()
-        if "token" in token_data:
-            token = token_data["token"]
-            print("Token obtido com sucesso!")
-        else:
-            print("Erro ao obter o token:", token_data)
-            exit()
+    if config.MODO_AGREGADO:
+        # Contagens calculadas pelo servidor; as linhas só são baixadas para o mapa
+        motor = obter_motor_servidor(ENGARRAFAMENTOS.url, CAMPOS_ENGARRAFAMENTOS, tokens)
     else:
-        print(f"Erro na requisição do token: {token_response.status_code}")
-        print(token_response.text)
-        exit()
-
-
-    fields_engarrafamentos = ['objectid', 'level', 'city',
-        'line', 'speedkmh', 'length', 'speed', 'roadtype', 'delay', 'street', 'id',
-        'pubmillis', 'startnode', 'id_dash', 'cod_regional', 'cd_mun', 'nm_mun',
-        'trecho', 'sremg', 'rodovia', 'mesorregiao', 'created_user',
-        'created_date', 'last_edited_user', 'last_edited_date', 'jurisdicao',
-        'municipio', 'regional', 'altitude', 'declividade', 'pub',
-        'Shape__Length']
-    
-    traducao_level = {'1': 'Fluxo Livre',
-                      '2': 'Leve',
-                      '3': 'Moderado',
-                      '4': 'Alto',
-                      '5': 'Bloqueado'}
-
-
-
-    # Parâmetros para consultar o FeatureLayer
-    query_params = {
-        "where": "1=1",  # Consulta para retornar todos os dados
-        "outFields": ",".join(fields_engarrafamentos),  # Retornar todos os campos
-        "returnGeometry": "true",  # Incluir geometria dos objetos
-        "f": "json",  # Formato da resposta (JSON)
-        "token": token,  # Token de autenticação
-        "resultRecordCount": 2000,  # Máximo de registros por página
-        "resultOffset": 0  # Offset inicial (começa no primeiro registro)
-    }
-
-    all_data = []  # Lista para armazenar todos os dados
-
-    # Paginação para obter todos os dados
-    while True:
-        response = requests.get(feature_layer_url, params=query_params)
-        if response.status_code == 200:
-            data = response.json()  # Parse do JSON
-            features = data.get("features", [])
-            
-            if not features:
-                break 
-            
-            # Extrair atributos e adicionar à lista all_data
-            attributes = [feature["attributes"] for feature in features]
-            all_data.extend(attributes)
-            
-            # Atualizar o offset para a próxima página
-            query_params["resultOffset"] += query_params["resultRecordCount"]
-        else:
-            print(f"Erro na requisição dos dados: {response.status_code}")
-            break
-
-    # Transformar os dados em DataFrame
-    dados_engarrafamentos = pd.DataFrame(all_data)
-
-    dados_engarrafamentos['regional'] = dados_engarrafamentos['regional'].astype(str)
-    dados_engarrafamentos['level'] = dados_engarrafamentos['level'].astype(str)
-    dados_engarrafamentos['level'] = dados_engarrafamentos['level'].replace(traducao_level)
-    
-    print(dados_engarrafamentos['line'].apply(type).unique())  # Deve mostrar <class 'list'> para cada célula
-
-    # Caso algum valor não seja uma lista de dicionários
-    dados_engarrafamentos['line'] = dados_engarrafamentos['line'].apply(lambda x: eval(x) if isinstance(x, str) else x)
+        motor = obter_motor(carregar_engarrafamentos())
+    exibir_idade_dados(ENGARRAFAMENTOS)
     
     
     # Filtros
     
-    regional_filter = st.sidebar.selectbox(
-            "Filtro por Regional",
-            options=["Todos"] + list(dados_engarrafamentos['regional'].dropna().unique())
-        )
-    level_filter = st.sidebar.selectbox(
-            "Filtro por Nível de Engarrafamento",
-            options=["Todos"] + list(dados_engarrafamentos['level'].dropna().unique())
-        )
-    rodovia_filter = st.sidebar.selectbox(
-            "Filtro por Rodovia",
-            options=['Todos'] + list(dados_engarrafamentos['rodovia'].dropna().unique())
-        )
+    filtros = filtros_escolhidos({'regional': 'engarrafamentos_regional', 'level': 'engarrafamentos_level',
+                                  'rodovia': 'engarrafamentos_rodovia'})
+    filtro_em_cascata("Filtro por Regional", motor, 'regional', 'engarrafamentos_regional', filtros)
+    filtro_em_cascata("Filtro por Nível de Engarrafamento", motor, 'level', 'engarrafamentos_level', filtros)
+    filtro_em_cascata("Filtro por Rodovia", motor, 'rodovia', 'engarrafamentos_rodovia', filtros)
+
+    # Cálculo das métricas (memorizadas por combinação de filtros)
+    total_alertas_jam, cards = cards_engarrafamentos(motor, filtros)
 
-    # Aplicando os filtros
-    filtered_data_jam = dados_engarrafamentos.copy()
-    if regional_filter != "Todos":
-            filtered_data_jam = filtered_data_jam[filtered_data_jam['regional'] == regional_filter]
-    if level_filter != "Todos":
-            filtered_data_jam = filtered_data_jam[filtered_data_jam['level'] == level_filter]
-    if rodovia_filter != "Todos":
-            filtered_data_jam = filtered_data_jam[filtered_data_jam['rodovia'] == rodovia_filter]   
-
-    # Cálculo das métricas
-    if not filtered_data_jam.empty:
-        # Rodovia com maior número de engarrafamentos
-        rodovia_com_mais_engarrafamentos = (
-            filtered_data_jam['rodovia']
-            .value_counts()
-            .idxmax() if not filtered_data_jam.empty else "N/A"
-        )
-        total_engarrafamentos_rodovia = (
-                filtered_data_jam['rodovia']
-                .value_counts()
-                .max() if not filtered_data_jam.empty else 0
-            )
-        # Regional com maior número de ocorrências
-        regional_com_mais_engarrafamentos = (
-            filtered_data_jam['regional']
-            .value_counts()
-            .idxmax() if not filtered_data_jam.empty else "N/A"
-        )
-        total_engarrafamentos_regional = (
-            filtered_data_jam['regional']
-            .value_counts()
-            .max() if not filtered_data_jam.empty else 0
-        )
-        # Municipio com maior número de ocorrências
-        municipio_com_mais_engarrafamentos = (
-            filtered_data_jam['municipio']
-            .value_counts()
-            .idxmax() if not filtered_data_jam.empty else "N/A"
-        )
-        total_engarrafamentos_municipio = (
-            filtered_data_jam['municipio']
-            .value_counts()
-            .max() if not filtered_data_jam.empty else 0
-        )
-        # Jurisdição com maior número de ocorrências
-        jurisdicao_com_mais_engarrafamentos = (
-            filtered_data_jam['jurisdicao']
-            .value_counts()
-            .idxmax() if not filtered_data_jam.empty else "N/A"
-        )
-        total_engarrafamentos_jurisdicao = (
-            filtered_data_jam['jurisdicao']
-            .value_counts()
-            .max() if not filtered_data_jam.empty else 0
-        )
-        # Mesorregião com maior número de ocorrências
-        mesorregiao_com_mais_engarrafamentos = (
-            filtered_data_jam['mesorregiao']
-            .value_counts()
-            .idxmax() if not filtered_data_jam.empty else "N/A"
-        )
-        total_engarrafamentos_mesorregiao = (
-            filtered_data_jam['mesorregiao']
-            .value_counts()
-            .max() if not filtered_data_jam.empty else 0
-        )
 
-    total_alertas_jam = len(filtered_data_jam)
-    
-    
     # Exibindo os cards
     st.subheader("Resumo das Ocorrências")
-    col1, col2, col3 = st.columns(3)
 
     st.write(
     """
@@ -630,187 +406,86 @@ if pagina == "Página 2: Engarrafamentos":
         """,
         unsafe_allow_html=True
     )
-    
-    
-    with col1:
-        st.metric(
-            label="Total de Engarrafamentos",
-            value=f"{total_alertas_jam} Engarrafamentos ⚠️"
-        )
-        comprimento_total = filtered_data_jam['length'].sum() / 1000
-        st.markdown(f'<p class="custom-text"><b>Comprimento total dos engarrafamentos:</b> {int(comprimento_total)} km</p>',
+
+    colunas = exibir_cards(cards)
+    with colunas[0][0]:
+        st.markdown(f'<p class="custom-text"><b>Comprimento total dos engarrafamentos:</b> {comprimento_total_km(motor, filtros)} km</p>',
         unsafe_allow_html=True)
+
+
+    # Gráfico de categorias: contagem de engarrafamentos por faixa de comprimento
+    categoria_count = faixas_comprimento(motor, filtros)
+    exibir_grafico(figura_comprimentos(categoria_count))
     
-    with col2:
-        st.metric(
-            label="Regional com Mais Engarrafamentos",
-            value=f"{regional_com_mais_engarrafamentos} 📝",
-            delta=f"{total_engarrafamentos_regional} Engarrafamentos",
-            delta_color='inverse'
-        )
     
-    with col3:
-        st.metric(
-            label="Mesorregião com Mais Engarrafamentos",
-            value=f"{mesorregiao_com_mais_engarrafamentos} 🗺️",
-            delta=f"{total_engarrafamentos_mesorregiao} Engarrafamentos",
-            delta_color='inverse'
-        )
+    # Gráfico (seção própria: os controles do gráfico só refazem o gráfico)
+    @st.fragment
+    def grafico_engarrafamentos(motor, filtros, categoria_count):
+        st.subheader("Gráfico de Engarrafamentos")
+        columns_available = [col for col in motor.colunas + ['categoria'] if col not in ['objectid', 'line', 'roadtype', 'street', 'id',
+            'pubmillis', 'startnode', 'id_dash', 'cd_mun', 'nm_mun', 'trecho', 'sremg', 'created_user', 'created_date', 'last_edited_user', 'last_edited_date', 'jurisdicao', 'pub',
+            'Shape__Length']]
+        xaxis_column = st.selectbox("Eixo X", options=columns_available)
+
+        # Agrupar os dados
+        if xaxis_column == 'categoria':
+            plot_data = categoria_count[categoria_count > 0].rename_axis('categoria').reset_index(name='objectid')
+        else:
+            plot_data = motor.contagens([xaxis_column], filtros, nome='objectid')
+            if xaxis_column == 'length':
+                plot_data['length'] = plot_data['length'] / 1000  # m para km
 
-    col1, col2, col3 = st.columns(3)
+        # Ordenar os dados do maior para o menor
+        plot_data = plot_data.sort_values(by='objectid', ascending=False)
 
-    with col1:
-        st.metric(
-            label="Rodovia com Mais Engarrafamentos",
-            value=f"{rodovia_com_mais_engarrafamentos} 🛣️",
-            delta=f"{total_engarrafamentos_rodovia} Engarrafamentos",
-            delta_color='inverse'
-        )
+        # Filtro para Top N
+        top_n_filter = st.selectbox("Mostrar:", options=["Todos", "Top 5", "Top 10"], index=0, help="Selecione a quantidade de dados do ranking:")
 
-    with col2:
-        st.metric(
-            label="Município com Mais Engarrafamentos",
-            value=f"{municipio_com_mais_engarrafamentos} 🏙️",
-            delta=f"{total_engarrafamentos_municipio} Engarrafamentos",
-            delta_color='inverse'
-        )
+        if top_n_filter == "Top 5":
+            plot_data = plot_data.head(5)
+        elif top_n_filter == "Top 10":
+            plot_data = plot_data.head(10)
 
-    with col3:
-        st.metric(
-            label="Jurisdição com Mais Engarrafamentos",
-            value=f"{jurisdicao_com_mais_engarrafamentos} 🏛️",
-            delta=f"{total_engarrafamentos_jurisdicao} Engarrafamentos",
-            delta_color='inverse'
-        )
+        # Seletor para tipo de gráfico (Barras ou Pizza)
+        chart_type = st.radio("Escolha o Tipo de Gráfico:", options=["Gráfico de Barras", "Gráfico de Pizza"])
 
+        # Exibir o gráfico com base na escolha do usuário
+        if not plot_data.empty:
+            exibir_grafico(figura_categorias(plot_data, xaxis_column, 'objectid', chart_type))
     
-    # Gráfico de categorias
-    
-    # Convertendo m para km
-    filtered_data_jam['length'] = filtered_data_jam['length'] / 1000
-    
-    # Categorizando
-    bins = [0, 1, 2, 4, 10, 20]
-    labels = ['0-1 km', '1-2 km', '2-4 km', '4-10 km', '10-20 km']
-    filtered_data_jam['categoria'] = pd.cut(filtered_data_jam['length'], bins=bins, labels=labels, right=False)
-
-    # Contagem de engarrafamentos por categoria
-    categoria_count = filtered_data_jam['categoria'].value_counts().sort_index()
 
-   
+    grafico_engarrafamentos(motor, filtros, categoria_count)
 
-    # Criando gráfico de barras
+    # Tendências (seção própria): a série é acumulada pelo processo a cada nova versão dos dados,
+    # só com os engarrafamentos novos; no modo agregado não há linhas para acumular
+    @st.fragment
+    def tendencias_engarrafamentos(serie, filtros):
+        st.subheader("Tendência dos Engarrafamentos")
+        exibir_cards(cards_tendencia(serie, filtros))
 
-    fig_jam = px.bar(
-                categoria_count,
-                x=categoria_count.index,
-                y=categoria_count.values,
-                title="Engarrafamentos por comprimento",
-                text_auto=True)
-    
-    st.plotly_chart(fig_jam)
-    
+        col1, col2 = st.columns(2)
+        with col1:
+            medida = st.selectbox("Medida", options=list(MEDIDAS_TENDENCIA))
+        with col2:
+            resolucao = st.radio("Período", options=["Por hora", "Por dia"], horizontal=True)
+        exibir_grafico(figura_tendencia(serie, filtros, medida, resolucao))
+
+    if not config.MODO_AGREGADO:
+        serie = obter_serie(ENGARRAFAMENTOS.nome)
+        serie.atualizar(carregar_engarrafamentos())
+        tendencias_engarrafamentos(serie, filtros)
+
+    # Km engarrafados por km de cada trecho da malha viária de referência (com WAZE_MALHA_VIARIA)
+    malha = obter_malha()
+    if malha is not None and not config.MODO_AGREGADO and total_alertas_jam:
+        st.subheader("Trechos Mais Congestionados")
+        st.dataframe(tabela_trechos_engarrafamentos(carregar_engarrafamentos(), filtros, malha), hide_index=True)
     
-    # Gráfico
-
-    st.subheader("Gráfico de Engarrafamentos")
-    columns_available = [col for col in filtered_data_jam.columns if col not in ['objectid', 'roadtype', 'street', 'id',
-        'pubmillis', 'startnode', 'id_dash', 'cd_mun', 'nm_mun', 'trecho', 'sremg', 'created_user', 'created_date', 'last_edited_user', 'last_edited_date', 'jurisdicao', 'pub',
-        'Shape__Length']]
-    xaxis_column = st.selectbox("Eixo X", options=columns_available)
-
-    # Agrupar os dados
-    plot_data = filtered_data_jam.groupby(xaxis_column)['objectid'].count().reset_index()
-
-    # Ordenar os dados do maior para o menor
-    plot_data = plot_data.sort_values(by='objectid', ascending=False)
-
-    # Filtro para Top N
-    top_n_filter = st.selectbox("Mostrar:", options=["Todos", "Top 5", "Top 10"], index=0, help="Selecione a quantidade de dados do ranking:")
-
-    if top_n_filter == "Top 5":
-        plot_data = plot_data.head(5)
-    elif top_n_filter == "Top 10":
-        plot_data = plot_data.head(10)
-
-    # Seletor para tipo de gráfico (Barras ou Pizza)
-    chart_type = st.radio("Escolha o Tipo de Gráfico:", options=["Gráfico de Barras", "Gráfico de Pizza"])
-
-    # Exibir o gráfico com base na escolha do usuário
-    if not plot_data.empty:
-        if chart_type == "Gráfico de Barras":
-            fig = px.bar(
-                plot_data,
-                x=xaxis_column,
-                y='objectid',
-                title="Ocorrências por Categoria",
-                text_auto=True
-            )
-        elif chart_type == "Gráfico de Pizza":
-            fig = px.pie(
-                plot_data,
-                names=xaxis_column,
-                values='objectid',
-                title="Distribuição de Ocorrências por Categoria"
-            )
+    # No modo agregado, as linhas da camada só são baixadas se o mapa for pedido
+    exibir_mapa = not config.MODO_AGREGADO or st.checkbox("Exibir mapa", value=False)
 
-        st.plotly_chart(fig)
-    
-    # Função para determinar os estilos de linha
-    def get_line_style(level):
-        colors = {'Fluxo Livre': 'blue', 'Leve': 'green', 'Moderado': 'yellow', 'Alto': 'orange', 'Bloqueado': 'red'}
-        thickness = {'Fluxo Livre': 2, 'Leve': 3, 'Moderado': 4, 'Alto': 5, 'Bloqueado': 6}
-        return colors.get(level, 'black'), thickness.get(level, 2)
-
-    # Inicializar o mapa
-    m = folium.Map(location=[-19.965, -44.740], zoom_start=6, tiles=None)
-
-    folium.TileLayer(
-        tiles="https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png",
-        attr='CartoDB © <a href="https://carto.com/">CartoDB</a>',
-        name="CartoDB.DarkMatter"
-            ).add_to(m)
-    
-    # Coletar todos os pontos para ajustar os limites do mapa
-    all_coords = []
-
-    for idx, row in filtered_data_jam.iterrows():
-        print(f"Adicionando linha {idx + 1} com level {row['level']}: {row['line']}")
-        
-        # Converter coordenadas
-        line_coords = [(point['y'], point['x']) for point in row['line']]
-        all_coords.extend(line_coords)  # Adicionar todas as coordenadas à lista
-
-        print(f"Coordenadas da linha {idx + 1}: {line_coords}")
-        
-        # Obter estilo da linha
-        color, thickness = get_line_style(row['level'])
-        print(f"Cor e espessura da linha {idx + 1}: {color}, {thickness}")
-        
-        # Criar o conteúdo do pop-up
-        popup_content = f"""
-        <b>Detalhes do Engarrafamento</b><br>
-        Nível: {row['level']}<br>
-        Comprimento: {row['length']} km<br>
-        Velocidade: {row['speedkmh']} km/h<br>
-        Rodovia: {row['rodovia']} <br>
-        Município: {row['municipio']} <br>
-        Regional: {row['regional']} <br>
-        Jurisdição: {row['jurisdicao']}
-        """
-        popup = folium.Popup(popup_content, max_width=300)
-        
-        # Adicionar a linha ao mapa com pop-up
-        folium.PolyLine(line_coords, color=color, weight=thickness, opacity=0.6, popup=popup).add_to(m)
-
-    # Ajustar o zoom para os dados filtrados
-    if all_coords:  # Verificar se há coordenadas
-        bounds = [[min(coord[0] for coord in all_coords), min(coord[1] for coord in all_coords)], 
-                [max(coord[0] for coord in all_coords), max(coord[1] for coord in all_coords)]]
-        m.fit_bounds(bounds)  # Ajustar o zoom para os limites
-        
-        
-        
+    # Legenda na barra lateral, fora da seção do mapa (uma seção só escreve no próprio espaço)
+    if exibir_mapa and (total_alertas_jam or config.MAPA_INTERATIVO):
         st.sidebar.markdown("### Níveis de Engarrafamentos")
 
         # Estilos da legenda com as cores
@@ -824,6 +499,48 @@ if pagina == "Página 2: Engarrafamentos":
             </div>
         """, unsafe_allow_html=True)
 
-        folium_static(m, width=1400, height=800)
-
-
+    # Mapa (seção própria: mover o mapa interativo só refaz o mapa)
+    @st.fragment
+    def mapa_engarrafamentos(motor, filtros):
+        envelope, zoom = None, 6
+        filtros_mapa = filtros
+        if config.MAPA_INTERATIVO:
+            # Só a área visível, no detalhe do zoom atual
+            envelope, zoom = vista_do_mapa('vista_engarrafamentos', CENTRO_ENGARRAFAMENTOS, 6)
+        if config.MAPA_INTERATIVO and config.MODO_AGREGADO:
+            # Consulta espacial ao servidor, já com os filtros
+            dados_engarrafamentos = carregar_envelope(ENGARRAFAMENTOS, envelope, motor.where(filtros))
+            filtros_mapa = {}
+        else:
+            dados_engarrafamentos = carregar_engarrafamentos()
+
+        # Inicializar o mapa
+        m = mapa_base(CENTRO_ENGARRAFAMENTOS)
+
+        # Todos os engarrafamentos filtrados em uma única camada GeoJSON, com as linhas simplificadas
+        # para o zoom atual ou, no mapa estático, para o zoom em que os dados filtrados cabem no mapa
+        camada, bounds = camada_engarrafamentos_filtrados(dados_engarrafamentos, filtros_mapa, envelope, zoom)
+        destino = folium.FeatureGroup(name="Engarrafamentos") if config.MAPA_INTERATIVO else m
+        if camada is not None:
+            camada.add_to(destino)
+
+        # Ajustar o zoom para os dados filtrados
+        if bounds is not None:  # Verificar se há coordenadas
+            m.fit_bounds(bounds)  # Ajustar o zoom para os limites
+
+        if bounds is not None or config.MAPA_INTERATIVO:
+            if config.MAPA_INTERATIVO:
+                exibir_mapa_interativo(m, destino, 'mapa_engarrafamentos', 'vista_engarrafamentos')
+            else:
+                exibir_mapa_estatico(m)
+
+    if exibir_mapa:
+        mapa_engarrafamentos(motor, filtros)
+
+# Painel oculto com o tempo de cada etapa (WAZE_DIAGNOSTICO=1 ou ?diagnostico=1 na URL)
+if config.DIAGNOSTICO or st.query_params.get("diagnostico") == "1":
+    with st.sidebar.expander("Diagnóstico"):
+        st.caption("Etapas desta execução")
+        st.dataframe(etapas(rodada), hide_index=True)
+        st.caption("Últimas execuções, por etapa")
+        st.dataframe(resumo(), hide_index=True)
@@ -0,0 +1 @@
+# Benchmarks do painel contra um FeatureServer falso, com dados sintéticos
@@ -0,0 +1,213 @@
+import numpy as np
+
+from waze.traducoes import traducao, traducao_tipo
+
+# Área aproximada de Minas Gerais (oeste, sul, leste, norte)
+LIMITES_MG = (-51.0, -22.9, -39.9, -14.3)
+
+# Nomes sintéticos, na mesma ordem de grandeza dos reais (~40 regionais)
+RODOVIAS = ['BR-040', 'BR-050', 'BR-116', 'BR-135', 'BR-146', 'BR-251', 'BR-262', 'BR-265',
+            'BR-267', 'BR-354', 'BR-365', 'BR-381', 'BR-452', 'BR-459', 'BR-494',
+            'MG-010', 'MG-030', 'MG-050', 'MG-120', 'MG-129', 'MG-188', 'MG-223',
+            'MG-290', 'MG-424', 'MG-431', 'MG-455']
+GRADE_REGIONAIS = (8, 5)
+GRADE_MESORREGIOES = (4, 3)
+GRADE_MUNICIPIOS = (40, 20)
+
+# Tipo de campo no ArcGIS de cada campo gerado (vai no `fields` das respostas)
+TIPOS_ALERTAS = {
+    'objectid': 'esriFieldTypeOID', 'type': 'esriFieldTypeString', 'subtype': 'esriFieldTypeString',
+    'rodovia': 'esriFieldTypeString', 'mesorregiao': 'esriFieldTypeString',
+    'municipio': 'esriFieldTypeString', 'regional': 'esriFieldTypeString',
+    'jurisdicao': 'esriFieldTypeString', 'x': 'esriFieldTypeDouble', 'y': 'esriFieldTypeDouble',
+    'pubmillis': 'esriFieldTypeDouble', 'last_edited_date': 'esriFieldTypeDate',
+}
+TIPOS_ENGARRAFAMENTOS = {
+    'objectid': 'esriFieldTypeOID', 'level': 'esriFieldTypeInteger', 'city': 'esriFieldTypeString',
+    'line': 'esriFieldTypeString', 'speedkmh': 'esriFieldTypeDouble', 'length': 'esriFieldTypeInteger',
+    'speed': 'esriFieldTypeDouble', 'roadtype': 'esriFieldTypeInteger', 'delay': 'esriFieldTypeInteger',
+    'street': 'esriFieldTypeString', 'id': 'esriFieldTypeDouble', 'pubmillis': 'esriFieldTypeDouble',
+    'startnode': 'esriFieldTypeString', 'id_dash': 'esriFieldTypeInteger',
+    'cod_regional': 'esriFieldTypeInteger', 'cd_mun': 'esriFieldTypeInteger',
+    'nm_mun': 'esriFieldTypeString', 'trecho': 'esriFieldTypeString', 'sremg': 'esriFieldTypeString',
+    'rodovia': 'esriFieldTypeString', 'mesorregiao': 'esriFieldTypeString',
+    'created_user': 'esriFieldTypeString', 'created_date': 'esriFieldTypeDate',
+    'last_edited_user': 'esriFieldTypeString', 'last_edited_date': 'esriFieldTypeDate',
+    'jurisdicao': 'esriFieldTypeString', 'municipio': 'esriFieldTypeString',
+    'regional': 'esriFieldTypeString', 'altitude': 'esriFieldTypeDouble',
+    'declividade': 'esriFieldTypeDouble', 'pub': 'esriFieldTypeString',
+    'Shape__Length': 'esriFieldTypeDouble',
+}
+
+_AGORA_MS = 1_735_700_000_000  # instante fixo, para que os dados não dependam do relógio
+
+
+class MalhaSintetica:
+    """Rodovias sintéticas (polilinhas atravessando o estado) sobre as quais os
+    alertas e engarrafamentos são gerados, como acontece com os dados reais."""
+
+    def __init__(self, gerador, vertices=12):
+        oeste, sul, leste, norte = LIMITES_MG
+        inicio = gerador.uniform((oeste, sul), (leste, norte), size=(len(RODOVIAS), 2))
+        passos = gerador.normal(0, 0.6, size=(len(RODOVIAS), vertices - 1, 2))
+        self.tracados = np.concatenate([inicio[:, None], inicio[:, None] + np.cumsum(passos, axis=1)], axis=1)
+        self.tracados[..., 0] = self.tracados[..., 0].clip(oeste, leste)
+        self.tracados[..., 1] = self.tracados[..., 1].clip(sul, norte)
+
+    # Ponto na fração t (0 a 1) do traçado de cada rodovia pedida
+    def ponto(self, rodovias, t):
+        segmentos = self.tracados.shape[1] - 1
+        posicao = t * segmentos
+        indice = np.minimum(posicao.astype(np.int64), segmentos - 1)
+        resto = (posicao - indice)[:, None]
+        a = self.tracados[rodovias, indice]
+        b = self.tracados[rodovias, indice + 1]
+        return a + (b - a) * resto
+
+
+def _celula(x, y, grade):
+    oeste, sul, leste, norte = LIMITES_MG
+    colunas, linhas = grade
+    i = np.clip(((x - oeste) / (leste - oeste) * colunas).astype(np.int64), 0, colunas - 1)
+    j = np.clip(((y - sul) / (norte - sul) * linhas).astype(np.int64), 0, linhas - 1)
+    return j * colunas + i
+
+
+# Regional, mesorregião e município derivados da posição, para que os filtros tenham
+# a mesma correlação espacial dos dados reais
+def _divisoes(x, y):
+    return {
+        'regional': np.char.add('Regional ', np.char.zfill((_celula(x, y, GRADE_REGIONAIS) + 1).astype(str), 2)),
+        'mesorregiao': np.char.add('Mesorregião ', _celula(x, y, GRADE_MESORREGIOES).astype(str)),
+        'municipio': np.char.add('Município ', _celula(x, y, GRADE_MUNICIPIOS).astype(str)),
+    }
+
+
+def _jurisdicao(nomes, urbanos):
+    return np.where(urbanos, 'Municipal', np.where(np.char.startswith(nomes.astype(str), 'BR'), 'DNIT', 'DER'))
+
+
+def _tipo(subtipo):
+    return next((tipo for tipo in traducao_tipo if subtipo and subtipo.startswith(tipo)), 'HAZARD')
+
+
+def _posicoes(gerador, malha, n, fracao_urbana):
+    rodovias = gerador.integers(0, len(RODOVIAS), n)
+    pontos = malha.ponto(rodovias, gerador.random(n)) + gerador.normal(0, 0.01, size=(n, 2))
+    nomes = np.array(RODOVIAS, dtype=object)[rodovias]
+    # Parte dos registros fica fora das rodovias (vias urbanas, sem rodovia)
+    urbanos = gerador.random(n) < fracao_urbana
+    nomes[urbanos] = None
+    return rodovias, pontos, nomes, urbanos
+
+
+def gerar_alertas(n, semente=0):
+    """Colunas (campo -> lista) de n alertas sintéticos, no formato devolvido pelo FeatureServer."""
+    gerador = np.random.default_rng(semente)
+    malha = MalhaSintetica(np.random.default_rng(semente + 1))
+    _, pontos, rodovias, urbanos = _posicoes(gerador, malha, n, fracao_urbana=0.15)
+
+    # Subtipo sorteado entre os conhecidos (ou ausente); o tipo acompanha o subtipo
+    subtipos = list(traducao) + [None]
+    escolhidos = gerador.integers(0, len(subtipos), n)
+
+    x, y = pontos[:, 0], pontos[:, 1]
+    colunas = {
+        'objectid': np.arange(1, n + 1),
+        'type': np.array([_tipo(subtipo) for subtipo in subtipos], dtype=object)[escolhidos],
+        'subtype': np.array(subtipos, dtype=object)[escolhidos],
+        'rodovia': rodovias,
+        'jurisdicao': _jurisdicao(rodovias, urbanos),
+        'x': x.round(6),
+        'y': y.round(6),
+        'pubmillis': (_AGORA_MS - gerador.integers(0, 6 * 3600_000, n)).astype(np.float64),
+        'last_edited_date': _AGORA_MS - gerador.integers(0, 3600_000, n),
+        **_divisoes(x, y),
+    }
+    return {campo: valores.tolist() for campo, valores in colunas.items()}
+
+
+# Texto da linha como vem no campo 'line' do servidor: "[{'x': -44.1, 'y': -19.9}, ...]"
+def _texto_linha(xs, ys):
+    return '[' + ', '.join(f"{{'x': {x:.6f}, 'y': {y:.6f}}}" for x, y in zip(xs, ys)) + ']'
+
+
+def gerar_engarrafamentos(n, semente=0):
+    """Colunas (campo -> lista) de n engarrafamentos sintéticos, com a linha em texto."""
+    gerador = np.random.default_rng(semente + 2)
+    malha = MalhaSintetica(np.random.default_rng(semente + 1))
+    rodovias_idx, inicio, rodovias, urbanos = _posicoes(gerador, malha, n, fracao_urbana=0.4)
+
+    # Cada engarrafamento segue a rodovia por alguns vértices, com pequenos desvios
+    vertices = np.minimum(gerador.geometric(0.12, n) + 1, 60)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(vertices, out=offsets[1:])
+    direcao = malha.ponto(rodovias_idx, np.full(n, 0.99)) - malha.ponto(rodovias_idx, np.full(n, 0.01))
+    direcao /= np.maximum(np.linalg.norm(direcao, axis=1, keepdims=True), 1e-9)
+    dono = np.repeat(np.arange(n), vertices)
+    passos = direcao[dono] * 0.002 + gerador.normal(0, 0.0006, size=(len(dono), 2))
+    passos[offsets[:-1]] = inicio  # primeiro vértice de cada linha
+    coordenadas = np.cumsum(passos, axis=0)
+    # Cada linha parte do próprio início: desconta o acumulado até o fim da linha anterior
+    acumulado = np.concatenate([np.zeros((1, 2)), coordenadas[offsets[1:-1] - 1]])[:n]
+    coordenadas -= np.repeat(acumulado, vertices, axis=0)
+
+    # Comprimento aproximado em metros (1 grau ~ 111 km)
+    trechos = np.hypot(*np.diff(coordenadas, axis=0).T) * 111_000
+    trechos[offsets[1:-1] - 1] = 0  # sem ligar o fim de uma linha ao começo da próxima
+    comprimento = np.add.reduceat(np.append(trechos, 0), offsets[:-1]) if n else np.zeros(0)
+
+    x, y = inicio[:, 0], inicio[:, 1]
+    divisoes = _divisoes(x, y)
+    nivel = gerador.integers(1, 6, n)
+    velocidade = np.where(nivel == 5, 0, gerador.uniform(2, 60, n) / nivel)
+    colunas = {
+        'objectid': np.arange(1, n + 1),
+        'level': nivel,
+        'city': divisoes['municipio'],
+        'line': np.array([_texto_linha(*coordenadas[a:b].T) for a, b in zip(offsets[:-1], offsets[1:])],
+                         dtype=object),
+        'speedkmh': velocidade.round(2),
+        'length': comprimento.round().astype(np.int64),
+        'speed': (velocidade / 3.6).round(2),
+        'roadtype': np.where(urbanos, 1, 2),
+        'delay': np.where(nivel == 5, -1, gerador.integers(0, 900, n)),
+        'street': np.where(urbanos, 'Rua sintética', rodovias).astype(object),
+        'id': gerador.integers(1, 2**40, n).astype(np.float64),
+        'pubmillis': (_AGORA_MS - gerador.integers(0, 3 * 3600_000, n)).astype(np.float64),
+        'startnode': np.full(n, '', dtype=object),
+        'id_dash': np.arange(1, n + 1),
+        'cod_regional': _celula(x, y, GRADE_REGIONAIS) + 1,
+        'cd_mun': _celula(x, y, GRADE_MUNICIPIOS) + 3100000,
+        'nm_mun': divisoes['municipio'],
+        'trecho': np.full(n, None, dtype=object),
+        'sremg': np.full(n, None, dtype=object),
+        'rodovia': rodovias,
+        'created_user': np.full(n, 'sincronizador', dtype=object),
+        'created_date': _AGORA_MS - gerador.integers(3600_000, 7200_000, n),
+        'last_edited_user': np.full(n, 'sincronizador', dtype=object),
+        'last_edited_date': _AGORA_MS - gerador.integers(0, 3600_000, n),
+        'jurisdicao': _jurisdicao(rodovias, urbanos),
+        'altitude': gerador.uniform(400, 1400, n).round(1),
+        'declividade': gerador.uniform(0, 12, n).round(2),
+        'pub': np.full(n, 'S', dtype=object),
+        'Shape__Length': (comprimento / 111_000).round(6),
+        **divisoes,
+    }
+    return {campo: valores.tolist() for campo, valores in colunas.items()}
+
+
+# Malha viária de referência (GeoJSON) com o traçado das rodovias sintéticas, em trechos
+# de `vertices_por_trecho` vértices; os alertas e engarrafamentos gerados ficam sobre ela
+def gerar_malha_viaria(semente=0, vertices_por_trecho=3):
+    malha = MalhaSintetica(np.random.default_rng(semente + 1))
+    feicoes = []
+    for rodovia, tracado in zip(RODOVIAS, malha.tracados):
+        for numero, inicio in enumerate(range(0, len(tracado) - 1, vertices_por_trecho - 1), start=1):
+            pontos = tracado[inicio:inicio + vertices_por_trecho]
+            feicoes.append({
+                'type': 'Feature',
+                'properties': {'rodovia': rodovia, 'trecho': f"{rodovia} - {numero:02d}"},
+                'geometry': {'type': 'LineString', 'coordinates': pontos.round(6).tolist()},
+            })
+    return {'type': 'FeatureCollection', 'features': feicoes}
@@ -0,0 +1,289 @@
+"""Benchmark do painel contra o FeatureServer falso.
+
+    python -m benchmarks.executar --tamanhos 1000,10000,100000 --latencia 0.05
+
+Para cada tamanho (quantidade de alertas; os engarrafamentos são uma fração dele),
+sobe o servidor falso em outro processo e mede cada etapa do painel: token, busca
+das páginas, montagem do DataFrame, tradução, filtro, métricas, gráficos, mapas
+folium e o HTML gerado. Cada execução é acrescentada a benchmarks/resultados.jsonl
+com a versão do código e comparada com a anterior de mesmos parâmetros.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+import plotly.express as px
+import requests
+
+from benchmarks.servidor_falso import configurar_urls
+from waze.arcgis import baixar_camada
+from waze.autenticacao import GerenciadorToken
+from waze.camadas import ALERTAS, ENGARRAFAMENTOS
+from waze.consolidacao import consolidar
+from waze.indice import obter_indice
+from waze.metricas import MotorResumo
+from waze.normalizacao import COLUNAS_ENGARRAFAMENTOS
+from waze.paineis import (CENTRO_ALERTAS, CENTRO_ENGARRAFAMENTOS, camada_alertas, camada_engarrafamentos_filtrados,
+                          cards_alertas, cards_engarrafamentos, comprimento_total_km, faixas_comprimento,
+                          figura_categorias, figura_comprimentos, figura_subtipos, mapa_base)
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARQUIVO_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados.jsonl")
+
+
+class Cronometro:
+    """Tempos (ms) e tamanhos (bytes) de cada etapa de uma rodada."""
+
+    def __init__(self):
+        self.tempos = {}
+        self.tamanhos = {}
+
+    @contextmanager
+    def etapa(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tempos[nome] = (time.perf_counter() - inicio) * 1000
+
+
+@contextmanager
+def servidor_em_processo(alertas, engarrafamentos, latencia, comprimir, semente):
+    # Em outro processo, para que gerar as respostas não dispute o GIL com o que é medido
+    comando = [sys.executable, "-m", "benchmarks.servidor_falso", "--alertas", str(alertas),
+               "--engarrafamentos", str(engarrafamentos), "--latencia", str(latencia),
+               "--semente", str(semente)]
+    if not comprimir:
+        comando.append("--sem-gzip")
+    processo = subprocess.Popen(comando, cwd=RAIZ, stdout=subprocess.PIPE, text=True)
+    try:
+        linha = processo.stdout.readline()
+        if not linha.startswith("porta "):
+            raise RuntimeError("O servidor falso não iniciou")
+        yield f"http://127.0.0.1:{int(linha.split()[1])}"
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+def _bytes_enviados(base):
+    return requests.get(base + "/_estatisticas").json()["bytes"]
+
+
+def _html(cronometro, nome, mapa):
+    with cronometro.etapa(nome + ".html"):
+        html = mapa.get_root().render()
+    cronometro.tamanhos[nome + ".html"] = len(html.encode())
+
+
+# Valor mais frequente de uma coluna, usado como filtro típico (uma regional)
+def _filtro_tipico(dados, coluna):
+    return {coluna: dados[coluna].value_counts().index[0]}
+
+
+def rodada_alertas(cronometro, base, tokens):
+    bytes_antes = _bytes_enviados(base)
+    with cronometro.etapa("alertas.busca"):
+        colunas = baixar_camada(ALERTAS.url, ALERTAS.campos, tokens)
+    cronometro.tamanhos["alertas.recebido"] = _bytes_enviados(base) - bytes_antes
+
+    with cronometro.etapa("alertas.dataframe"):
+        pd.DataFrame(colunas)
+    with cronometro.etapa("alertas.preparar"):  # DataFrame + tradução + tipos
+        dados = ALERTAS.preparar(colunas)
+
+    filtros = _filtro_tipico(dados, "Regional")
+    with cronometro.etapa("alertas.filtro"):
+        obter_indice(dados).linhas(filtros)
+    with cronometro.etapa("alertas.metricas"):
+        motor = MotorResumo(dados)
+        cards_alertas(motor, {})
+        cards_alertas(motor, filtros)
+    with cronometro.etapa("alertas.consolidacao"):
+        consolidar(dados)
+
+    with cronometro.etapa("alertas.grafico"):
+        figura_subtipos(motor, filtros).to_json()
+        ranking = motor.contagens(["Rodovia"], filtros, nome="Alerta").sort_values(by="Alerta", ascending=False)
+        figura_categorias(ranking, "Rodovia", "Alerta").to_json()
+
+    for tipo, nome in [("Mapa de Calor", "alertas.mapa_calor"), ("Mapa de Pontos", "alertas.mapa_pontos")]:
+        with cronometro.etapa(nome):
+            mapa = mapa_base(CENTRO_ALERTAS, prefer_canvas=True)
+            camada_alertas(dados, filtros, tipo).add_to(mapa)
+        _html(cronometro, nome, mapa)
+
+
+def rodada_engarrafamentos(cronometro, base, tokens):
+    bytes_antes = _bytes_enviados(base)
+    with cronometro.etapa("engarrafamentos.busca"):
+        colunas = baixar_camada(ENGARRAFAMENTOS.url, ENGARRAFAMENTOS.campos, tokens)
+    cronometro.tamanhos["engarrafamentos.recebido"] = _bytes_enviados(base) - bytes_antes
+
+    with cronometro.etapa("engarrafamentos.dataframe"):
+        pd.DataFrame(colunas, columns=COLUNAS_ENGARRAFAMENTOS)
+    with cronometro.etapa("engarrafamentos.preparar"):  # DataFrame + tradução + geometria
+        dados = ENGARRAFAMENTOS.preparar(colunas)
+
+    filtros = _filtro_tipico(dados, "regional")
+    with cronometro.etapa("engarrafamentos.filtro"):
+        indice = obter_indice(dados)
+        indice.linhas(filtros)
+    with cronometro.etapa("engarrafamentos.metricas"):
+        motor = MotorResumo(dados)
+        cards_engarrafamentos(motor, filtros)
+        comprimento_total_km(motor, filtros)
+        faixas = faixas_comprimento(motor, filtros)
+
+    with cronometro.etapa("engarrafamentos.grafico"):
+        figura_comprimentos(faixas).to_json()
+        ranking = motor.contagens(["rodovia"], filtros, nome="objectid").sort_values(by="objectid", ascending=False)
+        figura_categorias(ranking, "rodovia", "objectid").to_json()
+
+    with cronometro.etapa("engarrafamentos.mapa"):
+        mapa = mapa_base(CENTRO_ENGARRAFAMENTOS)
+        camada, limites = camada_engarrafamentos_filtrados(dados, filtros)
+        if camada is not None:
+            camada.add_to(mapa)
+        if limites is not None:
+            mapa.fit_bounds(limites)
+    _html(cronometro, "engarrafamentos.mapa", mapa)
+
+
+# Primeira figura do plotly e primeiro mapa do folium carregam módulos e modelos; fora da medição
+def aquecer():
+    px.bar(pd.DataFrame({"x": ["a"], "y": [1]}), x="x", y="y", text_auto=True).to_json()
+    mapa_base(CENTRO_ALERTAS).get_root().render()
+
+
+def medir(alertas, engarrafamentos, latencia, repeticoes, comprimir=True, semente=0):
+    rodadas = []
+    with servidor_em_processo(alertas, engarrafamentos, latencia, comprimir, semente) as base:
+        configurar_urls(base)
+        for _ in range(repeticoes):
+            cronometro = Cronometro()
+            tokens = GerenciadorToken("benchmark", "benchmark")
+            with cronometro.etapa("token"):
+                tokens.obter()
+            rodada_alertas(cronometro, base, tokens)
+            rodada_engarrafamentos(cronometro, base, tokens)
+            rodadas.append(cronometro)
+
+    # Mediana das rodadas em cada etapa
+    return (
+        {nome: round(statistics.median(r.tempos[nome] for r in rodadas), 2) for nome in rodadas[0].tempos},
+        {nome: int(statistics.median(r.tamanhos[nome] for r in rodadas)) for nome in rodadas[0].tamanhos},
+    )
+
+
+def versao_do_codigo():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        alterado = subprocess.run(["git", "status", "--porcelain", "--", "app.py", "waze"], cwd=RAIZ,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecida"
+    return commit + ("-alterado" if alterado else "")
+
+
+def carregar_resultados(arquivo=ARQUIVO_RESULTADOS):
+    try:
+        with open(arquivo, encoding="utf-8") as entrada:
+            return [json.loads(linha) for linha in entrada if linha.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def gravar_resultado(resultado, arquivo=ARQUIVO_RESULTADOS):
+    with open(arquivo, "a", encoding="utf-8") as saida:
+        saida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+
+
+# Etapas que ficaram mais lentas que a execução anterior de mesmos parâmetros e máquina
+def regressoes(atual, anterior, limiar, minimo_ms):
+    encontradas = []
+    for nome, tempo in atual["etapas"].items():
+        antes = anterior["etapas"].get(nome)
+        if antes and tempo - antes > minimo_ms and tempo > antes * (1 + limiar):
+            encontradas.append(nome)
+    return encontradas
+
+
+def exibir(atual, anterior, encontradas):
+    print(f"\n{atual['parametros']}  versão {atual['versao']}"
+          + (f"  (comparado com {anterior['versao']} de {anterior['data'][:16]})" if anterior else ""))
+    for nome, tempo in atual["etapas"].items():
+        linha = f"  {nome:<32} {tempo:>10.1f} ms"
+        if anterior and nome in anterior["etapas"]:
+            antes = anterior["etapas"][nome]
+            linha += f"  {antes:>10.1f} ms  {(tempo - antes) / antes * 100 if antes else 0:+6.0f}%"
+            if nome in encontradas:
+                linha += "  REGRESSÃO"
+        print(linha)
+    for nome, tamanho in atual["tamanhos"].items():
+        print(f"  {nome:<32} {tamanho / 1024:>10.0f} KB")
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Mede cada etapa do painel contra o FeatureServer falso.")
+    parser.add_argument("--tamanhos", default="1000,10000,100000",
+                        help="quantidades de alertas, separadas por vírgula (ex.: 1000,10000,100000,500000)")
+    parser.add_argument("--fracao-engarrafamentos", type=float, default=0.2,
+                        help="engarrafamentos por alerta em cada tamanho")
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos de espera por requisição")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--sem-gzip", action="store_true")
+    parser.add_argument("--limiar", type=float, default=0.2, help="aumento relativo considerado regressão")
+    parser.add_argument("--minimo-ms", type=float, default=5.0, help="aumento absoluto mínimo para regressão")
+    parser.add_argument("--arquivo", default=ARQUIVO_RESULTADOS)
+    parser.add_argument("--nao-gravar", action="store_true", help="só exibir, sem acrescentar ao histórico")
+    parser.add_argument("--falhar-em-regressao", action="store_true", help="sair com código 1 se houver regressão")
+    argumentos = parser.parse_args(argumentos)
+
+    historico = carregar_resultados(argumentos.arquivo)
+    aquecer()
+    houve_regressao = False
+    for alertas in (int(tamanho) for tamanho in argumentos.tamanhos.split(",")):
+        parametros = {
+            "alertas": alertas,
+            "engarrafamentos": int(alertas * argumentos.fracao_engarrafamentos),
+            "latencia": argumentos.latencia,
+            "gzip": not argumentos.sem_gzip,
+            "repeticoes": argumentos.repeticoes,
+        }
+        etapas, tamanhos = medir(parametros["alertas"], parametros["engarrafamentos"], argumentos.latencia,
+                                 argumentos.repeticoes, not argumentos.sem_gzip)
+        atual = {
+            "versao": versao_do_codigo(),
+            "data": datetime.now(timezone.utc).isoformat(),
+            "maquina": platform.node(),
+            "python": platform.python_version(),
+            "parametros": parametros,
+            "etapas": etapas,
+            "tamanhos": tamanhos,
+        }
+        anteriores = [r for r in historico if r["parametros"] == parametros and r["maquina"] == atual["maquina"]]
+        anterior = anteriores[-1] if anteriores else None
+        encontradas = regressoes(atual, anterior, argumentos.limiar, argumentos.minimo_ms) if anterior else []
+        houve_regressao = houve_regressao or bool(encontradas)
+        exibir(atual, anterior, encontradas)
+
+        if not argumentos.nao_gravar:
+            gravar_resultado(atual, argumentos.arquivo)
+            historico.append(atual)
+
+    if houve_regressao and argumentos.falhar_em_regressao:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
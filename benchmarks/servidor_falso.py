@@ -0,0 +1,396 @@
+"""FeatureServer falso, para medir o painel sem o servidor do observatório.
+
+    python -m benchmarks.servidor_falso --alertas 10000 --engarrafamentos 2000 --latencia 0.05
+
+Atende o generateToken do portal e as consultas usadas pelo painel (páginas com
+resultOffset/resultRecordCount, returnCountOnly, returnIdsOnly, outStatistics e o
+filtro por envelope), com dados sintéticos e uma latência fixa por requisição.
+Em /_estatisticas, devolve quantas requisições atendeu e quantos bytes enviou.
+Para apontar o app para ele:
+
+    WAZE_PORTAL_URL=http://127.0.0.1:PORTA/portal
+    WAZE_FEATURE_SERVER_URL=http://127.0.0.1:PORTA/server/rest/services/waze/FeatureServer
+"""
+import argparse
+import gzip
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.dados_sinteticos import (TIPOS_ALERTAS, TIPOS_ENGARRAFAMENTOS, gerar_alertas,
+                                         gerar_engarrafamentos)
+from waze import config
+from waze.geometria import decodificar_linhas
+
+# Limite de registros por página do servidor real
+MAX_REGISTROS = 2000
+
+
+class ErroConsulta(Exception):
+    pass
+
+
+class CamadaFalsa:
+    """Colunas de uma camada em arrays, filtradas e paginadas como no FeatureServer."""
+
+    def __init__(self, colunas, tipos):
+        self.tipos = tipos
+        self.colunas = {}
+        for campo, valores in colunas.items():
+            array = np.array(valores, dtype=object)
+            if tipos.get(campo) != "esriFieldTypeString" and None not in valores:
+                array = np.array(valores)
+            self.colunas[campo] = array
+        self.tamanho = len(self.colunas["objectid"])
+        self._caixas = None
+
+    # Limites (oeste, sul, leste, norte) de cada registro, para o filtro por envelope
+    def caixas(self):
+        if self._caixas is None:
+            if "line" in self.colunas:
+                coordenadas, offsets = decodificar_linhas(self.colunas["line"])
+                inicio = offsets[:-1]
+                self._caixas = np.column_stack([
+                    np.minimum.reduceat(coordenadas[:, 0], inicio), np.minimum.reduceat(coordenadas[:, 1], inicio),
+                    np.maximum.reduceat(coordenadas[:, 0], inicio), np.maximum.reduceat(coordenadas[:, 1], inicio),
+                ])
+            else:
+                x = self.colunas["x"].astype(np.float64)
+                y = self.colunas["y"].astype(np.float64)
+                self._caixas = np.column_stack([x, y, x, y])
+        return self._caixas
+
+    def selecionar(self, parametros):
+        linhas = np.flatnonzero(avaliar_where(parametros.get("where", "1=1"), self.colunas, self.tamanho))
+        if parametros.get("geometry"):
+            oeste, sul, leste, norte = map(float, parametros["geometry"].split(","))
+            caixas = self.caixas()[linhas]
+            linhas = linhas[(caixas[:, 0] <= leste) & (caixas[:, 2] >= oeste)
+                            & (caixas[:, 1] <= norte) & (caixas[:, 3] >= sul)]
+        return linhas
+
+    def consultar(self, parametros):
+        linhas = self.selecionar(parametros)
+        if parametros.get("outStatistics"):
+            return self._estatisticas(linhas, parametros)
+        if parametros.get("returnCountOnly") == "true":
+            return {"count": len(linhas)}
+        if parametros.get("returnIdsOnly") == "true":
+            return {"objectIdFieldName": "objectid", "objectIds": self.colunas["objectid"][linhas].tolist()}
+
+        campos = parametros.get("outFields", "*")
+        campos = list(self.colunas) if campos == "*" else campos.split(",")
+        desconhecidos = [campo for campo in campos if campo not in self.colunas]
+        if desconhecidos:
+            raise ErroConsulta(f"Campos inválidos: {', '.join(desconhecidos)}")
+
+        inicio = int(parametros.get("resultOffset", 0))
+        quantidade = min(int(parametros.get("resultRecordCount", MAX_REGISTROS)), MAX_REGISTROS)
+        pagina = linhas[inicio:inicio + quantidade]
+        valores = [self.colunas[campo][pagina].tolist() for campo in campos]
+        return {
+            "objectIdFieldName": "objectid",
+            "fields": [{"name": campo, "type": self.tipos.get(campo, "esriFieldTypeString")} for campo in campos],
+            "features": [{"attributes": dict(zip(campos, registro))} for registro in zip(*valores)],
+            "exceededTransferLimit": inicio + quantidade < len(linhas),
+        }
+
+    def _estatisticas(self, linhas, parametros):
+        estatisticas = json.loads(parametros["outStatistics"])
+        grupos = [campo for campo in parametros.get("groupByFieldsForStatistics", "").split(",") if campo]
+        campos = set(grupos) | {estatistica["onStatisticField"] for estatistica in estatisticas}
+        dados = pd.DataFrame({campo: self.colunas[campo][linhas] for campo in campos})
+        funcoes = {"count": "count", "sum": "sum", "min": "min", "max": "max", "avg": "mean"}
+
+        if grupos:
+            agrupados = dados.groupby(grupos, dropna=False, sort=False)
+            tabela = pd.DataFrame({e["outStatisticFieldName"]: agrupados[e["onStatisticField"]].agg(
+                funcoes[e["statisticType"]]) for e in estatisticas}).reset_index()
+        else:
+            tabela = pd.DataFrame([{e["outStatisticFieldName"]: dados[e["onStatisticField"]].agg(
+                funcoes[e["statisticType"]]) for e in estatisticas}])
+        tabela = tabela.astype(object).where(tabela.notna(), None)
+        return {"features": [{"attributes": registro} for registro in tabela.to_dict("records")]}
+
+
+# Cláusula where do ArcGIS (o subconjunto usado pelo painel) como máscara sobre as colunas:
+# comparações, IN, IS [NOT] NULL, TIMESTAMP '...', AND/OR/NOT e parênteses
+_TOKEN = re.compile(r"\s*(?:(?P<texto>'(?:[^']|'')*')|(?P<numero>-?\d+(?:\.\d+)?)|"
+                    r"(?P<operador><>|>=|<=|=|>|<|\(|\)|,)|(?P<nome>\w+))")
+
+
+def _tokens(where):
+    tokens, posicao = [], 0
+    where = where.strip()
+    while posicao < len(where):
+        encontrado = _TOKEN.match(where, posicao)
+        if not encontrado:
+            raise ErroConsulta(f"where inválido perto de: {where[posicao:posicao + 20]!r}")
+        tipo = encontrado.lastgroup
+        valor = encontrado.group(tipo)
+        if tipo == "texto":
+            valor = valor[1:-1].replace("''", "'")
+        elif tipo == "numero":
+            valor = float(valor) if "." in valor else int(valor)
+        elif tipo == "nome" and valor.upper() in ("AND", "OR", "NOT", "IN", "IS", "NULL", "TIMESTAMP"):
+            tipo, valor = "palavra", valor.upper()
+        tokens.append((tipo, valor))
+        posicao = encontrado.end()
+    return tokens
+
+
+class _Where:
+    def __init__(self, where, colunas, tamanho):
+        self.tokens = _tokens(where)
+        self.posicao = 0
+        self.colunas = colunas
+        self.tamanho = tamanho
+
+    def _proximo(self):
+        return self.tokens[self.posicao] if self.posicao < len(self.tokens) else (None, None)
+
+    def _consumir(self, *esperado):
+        token = self._proximo()
+        if esperado and token[1] not in esperado:
+            raise ErroConsulta(f"where inválido: esperado {esperado}, veio {token[1]!r}")
+        self.posicao += 1
+        return token
+
+    def avaliar(self):
+        mascara = self._ou()
+        if self.posicao != len(self.tokens):
+            raise ErroConsulta(f"where inválido perto de {self._proximo()[1]!r}")
+        return mascara
+
+    def _ou(self):
+        mascara = self._e()
+        while self._proximo() == ("palavra", "OR"):
+            self._consumir()
+            mascara = mascara | self._e()
+        return mascara
+
+    def _e(self):
+        mascara = self._nao()
+        while self._proximo() == ("palavra", "AND"):
+            self._consumir()
+            mascara = mascara & self._nao()
+        return mascara
+
+    def _nao(self):
+        if self._proximo() == ("palavra", "NOT"):
+            self._consumir()
+            return ~self._nao()
+        if self._proximo() == ("operador", "("):
+            self._consumir()
+            mascara = self._ou()
+            self._consumir(")")
+            return mascara
+        return self._comparacao()
+
+    def _operando(self):
+        tipo, valor = self._consumir()
+        if tipo == "nome":
+            if valor not in self.colunas:
+                raise ErroConsulta(f"Campo inválido: {valor}")
+            return self.colunas[valor]
+        if (tipo, valor) == ("palavra", "TIMESTAMP"):
+            _, texto = self._consumir()
+            instante = datetime.strptime(texto, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+            return int(instante.timestamp() * 1000)
+        if tipo in ("texto", "numero"):
+            return valor
+        raise ErroConsulta(f"where inválido perto de {valor!r}")
+
+    def _comparacao(self):
+        esquerda = self._operando()
+        tipo, valor = self._consumir()
+        if valor == "IS":
+            negado = self._proximo() == ("palavra", "NOT")
+            if negado:
+                self._consumir()
+            self._consumir("NULL")
+            nulos = _nulos(esquerda, self.tamanho)
+            return ~nulos if negado else nulos
+        if valor == "IN":
+            self._consumir("(")
+            valores = [self._operando()]
+            while self._proximo() == ("operador", ","):
+                self._consumir()
+                valores.append(self._operando())
+            self._consumir(")")
+            validos = ~_nulos(esquerda, self.tamanho)
+            resultado = np.zeros(self.tamanho, dtype=bool)
+            resultado[validos] = np.isin(esquerda[validos], valores)
+            return resultado
+        if tipo != "operador" or valor not in ("=", "<>", ">", ">=", "<", "<="):
+            raise ErroConsulta(f"where inválido perto de {valor!r}")
+        return _comparar(esquerda, valor, self._operando(), self.tamanho)
+
+
+def _nulos(valores, tamanho):
+    if isinstance(valores, np.ndarray):
+        if valores.dtype == object:
+            return np.equal(valores, None)
+        if valores.dtype.kind == "f":
+            return np.isnan(valores)
+        return np.zeros(tamanho, dtype=bool)
+    return np.full(tamanho, valores is None)
+
+
+def _comparar(esquerda, operador, direita, tamanho):
+    operacoes = {"=": np.equal, "<>": np.not_equal, ">": np.greater, ">=": np.greater_equal,
+                 "<": np.less, "<=": np.less_equal}
+    if not isinstance(esquerda, np.ndarray) and not isinstance(direita, np.ndarray):
+        return np.full(tamanho, bool(operacoes[operador](esquerda, direita)))  # ex.: 1=1
+    validos = ~(_nulos(esquerda, tamanho) | _nulos(direita, tamanho))
+    resultado = np.zeros(tamanho, dtype=bool)
+    # Como no SQL, comparações com nulo são falsas
+    esquerda = esquerda[validos] if isinstance(esquerda, np.ndarray) else esquerda
+    direita = direita[validos] if isinstance(direita, np.ndarray) else direita
+    resultado[validos] = operacoes[operador](esquerda, direita)
+    return resultado
+
+
+def avaliar_where(where, colunas, tamanho):
+    return _Where(where, colunas, tamanho).avaliar()
+
+
+class ServidorFalso:
+    """Portal + FeatureServer falsos num ThreadingHTTPServer, com latência por requisição.
+
+    `camadas` é um dict número -> CamadaFalsa. `bytes_enviados` acumula o tamanho
+    das respostas (já comprimidas), para medir o volume recebido pelo cliente.
+    """
+
+    def __init__(self, camadas, latencia=0.0, comprimir=True, porta=0):
+        self.camadas = camadas
+        self.latencia = latencia
+        self.comprimir = comprimir
+        self.requisicoes = 0
+        self.bytes_enviados = 0
+        self._lock = threading.Lock()
+        self._http = ThreadingHTTPServer(("127.0.0.1", porta), self._manipulador())
+        self._http.daemon_threads = True
+
+    @property
+    def porta(self):
+        return self._http.server_address[1]
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.porta}"
+
+    def iniciar(self):
+        threading.Thread(target=self._http.serve_forever, daemon=True).start()
+        return self
+
+    def parar(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+    # Apontar o pacote waze (neste processo) para este servidor
+    def configurar(self):
+        configurar_urls(self.url)
+
+    def _registrar(self, tamanho):
+        with self._lock:
+            self.requisicoes += 1
+            self.bytes_enviados += tamanho
+
+    def _responder(self, caminho, parametros):
+        if caminho == "/_estatisticas":
+            with self._lock:
+                return {"requisicoes": self.requisicoes, "bytes": self.bytes_enviados}
+        if self.latencia:
+            time.sleep(self.latencia)
+        if caminho.endswith("/generateToken"):
+            validade = int(parametros.get("expiration", 60))
+            return {"token": f"falso-{time.time_ns()}", "expires": int((time.time() + validade * 60) * 1000)}
+
+        encontrado = re.search(r"/FeatureServer/(\d+)/query$", caminho)
+        if not encontrado or int(encontrado.group(1)) not in self.camadas:
+            return {"error": {"code": 400, "message": f"Caminho inválido: {caminho}"}}
+        if not parametros.get("token"):
+            return {"error": {"code": 499, "message": "Token Required"}}
+        try:
+            return self.camadas[int(encontrado.group(1))].consultar(parametros)
+        except (ErroConsulta, ValueError, KeyError) as erro:
+            return {"error": {"code": 400, "message": str(erro)}}
+
+    def _manipulador(self):
+        servidor = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # conexões mantidas abertas, como no servidor real
+
+            def log_message(self, formato, *args):
+                pass
+
+            def _enviar(self, parametros):
+                corpo = json.dumps(servidor._responder(urlparse(self.path).path, parametros)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                if servidor.comprimir and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    corpo = gzip.compress(corpo, compresslevel=5)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+                if urlparse(self.path).path != "/_estatisticas":
+                    servidor._registrar(len(corpo))
+
+            def do_GET(self):
+                self._enviar({chave: valores[0] for chave, valores in parse_qs(urlparse(self.path).query).items()})
+
+            def do_POST(self):
+                tamanho = int(self.headers.get("Content-Length", 0))
+                corpo = self.rfile.read(tamanho).decode()
+                self._enviar({chave: valores[0] for chave, valores in parse_qs(corpo).items()})
+
+        return Manipulador
+
+
+def configurar_urls(base):
+    config.PORTAL_URL = base + "/portal"
+    config.TOKEN_URL = config.PORTAL_URL + "/sharing/rest/generateToken"
+    config.FEATURE_SERVER_URL = base + "/server/rest/services/waze/FeatureServer"
+
+
+def criar_servidor(alertas, engarrafamentos, latencia=0.0, comprimir=True, porta=0, semente=0):
+    camadas = {
+        config.CAMADA_ALERTAS: CamadaFalsa(gerar_alertas(alertas, semente), TIPOS_ALERTAS),
+        config.CAMADA_ENGARRAFAMENTOS: CamadaFalsa(gerar_engarrafamentos(engarrafamentos, semente),
+                                                   TIPOS_ENGARRAFAMENTOS),
+    }
+    return ServidorFalso(camadas, latencia, comprimir, porta)
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="FeatureServer falso com dados sintéticos do Waze.")
+    parser.add_argument("--alertas", type=int, default=10000)
+    parser.add_argument("--engarrafamentos", type=int, default=2000)
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos de espera por requisição")
+    parser.add_argument("--sem-gzip", action="store_true", help="responder sem compressão")
+    parser.add_argument("--porta", type=int, default=0, help="0 escolhe uma porta livre")
+    parser.add_argument("--semente", type=int, default=0)
+    argumentos = parser.parse_args(argumentos)
+
+    servidor = criar_servidor(argumentos.alertas, argumentos.engarrafamentos, argumentos.latencia,
+                              not argumentos.sem_gzip, argumentos.porta, argumentos.semente)
+    # Primeira linha da saída: quem iniciou o processo lê a porta dela
+    print(f"porta {servidor.porta}", flush=True)
+    try:
+        servidor._http.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Estruturas guardadas por DataFrame (waze.cache.por_dataframe)."""
+import gc
+import threading
+import time
+import weakref
+
+import pandas as pd
+import pytest
+
+from waze.cache import por_dataframe
+
+
+class Estrutura:
+    def __init__(self, dados, parametro):
+        self.dados = weakref.ref(dados)
+        self.parametro = parametro
+
+
+def contador():
+    chamadas = []
+
+    @por_dataframe
+    def obter(dados, parametro=1):
+        chamadas.append(parametro)
+        time.sleep(0.01)
+        return Estrutura(dados, parametro)
+
+    return obter, chamadas
+
+
+def test_mesmo_dataframe_mesmo_objeto():
+    obter, chamadas = contador()
+    dados, outros = pd.DataFrame({'a': [1]}), pd.DataFrame({'a': [1]})
+    assert obter(dados) is obter(dados) is obter(dados, 1) is obter(dados, parametro=1)
+    assert obter(dados, 2) is not obter(dados)
+    assert obter(outros) is not obter(dados)
+    assert chamadas == [1, 2, 1]
+
+
+def test_entrada_some_com_o_dataframe():
+    obter, chamadas = contador()
+    dados = pd.DataFrame({'a': [1]})
+    estrutura = weakref.ref(obter(dados))
+    del dados
+    gc.collect()
+    assert estrutura() is None
+
+    # Um DataFrame novo (mesmo que reaproveite o id do anterior) tem a sua própria estrutura
+    dados = pd.DataFrame({'a': [2]})
+    assert obter(dados).dados() is dados
+    assert len(chamadas) == 2
+
+
+def test_chamadas_simultaneas_montam_uma_vez():
+    obter, chamadas = contador()
+    dados = pd.DataFrame({'a': [1]})
+    resultados = []
+    threads = [threading.Thread(target=lambda: resultados.append(obter(dados))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert chamadas == [1]
+    assert all(resultado is resultados[0] for resultado in resultados)
+
+
+def test_erro_nao_fica_guardado():
+    tentativas = []
+
+    @por_dataframe
+    def obter(dados):
+        tentativas.append(1)
+        if len(tentativas) == 1:
+            raise ValueError("falhou")
+        return Estrutura(dados, 0)
+
+    dados = pd.DataFrame({'a': [1]})
+    with pytest.raises(ValueError):
+        obter(dados)
+    assert obter(dados) is obter(dados)
+    assert len(tentativas) == 2
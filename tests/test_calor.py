@@ -0,0 +1,73 @@
+"""Pirâmide do mapa de calor (waze.calor), conferida com o agrupamento direto dos pontos."""
+import folium
+import numpy as np
+import pandas as pd
+import pytest
+from folium.plugins import HeatMap
+
+from benchmarks.dados_sinteticos import gerar_alertas
+from waze.calor import PiramideCalor, tamanho_celula
+from waze.mapas import camada_calor
+from waze.normalizacao import preparar_alertas
+
+
+def tamanho_html(camada):
+    mapa = folium.Map()
+    camada.add_to(mapa)
+    return len(mapa.get_root().render().encode())
+
+
+def test_pesos_conferem_com_groupby():
+    alertas = preparar_alertas(gerar_alertas(3000))
+    piramide = PiramideCalor(alertas)
+    regional = alertas['Regional'].value_counts().index[0]
+    tipo = alertas['Tipo de Alerta'].value_counts().index[0]
+
+    for filtros in ({}, {'Regional': regional}, {'Regional': regional, 'Tipo de Alerta': tipo}):
+        filtrados = alertas
+        for coluna, valor in filtros.items():
+            filtrados = filtrados[filtrados[coluna] == valor]
+        filtrados = filtrados.dropna(subset=['Latitude', 'Longitude'])
+        lat = filtrados['Latitude'].to_numpy(dtype=np.float64)
+        lon = filtrados['Longitude'].to_numpy(dtype=np.float64)
+
+        for nivel, zoom in enumerate(piramide.zooms):
+            tamanho = tamanho_celula(zoom)
+            esperado = pd.Series(1, index=pd.MultiIndex.from_arrays(
+                [np.floor(lon / tamanho), np.floor(lat / tamanho)])).groupby(level=[0, 1]).size()
+            pesos = piramide.pesos(nivel, filtros)
+            assert sorted(pesos[pesos > 0].tolist()) == sorted(esperado.tolist())
+
+            pontos = piramide.pontos(nivel, filtros)
+            assert sum(peso for _, _, peso in pontos) == len(filtrados)
+
+
+# O mapa estático nunca fica maior que o mapa de calor com um ponto por alerta e,
+# a partir de certa quantidade, para de crescer com ela (fica limitado pela grade)
+@pytest.fixture(scope="module")
+def tamanhos():
+    resultado = {}
+    for quantidade in (500, 5000, 50_000, 200_000):
+        alertas = preparar_alertas(gerar_alertas(quantidade))
+        pontos = alertas[['Latitude', 'Longitude']].dropna().to_numpy(dtype=np.float64).round(5).tolist()
+        resultado[quantidade] = (tamanho_html(camada_calor(PiramideCalor(alertas))), tamanho_html(HeatMap(pontos)))
+    return resultado
+
+
+@pytest.mark.parametrize("quantidade", [500, 5000, 50_000, 200_000])
+def test_mapa_estatico_nao_passa_dos_pontos(tamanhos, quantidade):
+    calor, pontos = tamanhos[quantidade]
+    assert calor <= pontos
+
+
+def test_mapa_estatico_limitado_pela_grade(tamanhos):
+    assert tamanhos[200_000][0] < 1.5 * tamanhos[50_000][0]
+
+
+def test_poucos_pontos_vao_sem_agregar():
+    alertas = preparar_alertas(gerar_alertas(300))
+    regional = alertas['Regional'].value_counts().index[0]
+    camada = camada_calor(PiramideCalor(alertas), {'Regional': regional})
+    filtrados = alertas[alertas['Regional'] == regional].dropna(subset=['Latitude', 'Longitude'])
+    assert type(camada) is HeatMap
+    assert len(camada.data) == len(filtrados)
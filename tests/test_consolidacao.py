@@ -0,0 +1,55 @@
+"""Consolidação de alertas quase repetidos (waze.consolidacao), conferida com a comparação par a par."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from waze.consolidacao import agrupar, consolidar
+from waze.malha import projetar
+
+
+def grupos_por_forca_bruta(categorias, longitudes, latitudes, instantes, distancia, janela):
+    x, y = projetar(longitudes, latitudes)
+    pais = list(range(len(x)))
+
+    def raiz(i):
+        while pais[i] != i:
+            i = pais[i]
+        return i
+
+    for i in range(len(x)):
+        for j in range(i + 1, len(x)):
+            perto = categorias[i] == categorias[j] and np.hypot(x[i] - x[j], y[i] - y[j]) <= distancia
+            if perto and (not janela or abs(instantes[i] - instantes[j]) <= janela * 60_000):
+                pais[raiz(i)] = raiz(j)
+    return np.unique([raiz(i) for i in range(len(x))], return_inverse=True)[1]
+
+
+def mesma_particao(a, b):
+    return len(set(zip(a, b))) == a.max() + 1 == b.max() + 1
+
+
+@pytest.mark.parametrize("quantidade, janela", [(1500, 0), (1500, 30), (1, 0)])
+def test_grupos_conferem_com_forca_bruta(quantidade, janela):
+    gerador = np.random.default_rng(quantidade + int(janela))
+    longitudes = -44 + gerador.random(quantidade) * 0.03
+    latitudes = -19.9 + gerador.random(quantidade) * 0.03
+    longitudes[::97] = np.nan
+    categorias = gerador.integers(0, 3, quantidade)
+    instantes = gerador.integers(0, 6 * 3600_000, quantidade).astype(float)
+
+    grupos = agrupar(categorias, longitudes, latitudes, instantes, 60, janela)
+    esperado = grupos_por_forca_bruta(categorias, longitudes, latitudes, instantes, 60, janela)
+    assert mesma_particao(grupos, esperado)
+
+
+def test_consolidar_sem_instante_agrupa_pela_distancia():
+    dados = pd.DataFrame({
+        'Tipo de Alerta': pd.Categorical(['A', 'A', 'B', None]),
+        'Subtipo de Alerta': pd.Categorical(['x', 'x', 'x', 'x']),
+        'Latitude': np.float32([-19.9, -19.9001, -19.9, -19.9]),
+        'Longitude': np.float32([-44, -44, -44, np.nan]),
+    })
+    consolidados = consolidar(dados, distancia=50, janela=30)
+    assert consolidados['Relatos'].tolist() == [2, 1, 1]
+    assert consolidados['Latitude'].dtype == np.float32
+    assert consolidados['Relatos'].sum() == len(dados)
@@ -0,0 +1,29 @@
+"""Decodificação das linhas dos engarrafamentos (waze.geometria), conferida com ast.literal_eval."""
+import ast
+
+import numpy as np
+
+from benchmarks.dados_sinteticos import gerar_engarrafamentos
+from waze.geometria import decodificar_linhas, linhas_por_registro
+
+
+def test_textos_conferem_com_literal_eval():
+    textos = gerar_engarrafamentos(300)['line']
+    coordenadas, offsets = decodificar_linhas(textos)
+    for texto, inicio, fim in zip(textos, offsets[:-1], offsets[1:]):
+        esperado = [(ponto['x'], ponto['y']) for ponto in ast.literal_eval(texto)]
+        np.testing.assert_array_equal(coordenadas[inicio:fim], esperado)
+
+
+def test_vetores_planos_e_formatos_mistos():
+    textos = gerar_engarrafamentos(50)['line']
+    coordenadas, offsets = decodificar_linhas(textos)
+    de_novo, offsets_de_novo = decodificar_linhas(linhas_por_registro(coordenadas, offsets))
+    np.testing.assert_array_equal(de_novo, coordenadas)
+    np.testing.assert_array_equal(offsets_de_novo, offsets)
+
+    # Registro fora do formato esperado: decodificação um a um, sem perder os demais
+    mistos, offsets_mistos = decodificar_linhas(textos[:3] + [None, [[1.0, 2.0], [3.0, 4.0]]])
+    np.testing.assert_array_equal(mistos[-2:], [[1, 2], [3, 4]])
+    np.testing.assert_array_equal(offsets_mistos[:4], offsets[:4])
+    assert offsets_mistos[4] == offsets_mistos[3]
@@ -0,0 +1,57 @@
+"""Índice invertido em bitsets (waze.indice) e motor dos cards (waze.metricas), conferidos com o pandas."""
+import pytest
+
+from benchmarks.dados_sinteticos import gerar_alertas
+from waze.indice import IndiceFiltros
+from waze.metricas import MotorResumo
+from waze.normalizacao import preparar_alertas
+
+
+@pytest.fixture(scope="module")
+def alertas():
+    return preparar_alertas(gerar_alertas(3000))
+
+
+def filtros_de(alertas):
+    regional = alertas['Regional'].value_counts().index[0]
+    tipo = alertas.loc[alertas['Regional'] == regional, 'Tipo de Alerta'].value_counts().index[0]
+    return [{}, {'Regional': regional}, {'Regional': regional, 'Tipo de Alerta': tipo},
+            {'Regional': 'inexistente'}]
+
+
+def mascara_pandas(dados, filtros):
+    mascara = dados.index == dados.index
+    for coluna, valor in filtros.items():
+        mascara &= (dados[coluna] == valor).to_numpy()
+    return mascara
+
+
+def test_mascara_e_opcoes(alertas):
+    indice = IndiceFiltros(alertas)
+    for filtros in filtros_de(alertas):
+        mascara = indice.mascara(filtros)
+        esperada = mascara_pandas(alertas, filtros)
+        assert (esperada.all() if mascara is None else (mascara == esperada).all())
+
+        outros = {coluna: valor for coluna, valor in filtros.items() if coluna != 'Subtipo de Alerta'}
+        contagens = alertas[mascara_pandas(alertas, outros)]['Subtipo de Alerta'].value_counts()
+        assert indice.opcoes('Subtipo de Alerta', filtros) == {valor: n for valor, n in contagens.items() if n}
+
+
+def test_motor_confere_com_groupby(alertas):
+    motor = MotorResumo(alertas)
+    for filtros in filtros_de(alertas):
+        filtrados = alertas[mascara_pandas(alertas, filtros)]
+        contagens = motor.contagens(['Subtipo de Alerta', 'Tipo de Alerta'], filtros, nome='n')
+        esperado = filtrados.groupby(['Subtipo de Alerta', 'Tipo de Alerta'], observed=True).size()
+        assert dict(zip(zip(contagens['Subtipo de Alerta'], contagens['Tipo de Alerta']), contagens['n'])) == \
+            esperado.to_dict()
+
+        total, maiores = motor.resumo(['Rodovia', 'Município'], filtros)
+        assert total == len(filtrados)
+        for dimensao in ('Rodovia', 'Município'):
+            contagens = filtrados[dimensao].value_counts()
+            if maiores[dimensao]:
+                assert maiores[dimensao][0][1] == contagens.iloc[0]
+            else:
+                assert not contagens.any()
@@ -0,0 +1,32 @@
+"""Ajuste de pontos à malha viária (waze.malha), conferido com a busca em todos os segmentos."""
+import numpy as np
+
+from benchmarks.dados_sinteticos import gerar_malha_viaria
+from waze.malha import MalhaViaria, projetar
+
+
+def test_ajuste_confere_com_forca_bruta():
+    malha = MalhaViaria(gerar_malha_viaria()['features'], raio=2000)
+    gerador = np.random.default_rng(3)
+    segmentos = gerador.integers(0, len(malha.x0), 400)
+    x = malha.x0[segmentos] + gerador.normal(0, 1500, len(segmentos))
+    y = malha.y0[segmentos] + gerador.normal(0, 1500, len(segmentos))
+    x[:20] += 1e6  # longe de tudo
+    # A projeção é linear: volta para longitude e latitude dividindo pela escala de cada eixo
+    escala_x, escala_y = projetar(np.ones(1), np.ones(1))
+    longitudes, latitudes = x / escala_x, y / escala_y
+
+    trechos, distancias = malha.ajustar_pontos(longitudes, latitudes)
+
+    x, y = projetar(longitudes, latitudes)
+    bx, by = malha.x1 - malha.x0, malha.y1 - malha.y0
+    comprimento = bx * bx + by * by
+    for k in range(len(x)):
+        t = np.clip(((x[k] - malha.x0) * bx + (y[k] - malha.y0) * by) / np.where(comprimento > 0, comprimento, 1), 0, 1)
+        todas = np.hypot(x[k] - malha.x0 - t * bx, y[k] - malha.y0 - t * by)
+        menor = todas.min()
+        if menor > malha.raio:
+            assert trechos[k] == -1 and np.isnan(distancias[k])
+        else:
+            assert np.isclose(distancias[k], menor)
+            assert np.isclose(todas[malha.donos == trechos[k]].min(), menor)
@@ -0,0 +1,73 @@
+"""Séries por hora e por dia dos engarrafamentos (waze.series)."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.dados_sinteticos import gerar_engarrafamentos
+from waze.normalizacao import preparar_engarrafamentos
+from waze.series import FUSO_MS, HORA_MS, HORAS_GUARDADAS, HORAS_SEMANA, SerieEngarrafamentos, semear
+from waze.snapshot import ArmazemSnapshots
+
+
+def engarrafamentos(n=2000):
+    colunas = {campo: np.array(valores, dtype=object if campo == 'line' else None)
+               for campo, valores in gerar_engarrafamentos(n).items()}
+    return preparar_engarrafamentos(colunas)
+
+
+def test_horas_conferem_com_groupby():
+    dados = engarrafamentos()
+    serie = SerieEngarrafamentos()
+    serie.atualizar(dados)
+
+    filtros = {'regional': dados['regional'].value_counts().index[0]}
+    tabela = serie.serie_horaria(filtros, horas=6)
+    filtrados = dados[dados['regional'] == filtros['regional']]
+    horas = (filtrados['pubmillis'].astype(np.int64) + FUSO_MS) // HORA_MS
+    esperado = filtrados.groupby(horas).agg(contagem=('objectid', 'size'), comprimento=('length', 'sum'))
+    periodos = (tabela.index.asi8 // 1_000_000 + FUSO_MS) // HORA_MS
+    esperado = esperado.reindex(periodos, fill_value=0)
+    np.testing.assert_allclose(tabela['contagem'].to_numpy(), esperado['contagem'].to_numpy())
+    np.testing.assert_allclose(tabela['comprimento'].to_numpy(), esperado['comprimento'].to_numpy())
+
+
+def test_semana_anterior_confere_com_groupby():
+    dados = engarrafamentos(20000)
+    # Um engarrafamento a cada poucos minutos ao longo de dez dias: todas as horas têm dados
+    dados['pubmillis'] = dados['pubmillis'].max() - np.arange(len(dados)) * (240 * HORA_MS // len(dados))
+    serie = SerieEngarrafamentos()
+    serie.atualizar(dados)
+
+    filtros = {'level': dados['level'].value_counts().index[0]}
+    tabela = serie.serie_horaria(filtros, 48, deslocamento=HORAS_SEMANA)
+    filtrados = dados[dados['level'] == filtros['level']]
+    horas = (filtrados['pubmillis'].astype(np.int64) + FUSO_MS) // HORA_MS
+    esperado = filtrados.groupby(horas).agg(contagem=('objectid', 'size'), comprimento=('length', 'sum'))
+    periodos = (tabela.index.asi8 // 1_000_000 + FUSO_MS) // HORA_MS
+    esperado = esperado.reindex(periodos, fill_value=0)
+    assert (esperado['contagem'] > 0).all()
+    np.testing.assert_allclose(tabela['contagem'].to_numpy(), esperado['contagem'].to_numpy())
+    np.testing.assert_allclose(tabela['comprimento'].to_numpy(), esperado['comprimento'].to_numpy())
+
+    # Horas que já saíram do anel não voltam como zero
+    with pytest.raises(ValueError):
+        serie.serie_horaria(filtros, 48, deslocamento=HORAS_GUARDADAS)
+
+
+def test_semear_com_as_copias_em_disco(tmp_path):
+    dados = engarrafamentos()
+    armazem = ArmazemSnapshots('engarrafamentos', diretorio=str(tmp_path))
+    armazem.salvar(dados.iloc[:1200].reset_index(drop=True))
+    armazem.salvar(dados.iloc[600:].reset_index(drop=True))
+
+    semeada = SerieEngarrafamentos()
+    assert semear(semeada, 'engarrafamentos', str(tmp_path)) == len(dados)
+    direta = SerieEngarrafamentos()
+    direta.atualizar(dados)
+    pd.testing.assert_frame_equal(semeada.serie_horaria(horas=12), direta.serie_horaria(horas=12))
+    pd.testing.assert_frame_equal(semeada.serie_diaria(dias=3), direta.serie_diaria(dias=3))
+
+
+def test_semear_sem_copias(tmp_path):
+    assert semear(SerieEngarrafamentos(), 'engarrafamentos', str(tmp_path)) == 0
+    assert semear(SerieEngarrafamentos(), 'engarrafamentos', '') == 0
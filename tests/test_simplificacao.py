@@ -0,0 +1,37 @@
+"""Douglas-Peucker vetorizado (waze.simplificacao), conferido com a versão recursiva linha a linha."""
+import numpy as np
+import pytest
+
+from waze.simplificacao import simplificar
+
+
+def douglas_peucker(pontos, tolerancia):
+    if len(pontos) < 3:
+        return list(range(len(pontos)))
+    a, b, p = pontos[0], pontos[-1], pontos[1:-1]
+    ab = b - a
+    comprimento = (ab * ab).sum()
+    t = np.clip(((p - a) * ab).sum(axis=1) / (comprimento if comprimento > 0 else 1), 0, 1)
+    distancias = np.hypot(*(p - a - t[:, None] * ab).T)
+    divisao = int(distancias.argmax()) + 1
+    if distancias[divisao - 1] <= tolerancia:
+        return [0, len(pontos) - 1]
+    esquerda = douglas_peucker(pontos[:divisao + 1], tolerancia)
+    direita = douglas_peucker(pontos[divisao:], tolerancia)
+    return esquerda + [divisao + indice for indice in direita[1:]]
+
+
+@pytest.mark.parametrize("tolerancia", [0.0, 0.001, 0.01])
+def test_confere_com_a_versao_recursiva(tolerancia):
+    gerador = np.random.default_rng(7)
+    tamanhos = gerador.integers(0, 60, 300)
+    tamanhos[:4] = [0, 1, 2, 3]
+    offsets = np.concatenate([[0], np.cumsum(tamanhos)])
+    coordenadas = np.cumsum(gerador.normal(0, 0.005, (offsets[-1], 2)), axis=0)
+    coordenadas[offsets[4]:offsets[5]] = coordenadas[offsets[4]]  # linha com todos os pontos iguais
+
+    simplificadas, novos_offsets = simplificar(coordenadas, offsets, tolerancia)
+    for linha in range(len(tamanhos)):
+        pontos = coordenadas[offsets[linha]:offsets[linha + 1]]
+        esperado = pontos[douglas_peucker(pontos, tolerancia)]
+        np.testing.assert_array_equal(simplificadas[novos_offsets[linha]:novos_offsets[linha + 1]], esperado)
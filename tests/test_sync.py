@@ -0,0 +1,110 @@
+"""Sincronização incremental contra o FeatureServer falso (benchmarks.servidor_falso)."""
+import numpy as np
+import pytest
+
+from benchmarks.dados_sinteticos import gerar_malha_viaria
+from benchmarks.servidor_falso import criar_servidor
+from waze import config
+from waze.autenticacao import GerenciadorToken
+from waze.calor import obter_piramide
+from waze.camadas import ALERTAS, ENGARRAFAMENTOS
+from waze.indice import obter_indice
+from waze.malha import MalhaViaria, obter_ajuste
+from waze.metricas import obter_motor
+from waze.simplificacao import obter_linhas_simplificadas
+from waze.snapshot import ArmazemSnapshots
+from waze.sync import SincronizadorCamada
+
+
+@pytest.fixture
+def servidor():
+    servidor = criar_servidor(300, 200, comprimir=False).iniciar()
+    servidor.configurar()
+    yield servidor
+    servidor.parar()
+
+
+@pytest.fixture
+def tokens(servidor):
+    return GerenciadorToken("teste", "teste")
+
+
+def sincronizador(camada, diretorio):
+    sincronizador = SincronizadorCamada(camada.url, camada.campos, camada.preparar,
+                                        incremental=True, **camada.opcoes_sync)
+    sincronizador.armazem = ArmazemSnapshots(camada.nome, diretorio=str(diretorio))
+    return sincronizador
+
+
+def test_camadas_seguem_o_servidor_configurado(servidor):
+    # As camadas foram importadas antes de configurar o servidor falso
+    assert ALERTAS.url == f"{config.FEATURE_SERVER_URL}/{config.CAMADA_ALERTAS}/query"
+    assert ENGARRAFAMENTOS.url.startswith(servidor.url)
+
+
+CASOS = [ALERTAS, ENGARRAFAMENTOS]
+
+
+@pytest.mark.parametrize("camada", CASOS, ids=["alertas", "engarrafamentos"])
+def test_atualizacao_sem_mudancas_mantem_o_mesmo_objeto(servidor, tokens, tmp_path, camada):
+    sync = sincronizador(camada, tmp_path)
+    primeira = sync.atualizar(tokens)
+    assert sync.atualizar(tokens) is primeira
+    assert sync.atualizar(tokens) is primeira
+
+
+# Os índices e agregados guardados por DataFrame continuam valendo depois de uma atualização sem mudanças
+@pytest.mark.parametrize("camada", CASOS, ids=["alertas", "engarrafamentos"])
+def test_estruturas_por_dataframe_sobrevivem_a_atualizacao(servidor, tokens, tmp_path, camada):
+    malha = MalhaViaria(gerar_malha_viaria()['features'], raio=20_000)
+    sync = sincronizador(camada, tmp_path)
+    obter = [obter_indice, obter_motor, lambda dados: obter_ajuste(dados, malha),
+             obter_piramide if camada is ALERTAS else obter_linhas_simplificadas]
+    antes = [funcao(sync.atualizar(tokens)) for funcao in obter]
+    depois = [funcao(sync.atualizar(tokens)) for funcao in obter]
+    assert all(a is d for a, d in zip(antes, depois))
+
+
+def test_edicao_e_exclusao_chegam_no_delta(servidor, tokens, tmp_path):
+    sync = sincronizador(ENGARRAFAMENTOS, tmp_path)
+    primeira = sync.atualizar(tokens)
+
+    colunas = servidor.camadas[config.CAMADA_ENGARRAFAMENTOS].colunas
+    colunas["length"][0] = 12345
+    colunas["last_edited_date"][0] = colunas["last_edited_date"].max() + 1
+    excluido = colunas["objectid"][1]
+    for campo in list(colunas):
+        colunas[campo] = np.delete(colunas[campo], 1)
+    servidor.camadas[config.CAMADA_ENGARRAFAMENTOS].tamanho -= 1
+
+    segunda = sync.atualizar(tokens)
+    assert segunda is not primeira
+    assert len(segunda) == len(primeira) - 1
+    assert excluido not in set(segunda["objectid"])
+    assert segunda.loc[segunda["objectid"] == colunas["objectid"][0], "length"].item() == 12345
+    assert sync.atualizar(tokens) is segunda
+
+
+def test_atualizacao_sem_mudancas_nao_grava_copia(servidor, tokens, tmp_path):
+    sync = sincronizador(ENGARRAFAMENTOS, tmp_path)
+    sync.atualizar(tokens)
+    catalogo = sync.armazem.catalogo()
+    assert len(catalogo) == 1
+
+    sync.atualizar(tokens)
+    sync.incremental = False  # a carga completa com o mesmo conteúdo também não grava
+    sync.atualizar(tokens)
+    assert sync.armazem.catalogo() == catalogo
+    assert len(list((tmp_path / ENGARRAFAMENTOS.nome).glob("*.feather"))) == 1
+
+
+def test_historico_limitado(servidor, tokens, tmp_path):
+    sync = sincronizador(ENGARRAFAMENTOS, tmp_path)
+    sync.armazem.manter = 2
+    colunas = servidor.camadas[config.CAMADA_ENGARRAFAMENTOS].colunas
+    for versao in range(4):
+        colunas["delay"][0] = versao
+        colunas["last_edited_date"][0] = colunas["last_edited_date"].max() + 1
+        sync.atualizar(tokens)
+    assert len(sync.armazem.catalogo()) == 2
+    assert len(list((tmp_path / ENGARRAFAMENTOS.nome).glob("*.feather"))) == 2
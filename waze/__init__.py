@@ -0,0 +1 @@
+# Camada de dados do painel de alertas e engarrafamentos do Waze (Minas Gerais)
@@ -0,0 +1,239 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from waze import config
+from waze.diagnostico import medir, propagar
+
+
+# Sessão com conexões reaproveitadas (keep-alive) entre as páginas e as camadas
+def criar_sessao(conexoes=config.MAX_CONEXOES):
+    sessao = requests.Session()
+    # Respostas comprimidas: o JSON das páginas encolhe bastante com gzip
+    sessao.headers["Accept-Encoding"] = "gzip, deflate"
+    adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=conexoes)
+    sessao.mount("https://", adaptador)
+    sessao.mount("http://", adaptador)
+    return sessao
+
+
+sessao = criar_sessao()
+
+# Códigos devolvidos pelo ArcGIS para token inválido ou expirado
+CODIGOS_TOKEN_INVALIDO = {498, 499}
+
+
+class ErroArcGIS(Exception):
+    def __init__(self, codigo, mensagem):
+        super().__init__(mensagem)
+        self.codigo = codigo
+
+
+def _requisitar(url, params):
+    with medir("arcgis.requisicao") as etapa:
+        response = sessao.get(url, params=params)
+        # Bytes recebidos pela rede (comprimidos) e depois de descomprimidos
+        etapa.update(status=response.status_code, bytes=len(response.content),
+                     bytes_rede=int(response.headers.get("Content-Length", len(response.content))))
+    if response.status_code != 200:
+        # Não devolver dados parciais, para que não fiquem guardados no cache
+        raise requests.HTTPError(
+            f"Erro na requisição dos dados: {response.status_code}", response=response
+        )
+    with medir("arcgis.json"):
+        data = response.json()  # Parse do JSON
+    # O ArcGIS responde 200 mesmo em caso de erro, com o detalhe no corpo
+    if "error" in data:
+        erro = data["error"]
+        raise ErroArcGIS(erro.get("code"), f"Erro na consulta: {erro.get('message')}")
+    return data
+
+
+# Consulta autenticada; se o token for recusado, renova e tenta mais uma vez
+def consultar(url, params, tokens):
+    token = tokens.obter()
+    try:
+        return _requisitar(url, {**params, "token": token})
+    except ErroArcGIS as erro:
+        if erro.codigo not in CODIGOS_TOKEN_INVALIDO:
+            raise
+        tokens.invalidar(token)
+        return _requisitar(url, {**params, "token": tokens.obter()})
+
+
+# Filtro espacial do ArcGIS para um envelope (oeste, sul, leste, norte) em WGS 84
+def parametros_envelope(envelope):
+    if envelope is None:
+        return {}
+    return {
+        "geometry": ",".join(repr(float(valor)) for valor in envelope),
+        "geometryType": "esriGeometryEnvelope",
+        "inSR": 4326,
+        "spatialRel": "esriSpatialRelIntersects",
+    }
+
+
+# Quantidade de registros da camada que atendem ao filtro
+def contar_registros(url, tokens, where="1=1", envelope=None):
+    data = consultar(url, {
+        "where": where,
+        **parametros_envelope(envelope),
+        "returnCountOnly": "true",
+        "f": "json"
+    }, tokens)
+    return data.get("count", 0)
+
+
+# Apenas os objectids dos registros (consulta leve, sem atributos nem geometria)
+def listar_ids(url, tokens, where="1=1"):
+    data = consultar(url, {
+        "where": where,
+        "returnIdsOnly": "true",
+        "f": "json"
+    }, tokens)
+    return data.get("objectIds") or []
+
+
+# Estatísticas calculadas pelo próprio servidor (count, sum, ...), agrupadas pelos campos pedidos.
+# Cada estatística é um dict no formato do outStatistics; devolve uma linha de atributos por grupo.
+def consultar_estatisticas(url, tokens, estatisticas, grupos=(), where="1=1"):
+    params = {
+        "where": where,
+        "outStatistics": json.dumps(estatisticas),
+        "f": "json"
+    }
+    if grupos:
+        params["groupByFieldsForStatistics"] = ",".join(grupos)
+    data = consultar(url, params, tokens)
+    return [feature["attributes"] for feature in data.get("features", [])]
+
+
+# Tipo da coluna para cada tipo de campo do ArcGIS (os demais ficam como objeto)
+_TIPOS_CAMPO = {
+    "esriFieldTypeOID": np.int64,
+    "esriFieldTypeInteger": np.int64,
+    "esriFieldTypeSmallInteger": np.int64,
+    "esriFieldTypeBigInteger": np.int64,
+    "esriFieldTypeDate": np.int64,  # milissegundos desde 1970
+    "esriFieldTypeDouble": np.float64,
+    "esriFieldTypeSingle": np.float64,
+    "esriFieldTypeString": object,
+}
+
+
+class ColunasPaginadas:
+    """Colunas pré-alocadas para uma consulta paginada, preenchidas página a página.
+
+    O tipo de cada coluna vem da lista `fields` da primeira página que chegar; cada
+    página é copiada para a sua faixa de linhas e descartada. Inteiros e datas com
+    valores ausentes viram float com NaN no final, como o pandas faria.
+    """
+
+    def __init__(self, campos, total, tamanho_pagina):
+        self.campos = list(campos)
+        # A última página pode trazer registros criados depois da contagem
+        self.capacidade = -(-total // tamanho_pagina) * tamanho_pagina
+        self._colunas = None
+        self._nulos = {}
+        self._inferir = set()
+        self._ocupadas = np.zeros(self.capacidade, dtype=bool)
+        self._lock = threading.Lock()
+
+    def _alocar(self, fields):
+        tipos = {campo.get("name"): _TIPOS_CAMPO.get(campo.get("type")) for campo in fields or []}
+        self._colunas = {}
+        for campo in self.campos:
+            tipo = tipos.get(campo)
+            if tipo is None:
+                tipo = object
+                self._inferir.add(campo)  # tipo desconhecido: decidido pelos valores no final
+            self._colunas[campo] = np.empty(self.capacidade, dtype=tipo)
+            if tipo is not object:
+                self._nulos[campo] = np.zeros(self.capacidade, dtype=bool)
+
+    def preencher(self, inicio, data):
+        with medir("arcgis.pagina", registros=len(data.get("features", []))):
+            self._preencher(inicio, data)
+
+    def _preencher(self, inicio, data):
+        with self._lock:
+            if self._colunas is None:
+                self._alocar(data.get("fields"))
+        atributos = [feature["attributes"] for feature in data.get("features", [])]
+        fim = inicio + len(atributos)
+
+        # Cada página escreve só na sua faixa; não é preciso travar
+        for campo, coluna in self._colunas.items():
+            valores = [registro.get(campo) for registro in atributos]
+            if campo in self._nulos:
+                nulos = np.fromiter((valor is None for valor in valores), dtype=bool, count=len(valores))
+                self._nulos[campo][inicio:fim] = nulos
+                padrao = np.nan if coluna.dtype.kind == "f" else 0
+                coluna[inicio:fim] = np.fromiter((padrao if valor is None else valor for valor in valores),
+                                                 dtype=coluna.dtype, count=len(valores))
+            else:
+                coluna[inicio:fim] = np.fromiter(valores, dtype=object, count=len(valores))
+        self._ocupadas[inicio:fim] = True
+
+    # Colunas finais (campo -> array), só com as linhas recebidas
+    def colunas(self):
+        if self._colunas is None:
+            return {campo: np.empty(0, dtype=object) for campo in self.campos}
+
+        quantidade = int(self._ocupadas.sum())
+        # Normalmente as linhas ocupadas são um prefixo; se faltou registro no meio, compacta
+        linhas = slice(0, quantidade) if self._ocupadas[:quantidade].all() else self._ocupadas
+        colunas = {}
+        for campo, coluna in self._colunas.items():
+            coluna = coluna[linhas]
+            nulos = self._nulos.get(campo)
+            if nulos is not None and coluna.dtype.kind != "f" and nulos[linhas].any():
+                coluna = coluna.astype(np.float64)
+                coluna[nulos[linhas]] = np.nan
+            elif campo in self._inferir:
+                coluna = pd.Series(coluna).infer_objects().to_numpy()
+            colunas[campo] = coluna
+        return colunas
+
+
+# Baixa todos os registros de uma camada, com as páginas buscadas em paralelo.
+# Devolve as colunas (campo -> array); cada página vai direto para as colunas e é descartada.
+# Com `envelope`, só os registros que tocam essa área.
+def baixar_camada(url, campos, tokens, where="1=1", tamanho_pagina=config.TAMANHO_PAGINA,
+                  max_workers=config.MAX_CONEXOES, envelope=None):
+    with medir("arcgis.baixar", where=where) as etapa:
+        colunas = _baixar_paginas(url, campos, tokens, where, tamanho_pagina, max_workers, envelope)
+        etapa["registros"] = len(colunas[campos[0]]) if campos else 0
+    return colunas
+
+
+def _baixar_paginas(url, campos, tokens, where, tamanho_pagina, max_workers, envelope):
+    total = contar_registros(url, tokens, where, envelope)
+
+    # Parâmetros para consultar o FeatureLayer
+    query_params = {
+        "where": where,  # "1=1" retorna todos os dados
+        **parametros_envelope(envelope),
+        "outFields": ",".join(campos),
+        "orderByFields": "objectid",  # Ordem estável entre as páginas
+        "returnGeometry": "false",  # x/y e a linha já vêm nos atributos
+        "f": "json",  # Formato da resposta (JSON)
+        "resultRecordCount": tamanho_pagina  # Máximo de registros por página
+    }
+
+    colunas = ColunasPaginadas(campos, total, tamanho_pagina)
+
+    def baixar_pagina(offset):
+        colunas.preencher(offset, consultar(url, {**query_params, "resultOffset": offset}, tokens))
+
+    # Cada página preenche a própria faixa de linhas, na ordem dos offsets
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for _ in executor.map(propagar(baixar_pagina), range(0, total, tamanho_pagina)):
+            pass
+
+    return colunas.colunas()
@@ -0,0 +1,59 @@
+import logging
+import threading
+import time
+
+from waze import config
+from waze.arcgis import ErroArcGIS, sessao
+from waze.diagnostico import medir
+
+logger = logging.getLogger(__name__)
+
+
+class GerenciadorToken:
+    """Token do portal reaproveitado entre as consultas até perto de expirar."""
+
+    def __init__(self, usuario, senha, margem=config.MARGEM_RENOVACAO_TOKEN):
+        self.usuario = usuario
+        self.senha = senha
+        self.margem = margem
+        self._lock = threading.Lock()
+        self._token = None
+        self._expira_em = 0.0  # instante (epoch, em segundos) informado pelo portal
+
+    def obter(self):
+        with self._lock:
+            # Renovar um pouco antes de expirar, para não usar um token vencido no meio do download
+            if self._token is None or time.time() >= self._expira_em - self.margem:
+                self._gerar()
+            return self._token
+
+    def invalidar(self, token):
+        with self._lock:
+            # Só descartar se ninguém já tiver renovado o token nesse meio tempo
+            if self._token == token:
+                self._token = None
+
+    def _gerar(self):
+        # Parâmetros para obter o token
+        token_params = {
+            "username": self.usuario,
+            "password": self.senha,
+            "referer": config.PORTAL_URL,
+            "expiration": config.VALIDADE_TOKEN,  # em minutos
+            "f": "json",
+        }
+        with medir("token"):
+            token_response = sessao.post(config.TOKEN_URL, data=token_params)
+        if token_response.status_code != 200:
+            raise ErroArcGIS(token_response.status_code,
+                             f"Erro na requisição do token: {token_response.text}")
+
+        token_data = token_response.json()
+        if "token" not in token_data:
+            erro = token_data.get("error", {})
+            raise ErroArcGIS(erro.get("code"), f"Erro ao obter o token: {token_data}")
+
+        self._token = token_data["token"]
+        # 'expires' vem em milissegundos desde a época
+        self._expira_em = token_data.get("expires", 0) / 1000 or time.time() + config.VALIDADE_TOKEN * 60
+        logger.info("Token obtido com sucesso!")
@@ -0,0 +1,135 @@
+import functools
+import inspect
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+from waze import config
+from waze.diagnostico import propagar
+
+logger = logging.getLogger(__name__)
+
+
+class CacheTTL:
+    """Cache em memória compartilhado pelo processo, com validade por entrada.
+
+    Enquanto uma chave está sendo carregada, as demais chamadas para a mesma
+    chave aguardam o mesmo carregamento em vez de disparar outro.
+    """
+
+    def __init__(self, ttl=config.CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas = {}  # chave -> (valor, instante de expiração)
+        self._pendentes = {}  # chave -> Future do carregamento em andamento
+
+    def obter(self, chave, carregar, ttl=None):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[1] > time.monotonic():
+                return entrada[0]
+
+            pendente = self._pendentes.get(chave)
+            responsavel = pendente is None
+            if responsavel:
+                pendente = Future()
+                self._pendentes[chave] = pendente
+
+        # Outra chamada já está carregando esta chave: aguardar o resultado dela
+        if not responsavel:
+            return pendente.result()
+
+        try:
+            valor = carregar()
+        except BaseException as erro:
+            with self._lock:
+                del self._pendentes[chave]
+            pendente.set_exception(erro)
+            raise
+
+        validade = self.ttl if ttl is None else ttl
+        with self._lock:
+            # Descartar as entradas vencidas (chaves que variam muito, como envelopes do mapa)
+            agora = time.monotonic()
+            for vencida in [outra for outra, (_, expira) in self._entradas.items() if expira <= agora]:
+                del self._entradas[vencida]
+            self._entradas[chave] = (valor, agora + validade)
+            del self._pendentes[chave]
+        pendente.set_result(valor)
+        return valor
+
+    # Começa a carregar a chave numa thread à parte, se ela não estiver válida nem já sendo
+    # carregada; um obter() da mesma chave nesse meio tempo espera por esse carregamento
+    def precarregar(self, chave, carregar, ttl=None):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if chave in self._pendentes or (entrada is not None and entrada[1] > time.monotonic()):
+                return False
+        threading.Thread(target=propagar(self._precarregar), args=(chave, carregar, ttl), daemon=True).start()
+        return True
+
+    def _precarregar(self, chave, carregar, ttl):
+        try:
+            self.obter(chave, carregar, ttl)
+        except Exception as erro:
+            # Quem estiver esperando recebe o mesmo erro; o próximo obter() tenta de novo
+            logger.warning("Falha no carregamento em segundo plano: %s", erro)
+
+    def invalidar(self, chave=None):
+        with self._lock:
+            if chave is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(chave, None)
+
+
+# Instância única do processo: todas as sessões do Streamlit compartilham
+cache_camadas = CacheTTL()
+
+# Resultados das consultas de estatísticas (outStatistics), pela mesma validade
+cache_estatisticas = CacheTTL()
+
+
+def chave_camada(url, campos):
+    return (url, ",".join(campos))
+
+
+# Decorador das funções obter_*(dados, ...) que montam uma estrutura sobre um DataFrame: cada
+# DataFrame (com os mesmos demais argumentos) tem sempre o mesmo resultado, montado uma vez, e
+# a entrada some junto com o DataFrame. A chave usa id(dados), conferido com uma referência
+# fraca, porque um id pode ser reaproveitado por outro DataFrame depois que o primeiro sai da memória.
+def por_dataframe(fabrica):
+    assinatura = inspect.signature(fabrica)
+    entradas = {}  # (id(dados), demais argumentos) -> (referência fraca ao DataFrame, Future do resultado)
+    lock = threading.Lock()
+
+    @functools.wraps(fabrica)
+    def obter(dados, *args, **kwargs):
+        argumentos = assinatura.bind(dados, *args, **kwargs)
+        argumentos.apply_defaults()
+        chave = (id(dados),) + tuple(argumentos.arguments.values())[1:]
+        with lock:
+            entrada = entradas.get(chave)
+            responsavel = entrada is None or entrada[0]() is not dados
+            if responsavel:
+                entrada = entradas[chave] = (weakref.ref(dados), Future())
+                weakref.finalize(dados, entradas.pop, chave, None)
+        pendente = entrada[1]
+
+        # Outra chamada já está montando o resultado deste DataFrame: aguardar por ele
+        if not responsavel:
+            return pendente.result()
+
+        try:
+            pendente.set_result(fabrica(dados, *args, **kwargs))
+        except BaseException as erro:
+            with lock:
+                if entradas.get(chave) is entrada:
+                    del entradas[chave]
+            pendente.set_exception(erro)
+            raise
+        return pendente.result()
+
+    return obter
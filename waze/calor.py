@@ -0,0 +1,133 @@
+import threading
+import weakref
+
+import numpy as np
+
+from waze.cache import por_dataframe
+from waze.diagnostico import cronometrado
+from waze.indice import obter_indice
+from waze.vista import pontos_no_envelope
+
+# Zoom a partir do qual cada nível da pirâmide é usado, e o raio (px) do mapa de calor
+ZOOMS_CALOR = (6, 8, 10)
+RAIO_CALOR = 10
+# Nível mais detalhado embutido no mapa estático: no zoom 10 as células são quase do tamanho
+# dos pontos e a quantidade delas cresce com a de alertas; até o zoom 8 ela é limitada pela grade
+ZOOM_MAXIMO_ESTATICO = 8
+
+
+# Lado da célula (em graus) que ocupa meio raio do mapa de calor no zoom dado
+def tamanho_celula(zoom, raio=RAIO_CALOR):
+    return (raio / 2) * 360 / (256 * 2 ** zoom)
+
+
+class PiramideCalor:
+    """Pontos de um DataFrame agregados em células de grade, em alguns níveis de zoom.
+
+    A célula de cada linha em cada nível é calculada uma vez; o peso das células para
+    uma combinação de filtros sai de um bincount sobre elas. Para um filtro de uma
+    coluna só, usa a tabela de contagens por categoria x célula, montada uma vez.
+    """
+
+    @cronometrado("calor.piramide")
+    def __init__(self, dados, zooms=ZOOMS_CALOR, latitude='Latitude', longitude='Longitude'):
+        self._dados = weakref.ref(dados)
+        self.zooms = list(zooms)
+        self._tabelas = {}  # (nível, coluna) -> matriz categorias x células
+        self._lock = threading.Lock()
+
+        lat = dados[latitude].to_numpy(dtype=np.float64)
+        lon = dados[longitude].to_numpy(dtype=np.float64)
+        validas = ~(np.isnan(lat) | np.isnan(lon))
+        lat, lon = lat[validas], lon[validas]
+
+        self.celulas = []  # por nível: célula de cada linha (-1 sem coordenadas)
+        self.centroides = []  # por nível: (lat, lon) médios dos pontos de cada célula
+        for zoom in self.zooms:
+            tamanho = tamanho_celula(zoom)
+            coluna = np.floor(lon / tamanho).astype(np.int64)
+            linha = np.floor(lat / tamanho).astype(np.int64)
+            if len(coluna):
+                coluna -= coluna.min()
+                linha -= linha.min()
+            chaves = linha * (int(coluna.max(initial=0)) + 1) + coluna
+            _, inversa = np.unique(chaves, return_inverse=True)
+            quantidade = int(inversa.max(initial=-1)) + 1
+
+            celulas = np.full(len(validas), -1, dtype=np.int32)
+            celulas[validas] = inversa
+            pontos = np.bincount(inversa, minlength=quantidade)
+            centroides = np.column_stack([
+                np.bincount(inversa, weights=lat, minlength=quantidade) / np.maximum(pontos, 1),
+                np.bincount(inversa, weights=lon, minlength=quantidade) / np.maximum(pontos, 1),
+            ])
+            self.celulas.append(celulas)
+            self.centroides.append(centroides.round(5))
+
+    def _tabela(self, nivel, coluna):
+        with self._lock:
+            if (nivel, coluna) not in self._tabelas:
+                codigos, valores = obter_indice(self._dados()).codigos(coluna)
+                celulas = self.celulas[nivel]
+                quantidade = len(self.centroides[nivel])
+                usadas = (celulas >= 0) & (codigos >= 0)
+                posicoes = codigos[usadas].astype(np.int64) * quantidade + celulas[usadas]
+                self._tabelas[(nivel, coluna)] = np.bincount(
+                    posicoes, minlength=len(valores) * quantidade
+                ).reshape(len(valores), quantidade).astype(np.int32)
+            return self._tabelas[(nivel, coluna)]
+
+    # Quantidade de pontos em cada célula do nível, com os filtros (coluna -> valor) aplicados
+    def pesos(self, nivel, filtros=None):
+        filtros = filtros or {}
+        celulas = self.celulas[nivel]
+        quantidade = len(self.centroides[nivel])
+        if len(filtros) == 1:
+            (coluna, valor), = filtros.items()
+            posicao = obter_indice(self._dados()).codigos(coluna)[1].get_indexer([valor])[0]
+            if posicao < 0:
+                return np.zeros(quantidade, dtype=np.int32)
+            return self._tabela(nivel, coluna)[posicao]
+
+        mascara = obter_indice(self._dados()).mascara(filtros)
+        selecionadas = celulas if mascara is None else celulas[mascara]
+        return np.bincount(selecionadas[selecionadas >= 0], minlength=quantidade)
+
+    # Nível usado no zoom dado: o mais detalhado que não passa dele
+    def nivel_para(self, zoom):
+        return max([nivel for nivel, inicio in enumerate(self.zooms) if inicio <= zoom] or [0])
+
+    # Células com peso de um nível, [[lat, lon, peso], ...]; com envelope, só as de dentro
+    def pontos(self, nivel, filtros=None, envelope=None):
+        centroides = self.centroides[nivel]
+        pesos = self.pesos(nivel, filtros)
+        usadas = pesos > 0
+        if envelope is not None:
+            usadas &= pontos_no_envelope(centroides[:, 1], centroides[:, 0], envelope)
+        usadas = np.flatnonzero(usadas)
+        return [[lat, lon, int(peso)] for (lat, lon), peso
+                in zip(centroides[usadas].tolist(), pesos[usadas].tolist())]
+
+    # Por nível (até o de `zoom_maximo`, se dado), as células com peso
+    def niveis(self, filtros=None, zoom_maximo=None):
+        return [self.pontos(nivel, filtros) for nivel, inicio in enumerate(self.zooms)
+                if zoom_maximo is None or nivel == 0 or inicio <= zoom_maximo]
+
+    # Os pontos sem agregação, [[lat, lon], ...], com os filtros aplicados; com envelope, só os de dentro
+    def pontos_brutos(self, filtros=None, envelope=None):
+        dados = self._dados()
+        usadas = self.celulas[0] >= 0
+        mascara = obter_indice(dados).mascara(filtros or {})
+        if mascara is not None:
+            usadas &= mascara
+        lat = dados['Latitude'].to_numpy(dtype=np.float64)
+        lon = dados['Longitude'].to_numpy(dtype=np.float64)
+        if envelope is not None:
+            usadas &= pontos_no_envelope(lon, lat, envelope)
+        return np.column_stack([lat[usadas], lon[usadas]]).round(5).tolist()
+
+
+# Uma pirâmide por DataFrame em uso; some junto com o DataFrame
+@por_dataframe
+def obter_piramide(dados):
+    return PiramideCalor(dados)
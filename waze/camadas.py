@@ -0,0 +1,45 @@
+from waze import config
+from waze.normalizacao import COLUNAS_ENGARRAFAMENTOS, preparar_alertas, preparar_engarrafamentos
+from waze.sync import obter_sincronizador
+
+
+class Camada:
+    """Camada do FeatureServer usada pelo painel: campos baixados, tratamento e nome das cópias em disco.
+
+    É a mesma definição para o coletor (que baixa e publica) e para o app (que lê).
+    """
+
+    def __init__(self, nome, camada, campos, preparar, **opcoes_sync):
+        self.nome = nome
+        self.numero = camada
+        self.campos = campos
+        self.preparar = preparar
+        self.opcoes_sync = opcoes_sync
+
+    # Lido a cada uso: acompanha o config mesmo se os endereços mudarem depois da importação
+    # (ex.: benchmarks.servidor_falso.configurar_urls)
+    @property
+    def url(self):
+        return config.url_consulta(self.numero)
+
+    def sincronizador(self):
+        return obter_sincronizador(self.url, self.campos, self.preparar, nome=self.nome, **self.opcoes_sync)
+
+
+# A camada de alertas é acompanhada apenas pelo objectid. O instante do relato só é pedido se
+# configurado: um campo que a camada não tem faria o servidor recusar a consulta inteira
+ALERTAS = Camada(
+    "alertas", config.CAMADA_ALERTAS,
+    ['objectid', 'type', 'subtype', 'rodovia', 'mesorregiao', 'municipio',
+     'regional', 'jurisdicao', 'x', 'y'] + ([config.CAMPO_INSTANTE_ALERTAS] if config.CAMPO_INSTANTE_ALERTAS else []),
+    preparar_alertas, coluna_id='Alerta', campo_edicao=None
+)
+
+# Só as colunas que o painel mantém; o sincronizador acrescenta o last_edited_date da marca d'água
+ENGARRAFAMENTOS = Camada(
+    "engarrafamentos", config.CAMADA_ENGARRAFAMENTOS,
+    list(COLUNAS_ENGARRAFAMENTOS),
+    preparar_engarrafamentos
+)
+
+CAMADAS = (ALERTAS, ENGARRAFAMENTOS)
@@ -0,0 +1,90 @@
+"""Coletor das camadas do Waze, executado à parte do painel.
+
+    python -m waze.coletor [--intervalo SEGUNDOS] [--uma-vez]
+
+Consulta as camadas a cada intervalo, aplica o mesmo tratamento do painel
+e publica cada versão como cópia em disco (ver waze.snapshot). Com
+WAZE_COLETOR_EXTERNO=1, o app só lê essas cópias.
+
+As credenciais vêm de WAZE_USUARIO/WAZE_SENHA ou, na falta delas, da seção
+[API] de .streamlit/secrets.toml.
+"""
+import argparse
+import logging
+import os
+import time
+import tomllib
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from waze import config
+from waze.arcgis import ErroArcGIS
+from waze.autenticacao import GerenciadorToken
+from waze.camadas import CAMADAS
+from waze.diagnostico import configurar_log, iniciar_rodada, propagar
+
+# Pelo nome do módulo: com python -m, __name__ seria "__main__", fora do logger "waze"
+logger = logging.getLogger("waze.coletor")
+
+
+def credenciais(arquivo_secrets=os.path.join(".streamlit", "secrets.toml")):
+    usuario = os.environ.get("WAZE_USUARIO")
+    senha = os.environ.get("WAZE_SENHA")
+    if usuario and senha:
+        return usuario, senha
+    with open(arquivo_secrets, "rb") as arquivo:
+        api = tomllib.load(arquivo)["API"]
+    return api["user"], api["password"]
+
+
+# Atualiza uma camada; um erro nela não interrompe a coleta da outra. O sincronizador só grava
+# (publica) uma cópia quando os dados mudaram: sem mudanças, os leitores nem recarregam
+def coletar(camada, tokens):
+    inicio = time.monotonic()
+    sincronizador = camada.sincronizador()
+    anteriores = sincronizador.dados
+    try:
+        dados = sincronizador.atualizar(tokens)
+    except (ErroArcGIS, requests.RequestException) as erro:
+        logger.error("Erro ao coletar %s: %s", camada.nome, erro)
+        return None
+    if dados is anteriores:
+        logger.info("%s: sem mudanças em %.1f s", camada.nome, time.monotonic() - inicio)
+    else:
+        logger.info("%s: %d registros em %.1f s", camada.nome, len(dados), time.monotonic() - inicio)
+    return dados
+
+
+def executar(tokens, intervalo=config.INTERVALO_COLETA, uma_vez=False):
+    # As camadas são consultadas ao mesmo tempo, cada uma no seu ritmo de resposta
+    with ThreadPoolExecutor(max_workers=len(CAMADAS)) as executor:
+        while True:
+            inicio = time.monotonic()
+            iniciar_rodada()
+            list(executor.map(propagar(lambda camada: coletar(camada, tokens)), CAMADAS))
+            if uma_vez:
+                return
+            time.sleep(max(0.0, intervalo - (time.monotonic() - inicio)))
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Coleta as camadas do Waze e publica as cópias em disco.")
+    parser.add_argument("--intervalo", type=float, default=config.INTERVALO_COLETA,
+                        help="segundos entre o início de duas coletas")
+    parser.add_argument("--uma-vez", action="store_true", help="coletar uma única vez e sair")
+    argumentos = parser.parse_args(argumentos)
+
+    if not config.DIRETORIO_SNAPSHOTS:
+        parser.error("WAZE_SNAPSHOTS está vazio: o coletor não teria onde publicar")
+
+    configurar_log()
+    tokens = GerenciadorToken(*credenciais())
+    try:
+        executar(tokens, argumentos.intervalo, argumentos.uma_vez)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
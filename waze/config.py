@@ -0,0 +1,75 @@
+import os
+
+# Tempo (em segundos) que uma cópia baixada da camada continua válida
+CACHE_TTL = float(os.environ.get("WAZE_CACHE_TTL", 300))
+
+# Máximo de registros por página nas consultas
+TAMANHO_PAGINA = 2000
+
+# Quantidade de páginas baixadas ao mesmo tempo (e de conexões mantidas abertas)
+MAX_CONEXOES = int(os.environ.get("WAZE_MAX_CONEXOES", 8))
+
+# Endereços do observatório (substituíveis, ex.: pelo servidor falso de benchmarks/)
+PORTAL_URL = os.environ.get("WAZE_PORTAL_URL", "https://observatorio.infraestrutura.mg.gov.br/portal")
+TOKEN_URL = PORTAL_URL + "/sharing/rest/generateToken"
+FEATURE_SERVER_URL = os.environ.get(
+    "WAZE_FEATURE_SERVER_URL",
+    "https://observatorio.infraestrutura.mg.gov.br/server/rest/services/"
+    "00_PUBLICACOES/waze_tempo_real/FeatureServer"
+)
+
+# Camadas do FeatureServer
+CAMADA_ALERTAS = int(os.environ.get("WAZE_CAMADA_ALERTAS", 0))
+CAMADA_ENGARRAFAMENTOS = int(os.environ.get("WAZE_CAMADA_ENGARRAFAMENTOS", 2))
+
+# Validade pedida ao portal (minutos) e antecedência da renovação (segundos)
+VALIDADE_TOKEN = 60
+MARGEM_RENOVACAO_TOKEN = 120
+
+# Depois da primeira carga, buscar apenas os registros novos/alterados (0 para desligar)
+SYNC_INCREMENTAL = os.environ.get("WAZE_SYNC_INCREMENTAL", "1") != "0"
+
+# Cópias das camadas em disco (WAZE_SNAPSHOTS vazio desliga)
+DIRETORIO_SNAPSHOTS = os.environ.get("WAZE_SNAPSHOTS", "snapshots")
+COMPRESSAO_SNAPSHOT = os.environ.get("WAZE_SNAPSHOTS_COMPRESSAO", "zstd")  # ou "lz4", "uncompressed"
+SNAPSHOTS_MANTER = int(os.environ.get("WAZE_SNAPSHOTS_MANTER", 24))  # 0 mantém todo o histórico
+
+# Cards, filtros e gráficos com estatísticas calculadas pelo servidor (outStatistics);
+# as linhas da camada só são baixadas quando o mapa é exibido
+MODO_AGREGADO = os.environ.get("WAZE_MODO_AGREGADO", "0") == "1"
+
+# Mapas com st_folium: a área visível volta para o app, que carrega só o que está nela
+MAPA_INTERATIVO = os.environ.get("WAZE_MAPA_INTERATIVO", "0") == "1"
+
+# Dados publicados por um coletor à parte (python -m waze.coletor): o app só lê as cópias
+# em disco e nunca espera pelo servidor; o coletor consulta as camadas a cada intervalo (segundos)
+COLETOR_EXTERNO = os.environ.get("WAZE_COLETOR_EXTERNO", "0") == "1"
+INTERVALO_COLETA = float(os.environ.get("WAZE_INTERVALO_COLETA", 60))
+
+# Nível dos logs no console (DEBUG mostra cada etapa medida); com WAZE_METRICAS, as etapas
+# também são gravadas, uma por linha em JSON, nesse arquivo
+LOG_NIVEL = os.environ.get("WAZE_LOG_NIVEL", "INFO")
+ARQUIVO_METRICAS = os.environ.get("WAZE_METRICAS", "")
+
+# Painel de diagnóstico na barra lateral (também aparece com ?diagnostico=1 na URL)
+DIAGNOSTICO = os.environ.get("WAZE_DIAGNOSTICO", "0") == "1"
+
+# Malha viária de referência (GeoJSON local com os trechos) para as métricas por km;
+# vazio desliga. Alertas e engarrafamentos a mais de RAIO_AJUSTE metros de qualquer trecho ficam de fora
+MALHA_VIARIA = os.environ.get("WAZE_MALHA_VIARIA", "")
+RAIO_AJUSTE = float(os.environ.get("WAZE_RAIO_AJUSTE", 100))
+
+# Alertas repetidos (mesmo tipo e subtipo a até DISTANCIA_CONSOLIDACAO metros um do outro e,
+# com JANELA_CONSOLIDACAO > 0, publicados a até tantos minutos) agrupados num alerta só;
+# CONSOLIDAR_ALERTAS liga o agrupamento ao abrir a página. A janela de tempo precisa do campo
+# com o instante do relato na camada de alertas (CAMPO_INSTANTE_ALERTAS, ex.: pubmillis): vazio,
+# o campo não é consultado e o agrupamento é só pela distância
+CAMPO_INSTANTE_ALERTAS = os.environ.get("WAZE_CAMPO_INSTANTE_ALERTAS", "")
+CONSOLIDAR_ALERTAS = os.environ.get("WAZE_CONSOLIDAR_ALERTAS", "0") == "1"
+DISTANCIA_CONSOLIDACAO = float(os.environ.get("WAZE_DISTANCIA_CONSOLIDACAO", 50))
+JANELA_CONSOLIDACAO = float(os.environ.get("WAZE_JANELA_CONSOLIDACAO", 0))
+
+
+# Endpoint de consulta de uma camada do FeatureServer; lê FEATURE_SERVER_URL a cada chamada
+def url_consulta(camada):
+    return f"{FEATURE_SERVER_URL}/{camada}/query"
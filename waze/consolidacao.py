@@ -0,0 +1,130 @@
+"""Consolidação de alertas quase repetidos: o mesmo buraco ou veículo parado relatado várias vezes.
+
+Alertas do mesmo tipo e subtipo a até `distancia` metros (e, com uma janela, publicados
+a até `janela` minutos um do outro) formam um grupo, inclusive em cadeia. Os alertas
+vão para uma grade com células do tamanho da distância (e da janela, no tempo): cada
+um só é comparado com os das células vizinhas, o que mantém o custo linear.
+"""
+import logging
+
+import numpy as np
+
+from waze import config
+from waze.cache import por_dataframe
+from waze.diagnostico import cronometrado
+from waze.malha import projetar
+
+logger = logging.getLogger(__name__)
+
+# Alertas comparados de cada vez (limita a memória dos pares de vizinhos)
+ALERTAS_POR_BLOCO = 100_000
+
+
+# Componentes conexos dos pares (i, j): ligação das raízes pelo menor rótulo e compressão
+# dos caminhos, repetidas até todos os pares terem o mesmo rótulo
+def _componentes(quantidade, i, j):
+    rotulos = np.arange(quantidade)
+    while True:
+        raiz_i, raiz_j = rotulos[i], rotulos[j]
+        diferentes = raiz_i != raiz_j
+        if not diferentes.any():
+            return rotulos
+        menor = np.minimum(raiz_i[diferentes], raiz_j[diferentes])
+        np.minimum.at(rotulos, raiz_i[diferentes], menor)
+        np.minimum.at(rotulos, raiz_j[diferentes], menor)
+        while True:
+            saltos = rotulos[rotulos]
+            if (saltos == rotulos).all():
+                break
+            rotulos = saltos
+
+
+# Pares (i, j), i < j, de alertas da mesma categoria dentro da distância e da janela
+def _pares(categorias, x, y, instantes, distancia, janela_ms):
+    coluna = np.floor(x / distancia).astype(np.int64)
+    linha = np.floor(y / distancia).astype(np.int64)
+    tempo = np.floor(instantes / janela_ms).astype(np.int64) if janela_ms else np.zeros(len(x), dtype=np.int64)
+    # Cada dimensão deslocada para começar em 1, com folga para os vizinhos na chave
+    dimensoes = [categorias, tempo, coluna, linha]
+    dimensoes = [valores - valores.min(initial=0) + 1 for valores in dimensoes]
+    tamanhos = [int(valores.max(initial=0)) + 2 for valores in dimensoes]
+
+    def chave(categoria, tempo, coluna, linha):
+        return ((categoria * tamanhos[1] + tempo) * tamanhos[2] + coluna) * tamanhos[3] + linha
+
+    chaves = chave(*dimensoes)
+    ordem = np.argsort(chaves, kind='stable')
+    celulas, inicios, quantidades_celula = np.unique(chaves[ordem], return_index=True, return_counts=True)
+
+    deslocamentos_tempo = (-1, 0, 1) if janela_ms else (0,)
+    pares_i, pares_j = [], []
+    # Blocos na ordem das chaves: as células procuradas ficam em ordem e a busca percorre a memória em sequência
+    for inicio_bloco in range(0, len(x), ALERTAS_POR_BLOCO):
+        bloco = ordem[inicio_bloco:inicio_bloco + ALERTAS_POR_BLOCO]
+        for dt in deslocamentos_tempo:
+            for dc in (-1, 0, 1):
+                for dl in (-1, 0, 1):
+                    vizinhas = chave(dimensoes[0][bloco], dimensoes[1][bloco] + dt,
+                                     dimensoes[2][bloco] + dc, dimensoes[3][bloco] + dl)
+                    posicao = np.minimum(np.searchsorted(celulas, vizinhas), len(celulas) - 1)
+                    achou = celulas[posicao] == vizinhas
+                    quantidades = quantidades_celula[posicao[achou]]
+                    deslocamentos = np.cumsum(quantidades) - quantidades
+                    i = np.repeat(bloco[achou], quantidades)
+                    j = ordem[np.repeat(inicios[posicao[achou]] - deslocamentos, quantidades)
+                              + np.arange(quantidades.sum())]
+                    perto = (i < j) & (np.hypot(x[i] - x[j], y[i] - y[j]) <= distancia)
+                    if janela_ms:
+                        perto &= np.abs(instantes[i] - instantes[j]) <= janela_ms
+                    pares_i.append(i[perto])
+                    pares_j.append(j[perto])
+    return np.concatenate(pares_i), np.concatenate(pares_j)
+
+
+# Grupo (0..n_grupos-1) de cada alerta; alertas sem coordenadas ficam sozinhos
+@cronometrado("consolidacao.agrupar")
+def agrupar(categorias, longitudes, latitudes, instantes=None, distancia=config.DISTANCIA_CONSOLIDACAO,
+            janela=config.JANELA_CONSOLIDACAO):
+    x, y = projetar(longitudes, latitudes)
+    janela_ms = janela * 60_000 if janela and instantes is not None else 0
+    validos = ~(np.isnan(x) | np.isnan(y))
+    if janela_ms:
+        instantes = np.asarray(instantes, dtype=np.float64)
+        validos &= ~np.isnan(instantes)
+    posicoes = np.flatnonzero(validos)
+
+    rotulos = np.arange(len(x))
+    if len(posicoes):
+        i, j = _pares(np.asarray(categorias, dtype=np.int64)[posicoes], x[posicoes], y[posicoes],
+                      instantes[posicoes] if janela_ms else None, distancia, janela_ms)
+        rotulos[posicoes] = posicoes[_componentes(len(posicoes), i, j)]
+    return np.unique(rotulos, return_inverse=True)[1]
+
+
+# Um alerta por grupo: o primeiro relato do grupo, na posição média dos relatos,
+# com a quantidade de relatos na coluna 'Relatos'
+@cronometrado("consolidacao.consolidar")
+def consolidar(dados, distancia=config.DISTANCIA_CONSOLIDACAO, janela=config.JANELA_CONSOLIDACAO):
+    tipos = dados['Tipo de Alerta'].cat.codes.to_numpy().astype(np.int64) + 1
+    subtipos = dados['Subtipo de Alerta'].cat.codes.to_numpy().astype(np.int64) + 1
+    categorias = tipos * (len(dados['Subtipo de Alerta'].cat.categories) + 1) + subtipos
+    latitudes = dados['Latitude'].to_numpy(dtype=np.float64)
+    longitudes = dados['Longitude'].to_numpy(dtype=np.float64)
+    instantes = dados['pubmillis'].to_numpy() if 'pubmillis' in dados else None
+    if janela and instantes is None:
+        logger.warning("Alertas sem o instante do relato (WAZE_CAMPO_INSTANTE_ALERTAS): agrupando só pela distância")
+
+    grupos = agrupar(categorias, longitudes, latitudes, instantes, distancia, janela)
+    _, primeiros, relatos = np.unique(grupos, return_index=True, return_counts=True)
+    consolidados = dados.take(primeiros).reset_index(drop=True)
+    consolidados['Latitude'] = (np.bincount(grupos, weights=latitudes) / relatos).astype(dados['Latitude'].dtype)
+    consolidados['Longitude'] = (np.bincount(grupos, weights=longitudes) / relatos).astype(dados['Longitude'].dtype)
+    consolidados['Relatos'] = relatos
+    return consolidados
+
+
+# Uma versão consolidada por DataFrame e parâmetros, sempre o mesmo objeto (e, com ele, os
+# índices e agregados já montados sobre ele); some junto com o DataFrame original
+@por_dataframe
+def obter_consolidados(dados, distancia=config.DISTANCIA_CONSOLIDACAO, janela=config.JANELA_CONSOLIDACAO):
+    return consolidar(dados, distancia, janela)
@@ -0,0 +1,124 @@
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from waze import config
+
+# Cada etapa medida vira um registro DEBUG neste logger (e uma linha no arquivo de métricas, se houver)
+logger_etapas = logging.getLogger("waze.etapas")
+
+# Últimas etapas medidas no processo, para o painel de diagnóstico
+MAXIMO_ETAPAS = 2000
+_etapas = deque(maxlen=MAXIMO_ETAPAS)
+_lock = threading.Lock()
+
+# Execução (do script do app, do coletor...) a que as etapas medidas pertencem
+_rodada = contextvars.ContextVar("rodada", default=None)
+_contador_rodadas = itertools.count(1)
+
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por etapa: instante, nome, duração e atributos."""
+
+    def format(self, registro):
+        etapa = getattr(registro, "etapa", None)
+        if etapa is None:
+            return json.dumps({"instante": registro.created, "mensagem": registro.getMessage()}, ensure_ascii=False)
+        return json.dumps(etapa, ensure_ascii=False, default=str)
+
+
+_configurado = False
+
+
+# Logs do pacote no console, no nível de WAZE_LOG_NIVEL; com WAZE_METRICAS, todas as etapas
+# também vão, em JSON, para esse arquivo. Chamado pelos pontos de entrada (app, coletor).
+def configurar_log(nivel=config.LOG_NIVEL, arquivo_metricas=config.ARQUIVO_METRICAS):
+    global _configurado
+    with _lock:
+        if _configurado:
+            return
+        _configurado = True
+
+    nivel = logging.getLevelName(nivel.upper()) if isinstance(nivel, str) else nivel
+    pacote = logging.getLogger("waze")
+    pacote.propagate = False
+    pacote.setLevel(logging.DEBUG if arquivo_metricas else nivel)
+
+    console = logging.StreamHandler()
+    console.setLevel(nivel)
+    console.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    pacote.addHandler(console)
+
+    if arquivo_metricas:
+        arquivo = logging.FileHandler(arquivo_metricas, encoding="utf-8")
+        arquivo.setFormatter(FormatadorJSON())
+        logger_etapas.addHandler(arquivo)
+
+
+def iniciar_rodada():
+    rodada = next(_contador_rodadas)
+    _rodada.set(rodada)
+    return rodada
+
+
+# Função que, em outra thread (ex.: páginas baixadas em paralelo), roda na rodada de quem a criou
+def propagar(funcao):
+    contexto = contextvars.copy_context()
+    return lambda *args, **kwargs: contexto.copy().run(funcao, *args, **kwargs)
+
+
+def registrar(nome, ms=None, **atributos):
+    etapa = {"instante": time.time(), "rodada": _rodada.get(), "etapa": nome, "ms": ms, **atributos}
+    with _lock:
+        _etapas.append(etapa)
+    if logger_etapas.isEnabledFor(logging.DEBUG):
+        detalhes = " ".join(f"{chave}={valor}" for chave, valor in atributos.items())
+        duracao = "" if ms is None else f" {ms:.1f} ms"
+        logger_etapas.debug("%s%s %s", nome, duracao, detalhes, extra={"etapa": etapa})
+    return etapa
+
+
+@contextmanager
+def medir(nome, **atributos):
+    """Mede o bloco como uma etapa; o dict devolvido recebe atributos apurados dentro dele
+    (ex.: bytes, registros)."""
+    inicio = time.perf_counter()
+    try:
+        yield atributos
+    finally:
+        registrar(nome, round((time.perf_counter() - inicio) * 1000, 2), **atributos)
+
+
+def cronometrado(nome):
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with medir(nome):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
+
+
+def etapas(rodada=None):
+    with _lock:
+        todas = list(_etapas)
+    return todas if rodada is None else [etapa for etapa in todas if etapa["rodada"] == rodada]
+
+
+# Por nome de etapa: quantidade, tempo total, médio e máximo entre as últimas medidas
+def resumo():
+    grupos = {}
+    for etapa in etapas():
+        if etapa["ms"] is not None:
+            grupos.setdefault(etapa["etapa"], []).append(etapa["ms"])
+    return [
+        {"etapa": nome, "vezes": len(tempos), "total_ms": round(sum(tempos), 1),
+         "medio_ms": round(sum(tempos) / len(tempos), 1), "maximo_ms": max(tempos)}
+        for nome, tempos in sorted(grupos.items(), key=lambda item: -sum(item[1]))
+    ]
@@ -0,0 +1,178 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from waze import config
+from waze.arcgis import consultar_estatisticas
+from waze.cache import cache_estatisticas
+from waze.traducoes import traducao, traducao_level, traducao_tipo
+
+# Coluna exibida -> (campo no servidor, tradução, como_texto), com a mesma conversão
+# de valores feita por preparar_alertas/preparar_engarrafamentos
+CAMPOS_ALERTAS = {
+    'Tipo de Alerta': ('type', traducao_tipo, False),
+    'Subtipo de Alerta': ('subtype', traducao, True),
+    'Rodovia': ('rodovia', None, False),
+    'Mesorregião': ('mesorregiao', None, False),
+    'Município': ('municipio', None, False),
+    'Regional': ('regional', None, True),
+    'Jurisdição': ('jurisdicao', None, False),
+}
+
+CAMPOS_ENGARRAFAMENTOS = {
+    'level': ('level', traducao_level, True),
+    'city': ('city', None, False),
+    'speedkmh': ('speedkmh', None, False),
+    'length': ('length', None, False),
+    'speed': ('speed', None, False),
+    'delay': ('delay', None, False),
+    'cod_regional': ('cod_regional', None, False),
+    'rodovia': ('rodovia', None, False),
+    'mesorregiao': ('mesorregiao', None, False),
+    'municipio': ('municipio', None, False),
+    'regional': ('regional', None, True),
+    'jurisdicao': ('jurisdicao', None, False),
+    'altitude': ('altitude', None, False),
+    'declividade': ('declividade', None, False),
+}
+
+_CONTAGEM = [{"statisticType": "count", "onStatisticField": "objectid", "outStatisticFieldName": "contagem"}]
+
+
+# Valor como aparece no painel (None quando o painel descarta o valor ausente)
+def _exibir(valor, traducao, como_texto):
+    if como_texto:
+        valor = str(valor)
+    if valor is None:
+        return None
+    return traducao.get(valor, valor) if traducao else valor
+
+
+def _literal(valor):
+    if isinstance(valor, str):
+        return "'" + valor.replace("'", "''") + "'"
+    return repr(valor)
+
+
+class MotorServidor:
+    """Mesmas contagens do MotorResumo, calculadas pelo FeatureServer (outStatistics).
+
+    Nenhuma linha é baixada: os filtros (valores já traduzidos) viram uma cláusula
+    where sobre os valores originais e cada consulta fica no cache pelo CACHE_TTL.
+    """
+
+    def __init__(self, url, campos, tokens):
+        self.url = url
+        self.campos = campos
+        self.colunas = list(campos)
+        self.tokens = tokens
+
+    def _consultar(self, estatisticas, grupos=(), where="1=1"):
+        chave = (self.url, tuple(grupos), where, json.dumps(estatisticas))
+        linhas = cache_estatisticas.obter(
+            chave, lambda: consultar_estatisticas(self.url, self.tokens, estatisticas, grupos, where)
+        )
+        # Alguns servidores devolvem os nomes dos campos em maiúsculas
+        return [{nome.lower(): valor for nome, valor in linha.items()} for linha in linhas]
+
+    # Valores originais por trás de cada valor exibido (uma tradução pode juntar vários)
+    def _originais(self, coluna):
+        campo, traducao, como_texto = self.campos[coluna]
+        originais = {}
+        for linha in self._consultar(_CONTAGEM, [campo]):
+            valor = linha.get(campo)
+            originais.setdefault(_exibir(valor, traducao, como_texto), []).append(valor)
+        return originais
+
+    # Filtros (coluna -> valor exibido) como cláusula where
+    def where(self, filtros, exceto=None):
+        condicoes = []
+        for coluna, valor in filtros.items():
+            if coluna == exceto:
+                continue
+            campo = self.campos[coluna][0]
+            originais = self._originais(coluna).get(valor, [])
+            presentes = [_literal(original) for original in originais if original is not None]
+            partes = []
+            if presentes:
+                partes.append(f"{campo} IN ({', '.join(presentes)})")
+            if len(presentes) < len(originais):
+                partes.append(f"{campo} IS NULL")
+            if not partes:
+                return "1=0"  # valor que não existe mais na camada
+            condicoes.append(partes[0] if len(partes) == 1 else "(" + " OR ".join(partes) + ")")
+        return " AND ".join(condicoes) or "1=1"
+
+    # Contagem por combinação de valores das colunas, como groupby(colunas, observed=True).size()
+    def contagens(self, colunas, filtros=None, nome="contagem", where=None):
+        colunas = list(colunas)
+        if where is None:
+            where = self.where(filtros or {})
+        registros = []
+        for linha in self._consultar(_CONTAGEM, [self.campos[coluna][0] for coluna in colunas], where):
+            valores = [_exibir(linha.get(self.campos[coluna][0]), *self.campos[coluna][1:]) for coluna in colunas]
+            if any(valor is None for valor in valores):
+                continue
+            registros.append(valores + [linha["contagem"]])
+        tabela = pd.DataFrame(registros, columns=colunas + [nome])
+        # Traduções podem levar grupos diferentes do servidor ao mesmo valor exibido
+        return tabela.groupby(colunas, sort=True, as_index=False)[nome].sum()
+
+    def opcoes(self, coluna, filtros):
+        tabela = self.contagens([coluna], where=self.where(filtros, exceto=coluna))
+        return dict(zip(tabela[coluna].tolist(), tabela["contagem"].tolist()))
+
+    def total(self, filtros=None):
+        linhas = self._consultar(_CONTAGEM, where=self.where(filtros or {}))
+        return int(linhas[0]["contagem"] or 0) if linhas else 0
+
+    # Devolve (total, {dimensão: [(valor, contagem), ...]}), como MotorResumo.resumo
+    def resumo(self, dimensoes, filtros=None, top_n=1):
+        where = self.where(filtros or {})
+
+        def maiores_da(dimensao):
+            tabela = self.contagens([dimensao], where=where)
+            tabela = tabela.sort_values("contagem", ascending=False, kind="stable").head(top_n)
+            return [(valor, int(contagem)) for valor, contagem in zip(tabela[dimensao], tabela["contagem"])]
+
+        # Uma consulta por dimensão, todas ao mesmo tempo
+        with ThreadPoolExecutor(max_workers=config.MAX_CONEXOES) as executor:
+            total = executor.submit(self.total, filtros)
+            maiores = dict(zip(dimensoes, executor.map(maiores_da, dimensoes)))
+        return total.result(), maiores
+
+    def soma(self, coluna, filtros=None):
+        estatistica = [{"statisticType": "sum", "onStatisticField": self.campos[coluna][0],
+                        "outStatisticFieldName": "soma"}]
+        linhas = self._consultar(estatistica, where=self.where(filtros or {}))
+        return (linhas[0]["soma"] or 0) if linhas else 0
+
+    # Contagem por faixas [limite_i, limite_i+1) de uma coluna numérica, como pd.cut(right=False)
+    def faixas(self, coluna, limites, rotulos, filtros=None):
+        campo = self.campos[coluna][0]
+        where = self.where(filtros or {})
+        base = "" if where == "1=1" else f"({where}) AND "
+
+        def contar(faixa):
+            inicio, fim = faixa
+            linhas = self._consultar(_CONTAGEM, where=f"{base}{campo} >= {inicio!r} AND {campo} < {fim!r}")
+            return int(linhas[0]["contagem"] or 0) if linhas else 0
+
+        with ThreadPoolExecutor(max_workers=config.MAX_CONEXOES) as executor:
+            contagens = list(executor.map(contar, zip(limites[:-1], limites[1:])))
+        return pd.Series(contagens, index=pd.CategoricalIndex(rotulos, categories=rotulos, ordered=True, name=coluna),
+                         name="count")
+
+
+# Um motor por camada, compartilhado pelo processo
+_motores = {}
+_motores_lock = threading.Lock()
+
+
+def obter_motor_servidor(url, campos, tokens):
+    with _motores_lock:
+        if url not in _motores:
+            _motores[url] = MotorServidor(url, campos, tokens)
+        return _motores[url]
@@ -0,0 +1,75 @@
+import json
+import logging
+import re
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Par "chave: número" dentro do texto da linha, com aspas simples, duplas ou sem aspas
+_PAR = re.compile(r"""['"]?([xy])['"]?\s*:\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)""")
+
+
+def _pontos(valor):
+    # Texto: "[{'x': -44.1, 'y': -19.9}, ...]" (lido sem eval)
+    if isinstance(valor, str):
+        pares = _PAR.findall(valor)
+        xs = [float(numero) for chave, numero in pares if chave == 'x']
+        ys = [float(numero) for chave, numero in pares if chave == 'y']
+        if len(xs) != len(ys):
+            logger.warning("Geometria ignorada (pontos incompletos): %s", valor[:80])
+            return []
+        return list(zip(xs, ys))
+    # Vetor já decodificado: [x0, y0, x1, y1, ...]
+    if isinstance(valor, np.ndarray) and valor.dtype.kind == 'f':
+        return valor.reshape(-1, 2)
+    if valor is None or not hasattr(valor, '__len__'):
+        return []
+    # Lista de dicionários {'x': ..., 'y': ...} ou de pares [x, y] (paths do ArcGIS)
+    return [(ponto['x'], ponto['y']) if isinstance(ponto, dict) else (ponto[0], ponto[1]) for ponto in valor]
+
+
+# Todas as linhas em texto: um único parse JSON (só dados, nunca código) de todas elas juntas
+def _decodificar_textos(textos):
+    try:
+        linhas = json.loads('[' + ','.join(textos).replace("'", '"') + ']')
+        tamanhos = np.fromiter(map(len, linhas), dtype=np.int64, count=len(linhas))
+        pontos = [(ponto['x'], ponto['y']) for linha in linhas for ponto in linha]
+    except (ValueError, TypeError, KeyError):
+        return None  # formato inesperado: decodificar registro a registro
+    return np.array(pontos, dtype=np.float64).reshape(-1, 2), tamanhos
+
+
+# Decodifica todas as linhas de uma vez: coordenadas (N x 2, colunas x/y) e offsets (n + 1);
+# os pontos da linha i são coordenadas[offsets[i]:offsets[i + 1]]
+def decodificar_linhas(valores):
+    valores = list(valores)
+    # Caminho rápido: todas as linhas já estão como vetores planos
+    if valores and all(isinstance(valor, np.ndarray) and valor.dtype.kind == 'f' for valor in valores):
+        tamanhos = np.fromiter((len(valor) // 2 for valor in valores), dtype=np.int64, count=len(valores))
+        coordenadas = np.concatenate(valores).reshape(-1, 2)
+    elif valores and all(isinstance(valor, str) for valor in valores) and \
+            (decodificadas := _decodificar_textos(valores)) is not None:
+        coordenadas, tamanhos = decodificadas
+    else:
+        linhas = [_pontos(valor) for valor in valores]
+        tamanhos = np.fromiter((len(linha) for linha in linhas), dtype=np.int64, count=len(linhas))
+        coordenadas = np.array([ponto for linha in linhas for ponto in linha], dtype=np.float64).reshape(-1, 2)
+
+    offsets = np.zeros(len(valores) + 1, dtype=np.int64)
+    np.cumsum(tamanhos, out=offsets[1:])
+    return coordenadas, offsets
+
+
+# Uma visão por registro sobre o mesmo buffer (vetor plano x0, y0, x1, y1, ...), sem cópia
+def linhas_por_registro(coordenadas, offsets):
+    plano = coordenadas.reshape(-1)
+    return [plano[2 * inicio:2 * fim] for inicio, fim in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+# Limites [[sul, oeste], [norte, leste]] de todas as coordenadas, ou None se não houver pontos
+def limites(coordenadas):
+    if not len(coordenadas):
+        return None
+    minimo, maximo = coordenadas.min(axis=0), coordenadas.max(axis=0)
+    return [[float(minimo[1]), float(minimo[0])], [float(maximo[1]), float(maximo[0])]]
@@ -0,0 +1,98 @@
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from waze.cache import por_dataframe
+from waze.diagnostico import cronometrado
+
+# Quantidade de bits ligados em cada byte (contagem sobre os bitsets empacotados)
+_BITS_POR_BYTE = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+class IndiceFiltros:
+    """Índice invertido de um DataFrame: para cada valor de uma coluna, o conjunto de linhas.
+
+    Os conjuntos são bitsets empacotados (1 bit por linha), construídos uma vez por
+    coluna; uma combinação de filtros é a interseção (&) dos bitsets escolhidos.
+    """
+
+    def __init__(self, dados):
+        self._dados = weakref.ref(dados)
+        self.tamanho = len(dados)
+        self._codigos = {}  # coluna -> (códigos, valores)
+        self._bitsets = {}  # coluna -> matriz (valores x bytes)
+        self._lock = threading.Lock()
+
+    def dados(self):
+        return self._dados()
+
+    def codigos(self, coluna):
+        with self._lock:
+            if coluna not in self._codigos:
+                serie = self._dados()[coluna]
+                if isinstance(serie.dtype, pd.CategoricalDtype):
+                    codigos, valores = serie.cat.codes.to_numpy(), serie.cat.categories
+                else:
+                    codigos, valores = pd.factorize(serie, sort=True)
+                self._codigos[coluna] = (np.asarray(codigos), valores)
+            return self._codigos[coluna]
+
+    def bitsets(self, coluna):
+        codigos, valores = self.codigos(coluna)
+        with self._lock:
+            if coluna not in self._bitsets:
+                matriz = np.zeros((len(valores), (self.tamanho + 7) // 8), dtype=np.uint8)
+                # Ligar, numa única passada, o bit de cada linha no bitset do seu valor
+                linhas = np.flatnonzero(codigos >= 0)
+                bits = (0x80 >> (linhas & 7)).astype(np.uint8)  # mesma ordem de bits do packbits
+                np.bitwise_or.at(matriz, (codigos[linhas], linhas >> 3), bits)
+                self._bitsets[coluna] = matriz
+            return self._bitsets[coluna], valores
+
+    # Interseção dos filtros (coluna -> valor) como bitset; None quando não há filtro
+    def bitset(self, filtros):
+        resultado = None
+        for coluna, valor in filtros.items():
+            matriz, valores = self.bitsets(coluna)
+            posicao = valores.get_indexer([valor])[0]
+            if posicao < 0:
+                return np.zeros(matriz.shape[1], dtype=np.uint8)
+            resultado = matriz[posicao] if resultado is None else resultado & matriz[posicao]
+        return resultado
+
+    def mascara(self, filtros):
+        bitset = self.bitset(filtros)
+        if bitset is None:
+            return None
+        return np.unpackbits(bitset, count=self.tamanho).view(bool)
+
+    def linhas(self, filtros):
+        mascara = self.mascara(filtros)
+        return np.arange(self.tamanho) if mascara is None else np.flatnonzero(mascara)
+
+    # DataFrame com as linhas dos filtros, para quem precisa dele de fato (o mapa); contagens e
+    # opções ficam em linhas()/mascara(). Sem filtros, devolve o próprio DataFrame (sem cópia);
+    # não alterar o resultado no lugar
+    @cronometrado("indice.filtrar")
+    def filtrar(self, filtros):
+        dados = self._dados()
+        if not filtros:
+            return dados
+        return dados.take(self.linhas(filtros))
+
+    # Valores da coluna presentes com os demais filtros aplicados, com a contagem de cada um
+    def opcoes(self, coluna, filtros):
+        outros = {outra: valor for outra, valor in filtros.items() if outra != coluna}
+        matriz, valores = self.bitsets(coluna)
+        base = self.bitset(outros)
+        selecionados = matriz if base is None else matriz & base
+        contagens = _BITS_POR_BYTE[selecionados].sum(axis=1, dtype=np.int64)
+        return {valores[i]: int(contagens[i]) for i in np.flatnonzero(contagens)}
+
+
+# Um índice por DataFrame em uso; some junto com o DataFrame
+@por_dataframe
+def obter_indice(dados):
+    return IndiceFiltros(dados)
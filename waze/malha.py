@@ -0,0 +1,226 @@
+"""Malha viária de referência e ajuste (snapping) de alertas e engarrafamentos aos trechos.
+
+A malha é um GeoJSON local (WAZE_MALHA_VIARIA) com um LineString ou MultiLineString por
+trecho; as propriedades `rodovia` e `trecho` identificam cada um (na falta de `trecho`,
+vale a posição da feição). Os segmentos dos trechos ficam numa grade com células do
+tamanho do raio de ajuste: cada ponto só é comparado com os segmentos das 9 células em
+volta da sua, e o custo por ponto não cresce com o tamanho da malha.
+"""
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from waze import config
+from waze.cache import por_dataframe
+from waze.diagnostico import cronometrado
+from waze.simplificacao import obter_linhas_simplificadas
+
+# Metros por grau de latitude; a longitude é encolhida pelo cosseno da latitude de referência
+METROS_POR_GRAU = 111_320
+LATITUDE_REFERENCIA = -19.0  # centro aproximado de Minas Gerais
+
+# Pontos ajustados de cada vez (limita a memória dos pares ponto x segmento candidato)
+PONTOS_POR_BLOCO = 100_000
+
+
+# Longitude/latitude em metros, numa projeção equirretangular em torno de Minas Gerais
+def projetar(longitudes, latitudes):
+    escala_x = METROS_POR_GRAU * np.cos(np.radians(LATITUDE_REFERENCIA))
+    return np.asarray(longitudes, dtype=np.float64) * escala_x, np.asarray(latitudes, dtype=np.float64) * METROS_POR_GRAU
+
+
+def _partes(geometria):
+    if geometria is None:
+        return []
+    if geometria["type"] == "LineString":
+        return [geometria["coordinates"]]
+    if geometria["type"] == "MultiLineString":
+        return geometria["coordinates"]
+    return []
+
+
+class MalhaViaria:
+    """Trechos da malha (rodovia, trecho, extensão) e o índice em grade dos seus segmentos."""
+
+    @cronometrado("malha.carregar")
+    def __init__(self, feicoes, raio=config.RAIO_AJUSTE):
+        self.raio = raio
+        rodovias, nomes, x0, y0, x1, y1, donos = [], [], [], [], [], [], []
+        for posicao, feicao in enumerate(feicoes):
+            propriedades = feicao.get("properties") or {}
+            trecho = len(rodovias)
+            for parte in _partes(feicao.get("geometry")):
+                pontos = np.asarray(parte, dtype=np.float64).reshape(-1, 2)[:, :2]
+                if len(pontos) < 2:
+                    continue
+                x, y = projetar(pontos[:, 0], pontos[:, 1])
+                x0.append(x[:-1])
+                y0.append(y[:-1])
+                x1.append(x[1:])
+                y1.append(y[1:])
+                donos.append(np.full(len(pontos) - 1, trecho, dtype=np.int64))
+            rodovias.append(propriedades.get("rodovia"))
+            nomes.append(propriedades.get("trecho", str(posicao)))
+
+        x0, y0, x1, y1 = (np.concatenate(partes) if partes else np.zeros(0) for partes in (x0, y0, x1, y1))
+        donos = np.concatenate(donos) if donos else np.zeros(0, dtype=np.int64)
+        comprimentos = np.hypot(x1 - x0, y1 - y0)
+        self.trechos = pd.DataFrame({
+            'Rodovia': rodovias,
+            'Trecho': nomes,
+            'Extensão (km)': np.bincount(donos, weights=comprimentos, minlength=len(rodovias)) / 1000,
+        })
+
+        # Segmentos maiores que a célula viram pedaços menores, para que cada um caia em no máximo 2 x 2 células
+        pedacos = np.maximum(np.ceil(comprimentos / raio), 1).astype(np.int64)
+        origem = np.repeat(np.arange(len(comprimentos)), pedacos)
+        fracao = np.arange(len(origem)) - np.repeat(np.cumsum(pedacos) - pedacos, pedacos)
+        inicio, fim = fracao / pedacos[origem], (fracao + 1) / pedacos[origem]
+        dx, dy = (x1 - x0)[origem], (y1 - y0)[origem]
+        self.x0, self.y0 = x0[origem] + dx * inicio, y0[origem] + dy * inicio
+        self.x1, self.y1 = x0[origem] + dx * fim, y0[origem] + dy * fim
+        self.donos = donos[origem]
+        self._indexar()
+
+    def _celula(self, x, y):
+        return np.floor(x / self.raio).astype(np.int64), np.floor(y / self.raio).astype(np.int64)
+
+    def _chave(self, coluna, linha):
+        return coluna * self._linhas + linha
+
+    # Grade em formato CSR: chaves das células ocupadas (ordenadas) e, para cada uma,
+    # o intervalo dos seus segmentos em self._segmentos
+    def _indexar(self):
+        coluna0, linha0 = self._celula(np.minimum(self.x0, self.x1), np.minimum(self.y0, self.y1))
+        coluna1, linha1 = self._celula(np.maximum(self.x0, self.x1), np.maximum(self.y0, self.y1))
+        # Linhas da grade com folga para a vizinhança das consultas; chaves sem colisão
+        self._linhas = int(np.abs(np.concatenate([linha0, linha1])).max(initial=0)) * 2 + 4
+        segmentos, chaves = [], []
+        for dc in (0, 1):
+            for dl in (0, 1):
+                cobre = (coluna0 + dc <= coluna1) & (linha0 + dl <= linha1)
+                segmentos.append(np.flatnonzero(cobre))
+                chaves.append(self._chave(coluna0[cobre] + dc, linha0[cobre] + dl))
+        segmentos, chaves = np.concatenate(segmentos), np.concatenate(chaves)
+        ordem = np.argsort(chaves, kind='stable')
+        self._segmentos = segmentos[ordem]
+        self._celulas, self._inicios = np.unique(chaves[ordem], return_index=True)
+        self._fins = np.append(self._inicios[1:], len(ordem))
+
+    # Trecho mais próximo (dentro do raio) de cada ponto e a distância em metros; -1/NaN se nenhum
+    @cronometrado("malha.ajustar_pontos")
+    def ajustar_pontos(self, longitudes, latitudes):
+        x, y = projetar(longitudes, latitudes)
+        trechos = np.full(len(x), -1, dtype=np.int64)
+        distancias = np.full(len(x), np.nan)
+        for inicio in range(0, len(x), PONTOS_POR_BLOCO):
+            bloco = slice(inicio, inicio + PONTOS_POR_BLOCO)
+            trechos[bloco], distancias[bloco] = self._ajustar_bloco(x[bloco], y[bloco])
+        return trechos, distancias
+
+    def _ajustar_bloco(self, x, y):
+        trechos = np.full(len(x), -1, dtype=np.int64)
+        distancias = np.full(len(x), np.nan)
+        validos = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+        if not len(validos) or not len(self._celulas):
+            return trechos, distancias
+        coluna, linha = self._celula(x[validos], y[validos])
+
+        # Pares (ponto, segmento candidato) das 9 células em volta de cada ponto
+        pontos, candidatos = [], []
+        for dc in (-1, 0, 1):
+            for dl in (-1, 0, 1):
+                chaves = self._chave(coluna + dc, linha + dl)
+                posicao = np.minimum(np.searchsorted(self._celulas, chaves), len(self._celulas) - 1)
+                achou = self._celulas[posicao] == chaves
+                inicios = self._inicios[posicao[achou]]
+                quantidades = self._fins[posicao[achou]] - inicios
+                deslocamentos = np.cumsum(quantidades) - quantidades
+                pontos.append(np.repeat(np.flatnonzero(achou), quantidades))
+                candidatos.append(self._segmentos[np.repeat(inicios - deslocamentos, quantidades)
+                                                  + np.arange(quantidades.sum())])
+        pontos, candidatos = np.concatenate(pontos), np.concatenate(candidatos)
+        if not len(pontos):
+            return trechos, distancias
+
+        # Distância de cada ponto ao seu segmento candidato (projeção limitada às pontas)
+        px, py = x[validos][pontos], y[validos][pontos]
+        ax, ay = self.x0[candidatos], self.y0[candidatos]
+        bx, by = self.x1[candidatos] - ax, self.y1[candidatos] - ay
+        quadrado = bx * bx + by * by
+        t = np.clip(((px - ax) * bx + (py - ay) * by) / np.where(quadrado > 0, quadrado, 1), 0, 1)
+        distancia = np.hypot(px - ax - t * bx, py - ay - t * by)
+
+        # Menor distância de cada ponto, se estiver dentro do raio
+        ordem = np.lexsort((distancia, pontos))
+        primeiros = ordem[np.r_[True, pontos[ordem][1:] != pontos[ordem][:-1]]]
+        dentro = distancia[primeiros] <= self.raio
+        escolhidos = validos[pontos[primeiros][dentro]]
+        trechos[escolhidos] = self.donos[candidatos[primeiros][dentro]]
+        distancias[escolhidos] = distancia[primeiros][dentro]
+        return trechos, distancias
+
+    # Trecho de cada linha: o mais frequente entre os trechos dos seus vértices (-1 se nenhum)
+    @cronometrado("malha.ajustar_linhas")
+    def ajustar_linhas(self, coordenadas, offsets):
+        quantidade = len(offsets) - 1
+        trechos, _ = self.ajustar_pontos(coordenadas[:, 0], coordenadas[:, 1])
+        linhas = np.repeat(np.arange(quantidade), np.diff(offsets))
+        ajustados = trechos >= 0
+        resultado = np.full(quantidade, -1, dtype=np.int64)
+        if not ajustados.any():
+            return resultado
+        pares, votos = np.unique(np.column_stack([linhas[ajustados], trechos[ajustados]]), axis=0, return_counts=True)
+        ordem = np.lexsort((-votos, pares[:, 0]))
+        primeiros = ordem[np.r_[True, pares[ordem][1:, 0] != pares[ordem][:-1, 0]]]
+        resultado[pares[primeiros, 0]] = pares[primeiros, 1]
+        return resultado
+
+
+def ler_malha(caminho, raio=config.RAIO_AJUSTE):
+    with open(caminho, encoding="utf-8") as arquivo:
+        return MalhaViaria(json.load(arquivo)["features"], raio)
+
+
+# Uma malha por arquivo, lida uma vez por processo; None se não houver malha configurada
+_malhas = {}
+_malhas_lock = threading.Lock()
+
+
+def obter_malha(caminho=config.MALHA_VIARIA):
+    if not caminho:
+        return None
+    with _malhas_lock:
+        if caminho not in _malhas:
+            _malhas[caminho] = ler_malha(caminho)
+        return _malhas[caminho]
+
+
+# Trecho de cada registro de um DataFrame de alertas (pontos) ou de engarrafamentos (linhas);
+# calculado uma vez por DataFrame e malha, some junto com o DataFrame
+@por_dataframe
+def obter_ajuste(dados, malha):
+    if 'Longitude' in dados:
+        trechos, _ = malha.ajustar_pontos(dados['Longitude'].to_numpy(), dados['Latitude'].to_numpy())
+        return trechos
+    linhas = obter_linhas_simplificadas(dados)
+    return malha.ajustar_linhas(linhas.coordenadas, linhas.offsets)
+
+
+# Registros (e, com `pesos`, a soma deles) por trecho, entre as linhas da máscara (None: todas),
+# e as mesmas quantidades por km de trecho; do trecho mais denso ao menos
+def densidade_por_trecho(malha, trechos, mascara=None, pesos=None, rotulo='Registros', rotulo_pesos=None):
+    selecionados = trechos >= 0 if mascara is None else (trechos >= 0) & mascara
+    quantidade = len(malha.trechos)
+    tabela = malha.trechos.copy()
+    tabela[rotulo] = np.bincount(trechos[selecionados], minlength=quantidade)
+    extensao = tabela['Extensão (km)'].to_numpy()
+    com_extensao = np.where(extensao > 0, extensao, np.nan)
+    tabela[f"{rotulo} por km"] = tabela[rotulo] / com_extensao
+    if pesos is not None:
+        tabela[rotulo_pesos] = np.bincount(trechos[selecionados], weights=pesos[selecionados], minlength=quantidade)
+        tabela[f"{rotulo_pesos} por km"] = tabela[rotulo_pesos] / com_extensao
+    ordenar_por = f"{rotulo_pesos} por km" if pesos is not None else f"{rotulo} por km"
+    return tabela[tabela[rotulo] > 0].sort_values(ordenar_por, ascending=False).reset_index(drop=True)
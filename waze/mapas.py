@@ -0,0 +1,161 @@
+import json
+
+import folium
+import numpy as np
+import pandas as pd
+from folium.plugins import FastMarkerCluster, HeatMap
+from jinja2 import Template
+
+from waze.calor import RAIO_CALOR, ZOOM_MAXIMO_ESTATICO
+from waze.diagnostico import cronometrado
+from waze.geometria import decodificar_linhas, limites
+
+# Campos exibidos no pop-up de cada engarrafamento (coluna -> rótulo)
+CAMPOS_POPUP_ENGARRAFAMENTO = {
+    'level': 'Nível',
+    'length': 'Comprimento (km)',
+    'speedkmh': 'Velocidade (km/h)',
+    'rodovia': 'Rodovia',
+    'municipio': 'Município',
+    'regional': 'Regional',
+    'jurisdicao': 'Jurisdição',
+}
+
+
+# Função para determinar os estilos de linha
+def get_line_style(level):
+    colors = {'Fluxo Livre': 'blue', 'Leve': 'green', 'Moderado': 'yellow', 'Alto': 'orange', 'Bloqueado': 'red'}
+    thickness = {'Fluxo Livre': 2, 'Leve': 3, 'Moderado': 4, 'Alto': 5, 'Bloqueado': 6}
+    return colors.get(level, 'black'), thickness.get(level, 2)
+
+
+def estilo_engarrafamento(feature):
+    color, thickness = get_line_style(feature['properties']['level'])
+    return {'color': color, 'weight': thickness, 'opacity': 0.6}
+
+
+# Valores da coluna prontos para JSON (sem tipos do NumPy e com None no lugar de NaN)
+def _valores_json(serie):
+    if pd.api.types.is_float_dtype(serie):
+        serie = serie.round(2)
+    return serie.astype(object).where(serie.notna(), None).tolist()
+
+
+# Todos os engarrafamentos como uma única FeatureCollection, mais os limites [[sul, oeste], [norte, leste]].
+# `geometria` (coordenadas, offsets) substitui a coluna `line`, por exemplo por uma versão simplificada.
+@cronometrado("mapa.engarrafamentos")
+def colecao_engarrafamentos(dados, geometria=None):
+    propriedades = {coluna: _valores_json(dados[coluna]) for coluna in CAMPOS_POPUP_ENGARRAFAMENTO}
+    coordenadas, offsets = geometria if geometria is not None else decodificar_linhas(dados['line'])
+    pontos = coordenadas.tolist()  # conversão única para listas do Python
+
+    features = []
+    for posicao, (objectid, inicio, fim) in enumerate(zip(dados['objectid'].tolist(), offsets[:-1].tolist(), offsets[1:].tolist())):
+        if fim - inicio < 2:
+            continue
+        features.append({
+            'type': 'Feature',
+            'id': objectid,
+            'geometry': {'type': 'LineString', 'coordinates': pontos[inicio:fim]},
+            'properties': {coluna: valores[posicao] for coluna, valores in propriedades.items()},
+        })
+
+    return {'type': 'FeatureCollection', 'features': features}, limites(coordenadas)
+
+
+# Camada folium com estilo por nível e pop-up montado no navegador a partir das propriedades
+def camada_engarrafamentos(colecao):
+    return folium.GeoJson(
+        colecao,
+        name="Engarrafamentos",
+        style_function=estilo_engarrafamento,
+        popup=folium.GeoJsonPopup(
+            fields=list(CAMPOS_POPUP_ENGARRAFAMENTO),
+            aliases=list(CAMPOS_POPUP_ENGARRAFAMENTO.values()),
+            max_width=300,
+        ),
+    )
+
+
+# Pontos de alerta agrupados no navegador conforme o zoom e desenhados em canvas.
+# Cada ponto vai como [lat, lon, código do tipo, código do subtipo, relatos]; os nomes seguem uma única vez.
+# Alertas consolidados (waze.consolidacao) mostram no tooltip quantos relatos agrupam.
+@cronometrado("mapa.pontos")
+def camada_pontos(dados):
+    pontos = dados.dropna(subset=['Latitude', 'Longitude'])
+    tipos = pontos['Tipo de Alerta'].astype('category').cat
+    subtipos = pontos['Subtipo de Alerta'].astype('category').cat
+    relatos = pontos['Relatos'].to_numpy() if 'Relatos' in pontos else np.ones(len(pontos))
+    linhas = np.column_stack([
+        pontos['Latitude'].to_numpy(dtype=np.float64).round(5),
+        pontos['Longitude'].to_numpy(dtype=np.float64).round(5),
+        tipos.codes.to_numpy(),
+        subtipos.codes.to_numpy(),
+        relatos,
+    ]).tolist()
+
+    callback = """(function () {
+        var tipos = %s;
+        var subtipos = %s;
+        return function (row) {
+            var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+                radius: 10, color: "blue", fill: true, fillOpacity: 1
+            });
+            marker.bindTooltip((tipos[row[2]] || "") + ": " + (subtipos[row[3]] || "")
+                + (row[4] > 1 ? " (" + row[4] + " relatos)" : ""));
+            return marker;
+        };
+    })()""" % (json.dumps(list(tipos.categories), ensure_ascii=False),
+               json.dumps(list(subtipos.categories), ensure_ascii=False))
+
+    return FastMarkerCluster(linhas, callback=callback, name="Alertas",
+                             options={'chunkedLoading': True})
+
+
+class HeatMapPorZoom(HeatMap):
+    """HeatMap que recebe um conjunto de pontos por nível de zoom e troca conforme o zoom do mapa."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = L.heatLayer([], {{ this.options|tojson }});
+            (function (calor, mapa) {
+                var zooms = {{ this.zooms|tojson }};
+                var niveis = {{ this.niveis|tojson }};
+                function atualizar() {
+                    var nivel = 0;
+                    while (nivel + 1 < zooms.length && zooms[nivel + 1] <= mapa.getZoom()) {
+                        nivel++;
+                    }
+                    if (calor._nivel !== nivel) {
+                        calor._nivel = nivel;
+                        calor.setLatLngs(niveis[nivel]);
+                    }
+                }
+                mapa.on("zoomend", atualizar);
+                atualizar();
+            })({{ this.get_name() }}, {{ this._parent.get_name() }});
+        {% endmacro %}
+        """)
+
+    def __init__(self, niveis, zooms, **kwargs):
+        super().__init__([], **kwargs)
+        self.niveis = niveis
+        self.zooms = zooms
+
+
+# Mapa de calor a partir das células da pirâmide (centroide + quantidade de alertas),
+# em vez de um ponto por alerta. Com zoom, só o nível desse zoom (e só o envelope, se dado);
+# sem zoom (mapa estático), os níveis até ZOOM_MAXIMO_ESTATICO. Cada célula leva três números
+# e cada ponto, dois: quando as células não ficam menores que os pontos, vão os pontos.
+@cronometrado("mapa.calor")
+def camada_calor(piramide, filtros=None, envelope=None, zoom=None):
+    if zoom is None:
+        niveis = piramide.niveis(filtros, ZOOM_MAXIMO_ESTATICO)
+    else:
+        niveis = [piramide.pontos(piramide.nivel_para(zoom), filtros, envelope)]
+    pontos = sum(peso for _, _, peso in niveis[0])  # cada ponto está em uma célula de cada nível
+    if 3 * sum(len(celulas) for celulas in niveis) >= 2 * pontos:
+        return HeatMap(piramide.pontos_brutos(filtros, envelope), radius=RAIO_CALOR)
+    if len(niveis) == 1:
+        return HeatMap(niveis[0], radius=RAIO_CALOR)
+    return HeatMapPorZoom(niveis, piramide.zooms[:len(niveis)], radius=RAIO_CALOR)
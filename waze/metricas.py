@@ -0,0 +1,112 @@
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from waze.cache import por_dataframe
+from waze.diagnostico import cronometrado
+from waze.indice import obter_indice
+
+# Dimensões dos cards "Resumo das Ocorrências" de cada página
+DIMENSOES_ALERTAS = ['Rodovia', 'Regional', 'Município', 'Jurisdição', 'Mesorregião']
+DIMENSOES_ENGARRAFAMENTOS = ['rodovia', 'regional', 'municipio', 'jurisdicao', 'mesorregiao']
+
+# Quantas combinações de filtros ficam memorizadas por DataFrame
+MAXIMO_MEMORIZADOS = 256
+
+
+class MotorResumo:
+    """Contagens por dimensão (top-N) sobre os códigos inteiros das colunas de um DataFrame.
+
+    As linhas de cada combinação de filtros vêm do índice invertido do DataFrame;
+    o resultado de cada combinação fica memorizado.
+    """
+
+    def __init__(self, dados):
+        self._dados = weakref.ref(dados)
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def indice(self):
+        return obter_indice(self._dados())
+
+    @property
+    def colunas(self):
+        return list(self._dados().columns)
+
+    def opcoes(self, coluna, filtros):
+        return self.indice().opcoes(coluna, filtros)
+
+    # Valores de uma coluna nas linhas dos filtros, sem copiar o DataFrame
+    def _valores(self, coluna, filtros):
+        valores = self._dados()[coluna].to_numpy()
+        mascara = self.indice().mascara(filtros or {})
+        return valores if mascara is None else valores[mascara]
+
+    # Contagem por combinação de valores das colunas, como groupby(colunas, observed=True).size(),
+    # sobre os códigos do índice
+    @cronometrado("metricas.contagens")
+    def contagens(self, colunas, filtros=None, nome="contagem"):
+        indice = self.indice()
+        mascara = indice.mascara(filtros or {})
+        codigos, valores = zip(*(indice.codigos(coluna) for coluna in colunas))
+        if mascara is not None:
+            codigos = [codigos_coluna[mascara] for codigos_coluna in codigos]
+        # Linhas sem valor em alguma das colunas ficam de fora, como no groupby
+        validos = np.logical_and.reduce([codigos_coluna >= 0 for codigos_coluna in codigos])
+        combinados = np.ravel_multi_index([codigos_coluna[validos] for codigos_coluna in codigos],
+                                          [len(valores_coluna) for valores_coluna in valores])
+        chaves, quantidades = np.unique(combinados, return_counts=True)
+        posicoes = np.unravel_index(chaves, [len(valores_coluna) for valores_coluna in valores])
+        tabela = pd.DataFrame({coluna: valores_coluna.take(posicao)
+                               for coluna, valores_coluna, posicao in zip(colunas, valores, posicoes)})
+        tabela[nome] = quantidades
+        return tabela
+
+    @cronometrado("metricas.soma")
+    def soma(self, coluna, filtros=None):
+        return np.nansum(self._valores(coluna, filtros))
+
+    # Contagem por faixas [limite_i, limite_i+1) de uma coluna numérica
+    @cronometrado("metricas.faixas")
+    def faixas(self, coluna, limites, rotulos, filtros=None):
+        valores = pd.Series(self._valores(coluna, filtros))
+        return pd.cut(valores, bins=limites, labels=rotulos, right=False).value_counts().sort_index()
+
+    # Devolve (total, {dimensão: [(valor, contagem), ...]}) com os top_n de cada dimensão
+    @cronometrado("metricas.resumo")
+    def resumo(self, dimensoes, filtros=None, top_n=1):
+        filtros = filtros or {}
+        chave = (tuple(dimensoes), tuple(sorted(filtros.items())), top_n)
+        with self._lock:
+            if chave in self._memo:
+                return self._memo[chave]
+
+            indice = self.indice()
+            mascara = indice.mascara(filtros)
+            total = indice.tamanho if mascara is None else int(mascara.sum())
+            maiores = {}
+            for dimensao in dimensoes:
+                codigos, valores = indice.codigos(dimensao)
+                if mascara is not None:
+                    codigos = codigos[mascara]
+                contagens = np.bincount(codigos[codigos >= 0], minlength=len(valores))
+                ordem = np.argsort(-contagens, kind='stable')[:top_n]
+                maiores[dimensao] = [(valores[i], int(contagens[i])) for i in ordem if contagens[i] > 0]
+
+            if len(self._memo) >= MAXIMO_MEMORIZADOS:
+                self._memo.clear()
+            self._memo[chave] = (total, maiores)
+            return total, maiores
+
+
+# Um motor por DataFrame em uso; some junto com o DataFrame
+@por_dataframe
+def obter_motor(dados):
+    return MotorResumo(dados)
+
+
+# Primeiro colocado de uma dimensão, ou ("N/A", 0) se não houver valores
+def maior(maiores, dimensao):
+    return maiores[dimensao][0] if maiores[dimensao] else ("N/A", 0)
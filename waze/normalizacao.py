@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from waze import config
+from waze.geometria import decodificar_linhas, linhas_por_registro
+from waze.traducoes import traducao, traducao_level, traducao_tipo
+
+# Colunas que o painel de engarrafamentos realmente usa (pubmillis, para as tendências,
+# fica em float64: em float32 perderia minutos)
+COLUNAS_ENGARRAFAMENTOS = ['objectid', 'level', 'city', 'line', 'speedkmh', 'length', 'speed',
+                           'delay', 'pubmillis', 'cod_regional', 'rodovia', 'mesorregiao', 'municipio',
+                           'regional', 'jurisdicao', 'altitude', 'declividade']
+
+
+# Converte para categoria e aplica a tradução uma única vez, sobre as categorias.
+# Com como_texto, valores ausentes viram "None", como fazia o .astype(str) anterior.
+def categorizar(serie, traducao=None, como_texto=False):
+    categorica = serie.astype("category")
+    categorias = categorica.cat.categories
+    codigos = categorica.cat.codes.to_numpy()
+
+    if como_texto:
+        categorias = categorias.astype(str)
+        if (codigos == -1).any():
+            categorias = categorias.append(pd.Index(["None"]))
+            codigos = np.where(codigos == -1, len(categorias) - 1, codigos)
+    if traducao:
+        categorias = categorias.map(lambda valor: traducao.get(valor, valor))
+
+    # Traduções (ou a conversão para texto) podem juntar categorias diferentes numa só
+    unicas = pd.Index(categorias.unique())
+    novos_codigos = unicas.get_indexer(categorias)
+    codigos = np.where(codigos >= 0, novos_codigos[codigos], -1)
+    return pd.Series(pd.Categorical.from_codes(codigos, unicas), index=serie.index, name=serie.name)
+
+
+# Reduz colunas numéricas ao menor tipo que comporta os valores
+def reduzir_numericos(dados, colunas):
+    for coluna in colunas:
+        if coluna not in dados or not pd.api.types.is_numeric_dtype(dados[coluna]):
+            continue
+        valores = dados[coluna]
+        if valores.notna().all() and (valores % 1 == 0).all():
+            dados[coluna] = pd.to_numeric(valores, downcast='integer')
+        else:
+            dados[coluna] = pd.to_numeric(valores, downcast='float')
+    return dados
+
+
+# Junta dois DataFrames normalizados mantendo as colunas categóricas como categorias
+def concatenar(primeiro, segundo):
+    juntos = pd.concat([primeiro, segundo], ignore_index=True)
+    for coluna in juntos.columns:
+        if (coluna in primeiro and coluna in segundo
+                and isinstance(primeiro[coluna].dtype, pd.CategoricalDtype)
+                and isinstance(segundo[coluna].dtype, pd.CategoricalDtype)
+                and not isinstance(juntos[coluna].dtype, pd.CategoricalDtype)):
+            unidas = union_categoricals([primeiro[coluna], segundo[coluna]], ignore_order=True)
+            juntos[coluna] = pd.Series(unidas, index=juntos.index).cat.remove_unused_categories()
+    return juntos
+
+
+def preparar_alertas(all_data):
+    # Transformar os dados em DataFrame
+    dados = pd.DataFrame(all_data, columns=['objectid', 'type', 'subtype', 'rodovia', 'mesorregiao',
+                                            'municipio', 'regional', 'jurisdicao', 'x', 'y'])
+
+    dados['subtype'] = categorizar(dados['subtype'], traducao, como_texto=True)
+    dados['regional'] = categorizar(dados['regional'], como_texto=True)
+    dados['type'] = categorizar(dados['type'], traducao_tipo)
+    for coluna in ['rodovia', 'mesorregiao', 'municipio', 'jurisdicao']:
+        dados[coluna] = categorizar(dados[coluna])
+    reduzir_numericos(dados, ['objectid', 'x', 'y'])
+    colunas = ['objectid', 'type', 'subtype', 'rodovia', 'mesorregiao', 'municipio', 'regional', 'jurisdicao', 'x', 'y']
+    # Instante do relato, se a camada o fornece (para consolidar alertas repetidos numa janela de tempo), em float64
+    if config.CAMPO_INSTANTE_ALERTAS in all_data:
+        dados['pubmillis'] = np.asarray(all_data[config.CAMPO_INSTANTE_ALERTAS], dtype=np.float64)
+        colunas.append('pubmillis')
+
+    # Seleção e renomeação de colunas
+    return dados[colunas].rename(
+        columns={
+            'objectid': 'Alerta', 'type': 'Tipo de Alerta', 'subtype': 'Subtipo de Alerta',
+            'rodovia': 'Rodovia', 'mesorregiao': 'Mesorregião', 'municipio': 'Município',
+            'regional': 'Regional', 'jurisdicao': 'Jurisdição', 'x': 'Longitude', 'y': 'Latitude'})
+
+
+def preparar_engarrafamentos(all_data):
+    # Transformar os dados em DataFrame, só com as colunas usadas pelo painel
+    dados_engarrafamentos = pd.DataFrame(all_data, columns=COLUNAS_ENGARRAFAMENTOS)
+
+    dados_engarrafamentos['regional'] = categorizar(dados_engarrafamentos['regional'], como_texto=True)
+    dados_engarrafamentos['level'] = categorizar(dados_engarrafamentos['level'], traducao_level, como_texto=True)
+    for coluna in ['city', 'rodovia', 'mesorregiao', 'municipio', 'jurisdicao']:
+        dados_engarrafamentos[coluna] = categorizar(dados_engarrafamentos[coluna])
+    reduzir_numericos(dados_engarrafamentos, ['objectid', 'speedkmh', 'length', 'speed', 'delay',
+                                              'cod_regional', 'altitude', 'declividade'])
+
+    # Geometria decodificada sem eval: cada registro guarda uma visão (x0, y0, x1, y1, ...)
+    # sobre um único vetor de coordenadas
+    coordenadas, offsets = decodificar_linhas(dados_engarrafamentos['line'])
+    dados_engarrafamentos['line'] = linhas_por_registro(coordenadas, offsets)
+    return dados_engarrafamentos
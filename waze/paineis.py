@@ -0,0 +1,217 @@
+"""Conteúdo das páginas do painel, sem Streamlit: cards, gráficos e mapas.
+
+Usado pelo app (que exibe cada peça) e pelos relatórios estáticos (waze.relatorios).
+"""
+from collections import namedtuple
+
+import folium
+import pandas as pd
+import plotly.express as px
+
+from waze.calor import obter_piramide
+from waze.indice import obter_indice
+from waze.malha import densidade_por_trecho, obter_ajuste
+from waze.mapas import camada_calor, camada_engarrafamentos, camada_pontos, colecao_engarrafamentos
+from waze.metricas import DIMENSOES_ALERTAS, DIMENSOES_ENGARRAFAMENTOS, maior
+from waze.series import HORAS_GRAFICO, HORAS_SEMANA
+from waze.simplificacao import obter_linhas_simplificadas, zoom_para_limites
+from waze.vista import pontos_no_envelope
+
+# Centro inicial dos mapas (Minas Gerais) e tamanho em que são exibidos
+CENTRO_ALERTAS = [-19.8157, -43.9542]
+CENTRO_ENGARRAFAMENTOS = [-19.965, -44.740]
+LARGURA_MAPA, ALTURA_MAPA = 1400, 800
+
+# Faixas de comprimento dos engarrafamentos, em km (comparadas com o comprimento em m)
+FAIXAS_KM = [0, 1, 2, 4, 10, 20]
+ROTULOS_FAIXAS = ['0-1 km', '1-2 km', '2-4 km', '4-10 km', '10-20 km']
+
+# Medidas das tendências: rótulo -> (medida da série, divisor para a unidade exibida)
+MEDIDAS_TENDENCIA = {
+    'Engarrafamentos': ('contagem', 1),
+    'Comprimento (km)': ('comprimento', 1000),
+    'Atraso (min)': ('atraso', 60),
+}
+
+# Card do "Resumo das Ocorrências" (delta None: sem delta)
+Card = namedtuple("Card", "rotulo valor delta")
+
+
+# Duas linhas de três cards: total, regional e mesorregião; rodovia, município e jurisdição
+def cards_alertas(motor, filtros):
+    total, maiores = motor.resumo(DIMENSOES_ALERTAS, filtros)
+    regional, n_regional = maior(maiores, 'Regional')
+    mesorregiao, n_mesorregiao = maior(maiores, 'Mesorregião')
+    rodovia, n_rodovia = maior(maiores, 'Rodovia')
+    municipio, n_municipio = maior(maiores, 'Município')
+    jurisdicao, n_jurisdicao = maior(maiores, 'Jurisdição')
+    return total, [
+        [Card("Total de Alertas", f"{total} ocorrências ⚠️", None),
+         Card("Regional com Mais Ocorrências", f"{regional} 📝", f"{n_regional} ocorrências"),
+         Card("Mesorregião com Mais Ocorrências", f"{mesorregiao} 🗺️", f"{n_mesorregiao} ocorrências")],
+        [Card("Rodovia com Mais Ocorrências", f"{rodovia} 🛣️", f"{n_rodovia} Ocorrências"),
+         Card("Município com Mais Ocorrências", f"{municipio} 🏙️", f"{n_municipio} Ocorrências"),
+         Card("Jurisdição com Mais Ocorrências", f"{jurisdicao} 🏛️", f"{n_jurisdicao} Ocorrências")],
+    ]
+
+
+def cards_engarrafamentos(motor, filtros):
+    total, maiores = motor.resumo(DIMENSOES_ENGARRAFAMENTOS, filtros)
+    regional, n_regional = maior(maiores, 'regional')
+    mesorregiao, n_mesorregiao = maior(maiores, 'mesorregiao')
+    rodovia, n_rodovia = maior(maiores, 'rodovia')
+    municipio, n_municipio = maior(maiores, 'municipio')
+    jurisdicao, n_jurisdicao = maior(maiores, 'jurisdicao')
+    return total, [
+        [Card("Total de Engarrafamentos", f"{total} Engarrafamentos ⚠️", None),
+         Card("Regional com Mais Engarrafamentos", f"{regional} 📝", f"{n_regional} Engarrafamentos"),
+         Card("Mesorregião com Mais Engarrafamentos", f"{mesorregiao} 🗺️", f"{n_mesorregiao} Engarrafamentos")],
+        [Card("Rodovia com Mais Engarrafamentos", f"{rodovia} 🛣️", f"{n_rodovia} Engarrafamentos"),
+         Card("Município com Mais Engarrafamentos", f"{municipio} 🏙️", f"{n_municipio} Engarrafamentos"),
+         Card("Jurisdição com Mais Engarrafamentos", f"{jurisdicao} 🏛️", f"{n_jurisdicao} Engarrafamentos")],
+    ]
+
+
+def comprimento_total_km(motor, filtros):
+    return int(motor.soma('length', filtros) / 1000)
+
+
+# Histograma "Distribuição por Subtipos de Alertas", do subtipo mais frequente ao menos
+def figura_subtipos(motor, filtros):
+    subtipo_counts = (
+        motor.contagens(["Subtipo de Alerta", "Tipo de Alerta"], filtros, nome="counts")
+        .sort_values(by="counts", ascending=False)
+    )
+    fig = px.histogram(
+        subtipo_counts,
+        x="Subtipo de Alerta",
+        y="counts",
+        color="Tipo de Alerta",
+        title="Distribuição por Subtipos de Alertas",
+        text_auto=True
+    )
+    fig.update_layout(
+        xaxis_categoryorder="total descending",
+        xaxis_title="Subtipo de Alerta",
+        yaxis_title="Contagem"
+    )
+    return fig
+
+
+# Contagem de engarrafamentos por faixa de comprimento
+def faixas_comprimento(motor, filtros):
+    return motor.faixas('length', [limite * 1000 for limite in FAIXAS_KM], ROTULOS_FAIXAS, filtros)
+
+
+def figura_comprimentos(categoria_count):
+    return px.bar(
+        categoria_count,
+        x=categoria_count.index,
+        y=categoria_count.values,
+        title="Engarrafamentos por comprimento",
+        text_auto=True)
+
+
+# Gráfico de barras ou de pizza de uma contagem por categoria
+def figura_categorias(plot_data, coluna, valores, tipo="Gráfico de Barras"):
+    if tipo == "Gráfico de Pizza":
+        return px.pie(plot_data, names=coluna, values=valores, title="Distribuição de Ocorrências por Categoria")
+    return px.bar(plot_data, x=coluna, y=valores, title="Ocorrências por Categoria", text_auto=True)
+
+
+def mapa_base(centro, **opcoes):
+    mapa = folium.Map(location=centro, zoom_start=6, tiles=None, **opcoes)
+    folium.TileLayer(
+        tiles="https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png",
+        attr='CartoDB © <a href="https://carto.com/">CartoDB</a>',
+        name="CartoDB.DarkMatter"
+    ).add_to(mapa)
+    return mapa
+
+
+# Mapa de calor (alertas já agregados em células, por nível de zoom) ou de pontos
+# (agrupados por zoom, desenhados em canvas); com envelope, só o que está nele
+def camada_alertas(dados, filtros, tipo="Mapa de Calor", envelope=None, zoom=None):
+    if tipo == "Mapa de Calor":
+        return camada_calor(obter_piramide(dados), filtros, envelope, zoom)
+    # Filtros e envelope combinados numa máscara: uma única cópia (nenhuma, sem os dois)
+    mascara = obter_indice(dados).mascara(filtros)
+    if envelope is not None:
+        no_envelope = pontos_no_envelope(dados['Longitude'].to_numpy(), dados['Latitude'].to_numpy(), envelope)
+        mascara = no_envelope if mascara is None else mascara & no_envelope
+    return camada_pontos(dados if mascara is None else dados[mascara])
+
+
+# Camada GeoJSON dos engarrafamentos filtrados (None se não houver nenhum) e os limites deles.
+# Sem envelope, as linhas são simplificadas para o zoom em que os dados cabem no mapa.
+def camada_engarrafamentos_filtrados(dados, filtros, envelope=None, zoom=6):
+    indice = obter_indice(dados)
+    linhas = obter_linhas_simplificadas(dados)
+    posicoes = indice.linhas(filtros)
+    if envelope is not None:
+        posicoes = linhas.no_envelope(posicoes, envelope)
+        filtrados = dados.take(posicoes)
+        limites = None
+    else:
+        filtrados = indice.filtrar(filtros)
+        limites = linhas.limites(posicoes)
+        if limites is not None:
+            zoom = zoom_para_limites(limites, LARGURA_MAPA, ALTURA_MAPA)
+
+    # Convertendo m para km (em uma cópia rasa, para não alterar os dados compartilhados)
+    filtrados = filtrados.copy(deep=False)
+    filtrados['length'] = filtrados['length'] / 1000
+
+    colecao, _ = colecao_engarrafamentos(filtrados, linhas.selecionar(posicoes, zoom))
+    camada = camada_engarrafamentos(colecao) if colecao['features'] else None
+    return camada, limites
+
+
+# Últimas 24 h de cada medida, comparadas com as mesmas horas da semana anterior
+def cards_tendencia(serie, filtros):
+    atual = serie.ultimas_horas(filtros, 24)
+    anterior = serie.ultimas_horas(filtros, 24, deslocamento=HORAS_SEMANA)
+    cards = []
+    for rotulo, (medida, divisor) in MEDIDAS_TENDENCIA.items():
+        valor = atual[medida] / divisor
+        if anterior[medida]:
+            delta = f"{(atual[medida] / anterior[medida] - 1) * 100:+.0f}% em relação à semana anterior"
+        else:
+            delta = "sem dados da semana anterior"
+        cards.append(Card(f"{rotulo} nas últimas 24 h", f"{valor:,.0f}".replace(",", "."), delta))
+    return [cards]
+
+
+# Por hora: as últimas 48 h e as mesmas horas da semana anterior; por dia: os últimos 30 dias
+def figura_tendencia(serie, filtros, rotulo, resolucao="Por hora"):
+    medida, divisor = MEDIDAS_TENDENCIA[rotulo]
+    if resolucao == "Por dia":
+        tabela = serie.serie_diaria(filtros, 30)
+        dados = pd.DataFrame({'Período': tabela.index, rotulo: tabela[medida].to_numpy() / divisor})
+        return px.bar(dados, x='Período', y=rotulo, title=f"{rotulo} por dia", text_auto=True)
+
+    atual = serie.serie_horaria(filtros, HORAS_GRAFICO)
+    anterior = serie.serie_horaria(filtros, HORAS_GRAFICO, deslocamento=HORAS_SEMANA)
+    dados = pd.DataFrame({
+        'Período': atual.index,
+        'Últimas 48 h': atual[medida].to_numpy() / divisor,
+        'Semana anterior': anterior[medida].to_numpy() / divisor,
+    })
+    fig = px.line(dados, x='Período', y=['Últimas 48 h', 'Semana anterior'], title=f"{rotulo} por hora")
+    fig.update_layout(yaxis_title=rotulo, legend_title_text="")
+    return fig
+
+
+# Trechos da malha viária com mais alertas por km, com os filtros aplicados
+def tabela_trechos_alertas(dados, filtros, malha, quantidade=20):
+    tabela = densidade_por_trecho(malha, obter_ajuste(dados, malha), obter_indice(dados).mascara(filtros),
+                                  rotulo='Alertas')
+    return tabela.head(quantidade).round(2)
+
+
+# Trechos mais congestionados: km de engarrafamento por km de trecho
+def tabela_trechos_engarrafamentos(dados, filtros, malha, quantidade=20):
+    comprimentos = dados['length'].to_numpy(dtype=float) / 1000
+    tabela = densidade_por_trecho(malha, obter_ajuste(dados, malha), obter_indice(dados).mascara(filtros),
+                                  comprimentos, rotulo='Engarrafamentos', rotulo_pesos='Comprimento engarrafado (km)')
+    return tabela.head(quantidade).round(2)
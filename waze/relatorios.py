@@ -0,0 +1,260 @@
+"""Relatórios estáticos do painel, um por regional e um por rodovia.
+
+    python -m waze.relatorios [--saida DIR] [--por regional rodovia] [--processos N]
+                              [--png] [--sem-mapas] [--coletar]
+
+Cada relatório traz, para o recorte, os cards, a "Distribuição por Subtipos de
+Alertas", o gráfico de comprimentos dos engarrafamentos e os mapas, com o mesmo
+conteúdo das páginas do app (ver waze.paineis). Todos saem da mesma cópia em disco
+de cada camada (a última publicada, ver waze.snapshot); com --coletar, as camadas
+são atualizadas antes, como faz o coletor. Os relatórios são gerados em paralelo por
+um pool de processos, e cada processo lê as cópias uma única vez.
+
+Com --png, os gráficos também são gravados como imagem (requer o pacote kaleido).
+"""
+import argparse
+import html
+import importlib.util
+import logging
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from waze import config
+from waze.autenticacao import GerenciadorToken
+from waze.camadas import ALERTAS, CAMADAS, ENGARRAFAMENTOS
+from waze.coletor import credenciais
+from waze.diagnostico import configurar_log, medir
+from waze.metricas import obter_motor
+from waze.paineis import (CENTRO_ALERTAS, CENTRO_ENGARRAFAMENTOS, camada_alertas, camada_engarrafamentos_filtrados,
+                          cards_alertas, cards_engarrafamentos, comprimento_total_km, faixas_comprimento,
+                          figura_comprimentos, figura_subtipos, mapa_base)
+from waze.snapshot import ArmazemSnapshots
+
+# Pelo nome do módulo: com python -m, __name__ seria "__main__", fora do logger "waze"
+logger = logging.getLogger("waze.relatorios")
+
+# Coluna de cada recorte nos alertas e nos engarrafamentos
+RECORTES = {
+    'regional': ('Regional', 'regional'),
+    'rodovia': ('Rodovia', 'rodovia'),
+}
+
+ESTILO = """
+body { font-family: sans-serif; margin: 20px; }
+.titulo { background-color: #002231; color: white; padding: 10px; border-radius: 5px;
+          text-align: center; font-size: 30px; }
+.cards { display: flex; gap: 12px; margin: 12px 0; }
+.card { flex: 1; border: 1px solid #ddd; border-radius: 5px; padding: 8px 12px; }
+.card .rotulo { font-size: 14px; color: #555; }
+.card .valor { font-size: 24px; }
+.card .delta { font-size: 14px; color: #c00; }
+iframe { border: none; }
+"""
+
+# Cópias das camadas no processo (lidas uma vez por processo do pool)
+_dados = {}
+
+
+def carregar_copias(diretorio, entradas):
+    for nome, entrada in entradas.items():
+        if nome not in _dados:
+            _dados[nome] = ArmazemSnapshots(nome, diretorio).carregar(entrada)
+    return _dados
+
+
+def _iniciar_processo(diretorio, entradas):
+    configurar_log()
+    carregar_copias(diretorio, entradas)
+
+
+# Última cópia publicada de cada camada (a mesma para todos os relatórios)
+def ultimas_entradas(diretorio):
+    entradas = {}
+    for camada in CAMADAS:
+        catalogo = ArmazemSnapshots(camada.nome, diretorio).catalogo()
+        if catalogo:
+            entradas[camada.nome] = catalogo[-1]
+    return entradas
+
+
+# Valores do recorte presentes em alguma das camadas, sem os ausentes
+def valores_do_recorte(recorte, dados):
+    valores = set()
+    for camada, coluna in zip((ALERTAS, ENGARRAFAMENTOS), RECORTES[recorte]):
+        valores.update(obter_motor(dados[camada.nome]).opcoes(coluna, {}))
+    valores.discard("None")
+    return sorted(valores)
+
+
+def nome_arquivo(valor):
+    texto = unicodedata.normalize("NFKD", str(valor)).encode("ascii", "ignore").decode()
+    return re.sub(r"[^0-9A-Za-z]+", "-", texto).strip("-").lower() or "sem-nome"
+
+
+def _html_cards(linhas):
+    partes = []
+    for linha in linhas:
+        partes.append('<div class="cards">')
+        for card in linha:
+            delta = f'<div class="delta">{html.escape(card.delta)}</div>' if card.delta else ""
+            partes.append(f'<div class="card"><div class="rotulo">{html.escape(card.rotulo)}</div>'
+                          f'<div class="valor">{html.escape(card.valor)}</div>{delta}</div>')
+        partes.append('</div>')
+    return "\n".join(partes)
+
+
+class Relatorio:
+    """Um arquivo HTML com as seções do recorte; mapas e imagens ficam em arquivos ao lado."""
+
+    def __init__(self, diretorio, base, png=False):
+        self.diretorio = diretorio
+        self.base = base
+        self.png = png
+        self.partes = []
+        self._plotly_incluido = False
+
+    def adicionar(self, conteudo):
+        self.partes.append(conteudo)
+
+    def grafico(self, fig, nome):
+        # O plotly.js vem do CDN, uma vez por relatório
+        with medir("relatorio.grafico"):
+            self.adicionar(fig.to_html(full_html=False, include_plotlyjs=False if self._plotly_incluido else "cdn"))
+            self._plotly_incluido = True
+            if self.png:
+                fig.write_image(os.path.join(self.diretorio, f"{self.base}_{nome}.png"), width=1400, height=600)
+
+    def mapa(self, mapa, nome):
+        arquivo = f"{self.base}_{nome}.html"
+        with medir("relatorio.mapa") as atributos:
+            mapa.save(os.path.join(self.diretorio, arquivo))
+            atributos["bytes"] = os.path.getsize(os.path.join(self.diretorio, arquivo))
+        self.adicionar(f'<iframe src="{arquivo}" width="1400" height="810"></iframe>')
+
+    def gravar(self, titulo):
+        caminho = os.path.join(self.diretorio, self.base + ".html")
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            arquivo.write(f'<!DOCTYPE html>\n<html lang="pt-BR"><head><meta charset="utf-8">'
+                          f'<title>{html.escape(titulo)}</title><style>{ESTILO}</style></head><body>\n'
+                          f'<div class="titulo">{html.escape(titulo)}</div>\n')
+            arquivo.write("\n".join(self.partes))
+            arquivo.write("\n</body></html>\n")
+        return caminho
+
+
+def secao_alertas(relatorio, dados, filtros, mapas):
+    motor = obter_motor(dados)
+    total, cards = cards_alertas(motor, filtros)
+    relatorio.adicionar("<h2>Alertas</h2>")
+    if not total:
+        relatorio.adicionar("<p>Nenhum alerta.</p>")
+        return total
+    relatorio.adicionar(_html_cards(cards))
+    relatorio.grafico(figura_subtipos(motor, filtros), "subtipos")
+    if mapas:
+        mapa = mapa_base(CENTRO_ALERTAS, prefer_canvas=True)
+        camada_alertas(dados, filtros).add_to(mapa)
+        relatorio.mapa(mapa, "mapa_alertas")
+    return total
+
+
+def secao_engarrafamentos(relatorio, dados, filtros, mapas):
+    motor = obter_motor(dados)
+    total, cards = cards_engarrafamentos(motor, filtros)
+    relatorio.adicionar("<h2>Engarrafamentos</h2>")
+    if not total:
+        relatorio.adicionar("<p>Nenhum engarrafamento.</p>")
+        return total
+    relatorio.adicionar(_html_cards(cards))
+    relatorio.adicionar(f"<p><b>Comprimento total dos engarrafamentos:</b> {comprimento_total_km(motor, filtros)} km</p>")
+    relatorio.grafico(figura_comprimentos(faixas_comprimento(motor, filtros)), "comprimentos")
+    if mapas:
+        mapa = mapa_base(CENTRO_ENGARRAFAMENTOS)
+        camada, limites = camada_engarrafamentos_filtrados(dados, filtros)
+        if camada is not None:
+            camada.add_to(mapa)
+        if limites is not None:
+            mapa.fit_bounds(limites)
+        relatorio.mapa(mapa, "mapa_engarrafamentos")
+    return total
+
+
+# Gera o relatório de um valor do recorte; devolve (recorte, valor, arquivo, alertas, engarrafamentos)
+def gerar_relatorio(tarefa, saida, mapas=True, png=False):
+    recorte, valor = tarefa
+    diretorio = os.path.join(saida, recorte)
+    os.makedirs(diretorio, exist_ok=True)
+    coluna_alertas, coluna_engarrafamentos = RECORTES[recorte]
+
+    with medir("relatorio", recorte=recorte, valor=valor):
+        relatorio = Relatorio(diretorio, nome_arquivo(valor), png)
+        alertas = secao_alertas(relatorio, _dados[ALERTAS.nome], {coluna_alertas: valor}, mapas)
+        engarrafamentos = secao_engarrafamentos(
+            relatorio, _dados[ENGARRAFAMENTOS.nome], {coluna_engarrafamentos: valor}, mapas)
+        caminho = relatorio.gravar(f"Waze - Minas Gerais: {valor}")
+    logger.info("%s %s: %d alertas, %d engarrafamentos", recorte, valor, alertas, engarrafamentos)
+    return recorte, valor, os.path.relpath(caminho, saida), alertas, engarrafamentos
+
+
+def gravar_indice(saida, gerados, entradas):
+    linhas = [f'<tr><td>{html.escape(recorte)}</td><td><a href="{html.escape(arquivo)}">{html.escape(str(valor))}</a></td>'
+              f'<td>{alertas}</td><td>{engarrafamentos}</td></tr>'
+              for recorte, valor, arquivo, alertas, engarrafamentos in gerados]
+    copias = ", ".join(f"{nome} de {entrada['criado_em']}" for nome, entrada in entradas.items())
+    caminho = os.path.join(saida, "index.html")
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        arquivo.write(f'<!DOCTYPE html>\n<html lang="pt-BR"><head><meta charset="utf-8">'
+                      f'<title>Relatórios do Waze</title><style>{ESTILO}</style></head><body>\n'
+                      f'<div class="titulo">Relatórios do Waze - Minas Gerais</div>\n'
+                      f'<p>Cópias usadas: {html.escape(copias)}</p>\n'
+                      f'<table><tr><th>Recorte</th><th>Valor</th><th>Alertas</th><th>Engarrafamentos</th></tr>\n')
+        arquivo.write("\n".join(linhas))
+        arquivo.write("\n</table></body></html>\n")
+    return caminho
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Gera os relatórios estáticos por regional e por rodovia.")
+    parser.add_argument("--saida", default="relatorios", help="diretório dos relatórios")
+    parser.add_argument("--por", nargs="+", choices=list(RECORTES), default=list(RECORTES),
+                        help="recortes a gerar (um relatório por valor)")
+    parser.add_argument("--processos", type=int, default=os.cpu_count(), help="processos do pool")
+    parser.add_argument("--png", action="store_true", help="gravar também os gráficos em PNG (requer kaleido)")
+    parser.add_argument("--sem-mapas", action="store_true", help="não gerar os mapas")
+    parser.add_argument("--coletar", action="store_true", help="atualizar as camadas antes de gerar")
+    argumentos = parser.parse_args(argumentos)
+
+    if not config.DIRETORIO_SNAPSHOTS:
+        parser.error("WAZE_SNAPSHOTS está vazio: não há cópias em disco das camadas")
+    if argumentos.png and importlib.util.find_spec("kaleido") is None:
+        parser.error("--png requer o pacote kaleido (pip install kaleido)")
+
+    configurar_log()
+    if argumentos.coletar:
+        tokens = GerenciadorToken(*credenciais())
+        for camada in CAMADAS:
+            camada.sincronizador().atualizar(tokens)
+
+    entradas = ultimas_entradas(config.DIRETORIO_SNAPSHOTS)
+    faltando = [camada.nome for camada in CAMADAS if camada.nome not in entradas]
+    if faltando:
+        parser.error(f"Sem cópia em disco de {', '.join(faltando)}: rode o coletor (ou use --coletar)")
+
+    dados = carregar_copias(config.DIRETORIO_SNAPSHOTS, entradas)
+    tarefas = [(recorte, valor) for recorte in argumentos.por for valor in valores_do_recorte(recorte, dados)]
+    logger.info("%d relatórios em %d processos", len(tarefas), argumentos.processos)
+
+    os.makedirs(argumentos.saida, exist_ok=True)
+    gerar = partial(gerar_relatorio, saida=argumentos.saida, mapas=not argumentos.sem_mapas, png=argumentos.png)
+    with medir("relatorios", quantidade=len(tarefas)), \
+            ProcessPoolExecutor(argumentos.processos, initializer=_iniciar_processo,
+                                initargs=(config.DIRETORIO_SNAPSHOTS, entradas)) as executor:
+        gerados = list(executor.map(gerar, tarefas))
+    logger.info("Índice em %s", gravar_indice(argumentos.saida, gerados, entradas))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import logging
+import threading
+import weakref
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from waze import config
+from waze.diagnostico import cronometrado
+from waze.snapshot import ArmazemSnapshots
+
+logger = logging.getLogger(__name__)
+
+HORA_MS = 3600_000
+DIA_MS = 24 * HORA_MS
+# Horário de Brasília (sem horário de verão): as horas e os dias seguem o relógio local
+FUSO_MS = -3 * HORA_MS
+
+# Dimensões dos filtros da página de engarrafamentos e medidas acumuladas por período
+DIMENSOES_SERIE = ('level', 'regional', 'rodovia')
+MEDIDAS = ('contagem', 'comprimento', 'atraso')
+
+# Horas do gráfico de tendência e recuo até as mesmas horas da semana anterior; o anel
+# horário guarda tudo o que o gráfico lê: as últimas 48 h e as 48 h de uma semana antes
+HORAS_GRAFICO = 48
+HORAS_SEMANA = 7 * 24
+HORAS_GUARDADAS = HORAS_GRAFICO + HORAS_SEMANA
+DIAS_GUARDADOS = 35
+
+
+class Anel:
+    """Totais de cada medida nos últimos `tamanho` períodos (horas ou dias), por coluna.
+
+    O período p ocupa a posição p % tamanho e a posição é zerada quando um período
+    mais novo a reaproveita: nada é recalculado sobre o histórico. Ler um período é O(1).
+    """
+
+    def __init__(self, periodo_ms, tamanho, capacidade=64):
+        self.periodo_ms = periodo_ms
+        self.tamanho = tamanho
+        self.periodos = np.full(tamanho, -1, dtype=np.int64)  # período guardado em cada posição
+        self.valores = np.zeros((len(MEDIDAS), tamanho, capacidade))
+        self.ultimo = None  # período mais recente recebido
+
+    def periodo(self, instantes_ms):
+        return (np.asarray(instantes_ms, dtype=np.int64) + FUSO_MS) // self.periodo_ms
+
+    def inicio_ms(self, periodos):
+        return np.asarray(periodos, dtype=np.int64) * self.periodo_ms - FUSO_MS
+
+    def _garantir_colunas(self, quantidade):
+        capacidade = self.valores.shape[2]
+        if quantidade > capacidade:
+            valores = np.zeros((len(MEDIDAS), self.tamanho, max(quantidade, 2 * capacidade)))
+            valores[:, :, :capacidade] = self.valores
+            self.valores = valores
+
+    # Libera as posições dos períodos entre o último recebido e `periodo`
+    def _avancar(self, periodo):
+        if self.ultimo is not None and periodo <= self.ultimo:
+            return
+        inicio = periodo - self.tamanho + 1
+        if self.ultimo is not None:
+            inicio = max(inicio, self.ultimo + 1)
+        novos = np.arange(inicio, periodo + 1)
+        posicoes = novos % self.tamanho
+        self.valores[:, posicoes, :] = 0
+        self.periodos[posicoes] = novos
+        self.ultimo = periodo
+
+    # Soma as medidas (uma linha por medida) de cada registro no seu período e coluna;
+    # registros mais antigos que o anel são ignorados
+    def adicionar(self, periodos, colunas, medidas, quantidade_colunas):
+        if len(periodos) == 0:
+            return
+        self._garantir_colunas(quantidade_colunas)
+        self._avancar(int(periodos.max()))
+        guardados = periodos > self.ultimo - self.tamanho
+        posicoes = periodos[guardados] % self.tamanho
+        for i in range(len(MEDIDAS)):
+            np.add.at(self.valores[i], (posicoes, colunas[guardados]), medidas[i][guardados])
+
+    def valor(self, periodo, coluna):
+        posicao = periodo % self.tamanho
+        if coluna is None or self.periodos[posicao] != periodo:
+            return np.zeros(len(MEDIDAS))
+        return self.valores[:, posicao, coluna].copy()
+
+    # Valores (medida x período) dos `quantidade` períodos que terminam em `fim`; períodos que
+    # já saíram do anel não são lidos como zero
+    def janela(self, fim, quantidade, coluna):
+        if fim - quantidade + 1 <= self.ultimo - self.tamanho:
+            raise ValueError(f"Janela de {quantidade} períodos até {self.ultimo - fim} atrás não cabe "
+                             f"nos {self.tamanho} períodos guardados")
+        periodos = np.arange(fim - quantidade + 1, fim + 1)
+        posicoes = periodos % self.tamanho
+        valores = np.zeros((len(MEDIDAS), quantidade))
+        if coluna is not None:
+            guardados = self.periodos[posicoes] == periodos
+            valores[:, guardados] = self.valores[:, posicoes[guardados], coluna]
+        return periodos, valores
+
+
+class SerieEngarrafamentos:
+    """Quantidade, comprimento (m) e atraso (s) dos engarrafamentos por hora e por dia,
+    para qualquer combinação de filtros de nível, regional e rodovia.
+
+    Cada engarrafamento entra uma única vez, no período do seu pubmillis, na primeira
+    versão dos dados em que aparece; cada nova versão só processa os registros novos.
+    As consultas vão direto à coluna da combinação de filtros, sem percorrer registros.
+    """
+
+    def __init__(self, dimensoes=DIMENSOES_SERIE, coluna_id='objectid', coluna_instante='pubmillis',
+                 horas=HORAS_GUARDADAS, dias=DIAS_GUARDADOS):
+        self.dimensoes = tuple(sorted(dimensoes))
+        self.coluna_id = coluna_id
+        self.coluna_instante = coluna_instante
+        self.horas = Anel(HORA_MS, horas)
+        self.dias = Anel(DIA_MS, dias)
+        self._colunas = {}  # combinação de filtros -> coluna dos anéis
+        self._vistos = {}  # id -> dia em que o engarrafamento começou
+        self._ultimos_dados = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def chave(filtros):
+        return tuple(sorted((filtros or {}).items()))
+
+    def _coluna(self, chave):
+        coluna = self._colunas.get(chave)
+        if coluna is None:
+            coluna = self._colunas[chave] = len(self._colunas)
+        return coluna
+
+    # Posições dos registros e colunas em que cada um soma: uma por combinação das dimensões,
+    # do total (sem filtro) à combinação de todas
+    def _distribuir(self, novos):
+        posicoes, colunas = [], []
+        for tamanho in range(len(self.dimensoes) + 1):
+            for grupo in combinations(self.dimensoes, tamanho):
+                if not grupo:
+                    numeros = np.zeros(len(novos), dtype=np.int64)
+                    chaves = [()]
+                else:
+                    agrupados = novos.groupby(list(grupo), observed=True)
+                    # Registros sem valor em alguma das dimensões ficam fora (-1)
+                    numeros = agrupados.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+                    indice = agrupados.size().index
+                    chaves = [tuple(zip(grupo, valores if len(grupo) > 1 else (valores,))) for valores in indice]
+                colunas_grupo = np.array([self._coluna(chave) for chave in chaves], dtype=np.int64)
+                com_valor = numeros >= 0
+                posicoes.append(np.flatnonzero(com_valor))
+                colunas.append(colunas_grupo[numeros[com_valor]])
+        return np.concatenate(posicoes), np.concatenate(colunas)
+
+    # Acrescenta os engarrafamentos ainda não vistos; devolve quantos entraram
+    @cronometrado("series.atualizar")
+    def atualizar(self, dados):
+        with self._lock:
+            if self._ultimos_dados is not None and self._ultimos_dados() is dados:
+                return 0
+            self._ultimos_dados = weakref.ref(dados)
+            if self.coluna_instante not in dados:
+                return 0  # Cópia anterior ao campo na preparação dos dados
+
+            novos = dados[~dados[self.coluna_id].isin(self._vistos.keys()) & dados[self.coluna_instante].notna()]
+            if novos.empty:
+                return 0
+
+            instantes = novos[self.coluna_instante].to_numpy(dtype=np.int64)
+            medidas = np.vstack([
+                np.ones(len(novos)),
+                novos['length'].fillna(0).to_numpy(dtype=np.float64),
+                novos['delay'].clip(lower=0).fillna(0).to_numpy(dtype=np.float64),  # -1: via bloqueada
+            ])
+            posicoes, colunas = self._distribuir(novos)
+            for anel in (self.horas, self.dias):
+                anel.adicionar(anel.periodo(instantes)[posicoes], colunas, medidas[:, posicoes], len(self._colunas))
+
+            dias = self.dias.periodo(instantes)
+            self._vistos.update(zip(novos[self.coluna_id].tolist(), dias.tolist()))
+            self._esquecer_antigos()
+            return len(novos)
+
+    # Ids dos engarrafamentos que já saíram do anel diário não precisam mais ser lembrados
+    def _esquecer_antigos(self):
+        limite = self.dias.ultimo - self.dias.tamanho
+        if min(self._vistos.values(), default=limite + 1) <= limite:
+            self._vistos = {id_: dia for id_, dia in self._vistos.items() if dia > limite}
+
+    def _valores(self, medidas):
+        return dict(zip(MEDIDAS, medidas.tolist()))
+
+    # Totais de uma hora (instante em ms), em O(1)
+    def hora(self, instante_ms, filtros=None):
+        with self._lock:
+            periodo = int(self.horas.periodo(instante_ms))
+            return self._valores(self.horas.valor(periodo, self._colunas.get(self.chave(filtros))))
+
+    # Totais das `horas` horas até a mais recente recebida, recuadas `deslocamento` horas
+    # (168 para as mesmas horas da semana anterior)
+    def ultimas_horas(self, filtros=None, horas=24, deslocamento=0):
+        with self._lock:
+            if self.horas.ultimo is None:
+                return self._valores(np.zeros(len(MEDIDAS)))
+            _, valores = self.horas.janela(self.horas.ultimo - deslocamento, horas,
+                                           self._colunas.get(self.chave(filtros)))
+            return self._valores(valores.sum(axis=1))
+
+    def _tabela(self, anel, filtros, quantidade, deslocamento):
+        with self._lock:
+            if anel.ultimo is None:
+                return pd.DataFrame(columns=list(MEDIDAS))
+            periodos, valores = anel.janela(anel.ultimo - deslocamento, quantidade,
+                                            self._colunas.get(self.chave(filtros)))
+        inicio = pd.to_datetime(anel.inicio_ms(periodos), unit='ms', utc=True).tz_convert('America/Sao_Paulo')
+        return pd.DataFrame(valores.T, index=inicio.rename('Período'), columns=list(MEDIDAS))
+
+    # Uma linha por hora (início da hora, no horário local), com as medidas nas colunas
+    def serie_horaria(self, filtros=None, horas=HORAS_GRAFICO, deslocamento=0):
+        return self._tabela(self.horas, filtros, horas, deslocamento)
+
+    def serie_diaria(self, filtros=None, dias=30):
+        return self._tabela(self.dias, filtros, dias, 0)
+
+
+# Passa pela série as cópias da camada guardadas em disco (waze.snapshot), da mais antiga à
+# mais recente: um processo novo parte do histórico que ainda está lá. Devolve quantos entraram.
+@cronometrado("series.semear")
+def semear(serie, nome, diretorio=None):
+    diretorio = config.DIRETORIO_SNAPSHOTS if diretorio is None else diretorio
+    if not diretorio:
+        return 0
+    armazem = ArmazemSnapshots(nome, diretorio)
+    total = 0
+    for entrada in armazem.catalogo():
+        try:
+            dados = armazem.carregar(entrada)
+        except (OSError, ValueError, pa.ArrowException) as erro:
+            logger.warning("Erro ao ler a cópia %s de %s: %s", entrada.get("arquivo"), nome, erro)
+            continue
+        total += serie.atualizar(dados)
+    return total
+
+
+# Uma série por camada, semeada com as cópias em disco e acumulada pelo processo enquanto ele estiver no ar
+_series = {}
+_series_lock = threading.Lock()
+
+
+def obter_serie(nome):
+    with _series_lock:
+        if nome not in _series:
+            serie = SerieEngarrafamentos()
+            semear(serie, nome)
+            _series[nome] = serie
+        return _series[nome]
@@ -0,0 +1,151 @@
+import math
+import threading
+import weakref
+
+import numpy as np
+
+from waze.cache import por_dataframe
+from waze.diagnostico import cronometrado, medir
+from waze.geometria import decodificar_linhas
+from waze.vista import caixas_no_envelope
+
+# Zooms com uma versão simplificada das linhas; a tolerância de cada uma é um pixel nesse zoom
+ZOOMS_LINHAS = (6, 9, 12, 15)
+
+
+# Tamanho (em graus) de um pixel do Leaflet no zoom dado
+def tolerancia(zoom):
+    return 360 / (256 * 2 ** zoom)
+
+
+# Douglas-Peucker em todas as linhas ao mesmo tempo: a cada passada, todos os trechos
+# ainda abertos de todas as linhas são divididos no ponto mais distante, se passar da tolerância
+def simplificar(coordenadas, offsets, tolerancia):
+    manter = np.zeros(len(coordenadas), dtype=bool)
+    tamanhos = np.diff(offsets)
+    com_pontos = tamanhos > 0
+    manter[offsets[:-1][com_pontos]] = True
+    manter[offsets[1:][com_pontos] - 1] = True
+
+    inicio = offsets[:-1][tamanhos > 2]
+    fim = offsets[1:][tamanhos > 2] - 1
+    while len(inicio):
+        internos = fim - inicio - 1
+        primeiros = np.cumsum(internos) - internos
+        trecho = np.repeat(np.arange(len(inicio)), internos)
+        indices = np.arange(len(trecho)) - primeiros[trecho] + inicio[trecho] + 1
+
+        # Distância de cada ponto interno ao segmento entre as pontas do seu trecho
+        a, b, p = coordenadas[inicio[trecho]], coordenadas[fim[trecho]], coordenadas[indices]
+        ab = b - a
+        comprimento = (ab * ab).sum(axis=1)
+        t = np.clip(((p - a) * ab).sum(axis=1) / np.where(comprimento > 0, comprimento, 1), 0, 1)
+        distancias = np.hypot(*(p - a - t[:, None] * ab).T)
+
+        maximos = np.maximum.reduceat(distancias, primeiros)
+        # Primeiro ponto que atinge o máximo de cada trecho
+        candidatos = np.flatnonzero(distancias == maximos[trecho])
+        _, primeiro = np.unique(trecho[candidatos], return_index=True)
+        divisao = indices[candidatos[primeiro]]
+
+        dividir = maximos > tolerancia
+        manter[divisao[dividir]] = True
+        inicio = np.concatenate([inicio[dividir], divisao[dividir]])
+        fim = np.concatenate([divisao[dividir], fim[dividir]])
+        abertos = fim - inicio > 1
+        inicio, fim = inicio[abertos], fim[abertos]
+
+    acumulado = np.zeros(len(coordenadas) + 1, dtype=np.int64)
+    np.cumsum(manter, out=acumulado[1:])
+    return coordenadas[manter], acumulado[offsets]
+
+
+# Zoom em que os limites [[sul, oeste], [norte, leste]] cabem num mapa de largura x altura pixels
+def zoom_para_limites(limites, largura, altura, zoom_maximo=18):
+    (sul, oeste), (norte, leste) = limites
+
+    def mercator(latitude):
+        return math.log(math.tan(math.pi / 4 + math.radians(latitude) / 2))
+
+    fracao_x = (leste - oeste) / 360
+    fracao_y = (mercator(norte) - mercator(sul)) / (2 * math.pi)
+    zooms = [zoom_maximo]
+    if fracao_x > 0:
+        zooms.append(math.log2(largura / 256 / fracao_x))
+    if fracao_y > 0:
+        zooms.append(math.log2(altura / 256 / fracao_y))
+    return max(0, min(zoom_maximo, math.floor(min(zooms))))
+
+
+class LinhasSimplificadas:
+    """Linhas de um DataFrame (coluna `line`) com uma versão simplificada por zoom.
+
+    As versões são calculadas uma vez, sob demanda, e reaproveitadas para qualquer
+    filtro; também guarda a caixa envolvente de cada linha.
+    """
+
+    @cronometrado("simplificacao.linhas")
+    def __init__(self, dados, coluna='line', zooms=ZOOMS_LINHAS):
+        self._dados = weakref.ref(dados)
+        self.zooms = list(zooms)
+        self.coordenadas, self.offsets = decodificar_linhas(dados[coluna])
+        self._variantes = {}
+        self._lock = threading.Lock()
+
+        # Caixa (oeste, sul, leste, norte) de cada linha; NaN nas linhas sem pontos
+        tamanhos = np.diff(self.offsets)
+        com_pontos = tamanhos > 0
+        self.caixas = np.full((len(tamanhos), 4), np.nan)
+        if com_pontos.any():
+            inicios = self.offsets[:-1][com_pontos]
+            self.caixas[com_pontos, :2] = np.minimum.reduceat(self.coordenadas, inicios)
+            self.caixas[com_pontos, 2:] = np.maximum.reduceat(self.coordenadas, inicios)
+
+    # Versão mais detalhada entre as que não passam do zoom pedido
+    def zoom_da_variante(self, zoom):
+        return max([candidato for candidato in self.zooms if candidato <= zoom] or [self.zooms[0]])
+
+    def variante(self, zoom):
+        zoom = self.zoom_da_variante(zoom)
+        with self._lock:
+            if zoom not in self._variantes:
+                with medir("simplificacao.variante", zoom=zoom):
+                    coordenadas, offsets = simplificar(self.coordenadas, self.offsets, tolerancia(zoom))
+                # 5 casas (~1 m) ficam abaixo da tolerância de qualquer versão e encurtam o JSON
+                self._variantes[zoom] = coordenadas.round(5), offsets
+            return self._variantes[zoom]
+
+    # Limites [[sul, oeste], [norte, leste]] das linhas nas posições dadas, ou None
+    def limites(self, posicoes):
+        caixas = self.caixas[posicoes]
+        caixas = caixas[~np.isnan(caixas[:, 0])]
+        if not len(caixas):
+            return None
+        oeste, sul = caixas[:, :2].min(axis=0)
+        leste, norte = caixas[:, 2:].max(axis=0)
+        return [[float(sul), float(oeste)], [float(norte), float(leste)]]
+
+    # Posições (entre as dadas) cujas linhas tocam o envelope
+    def no_envelope(self, posicoes, envelope):
+        posicoes = np.asarray(posicoes, dtype=np.int64)
+        return posicoes[caixas_no_envelope(self.caixas[posicoes], envelope)]
+
+    # Coordenadas e offsets (como decodificar_linhas) das linhas nas posições dadas, na versão do zoom
+    def selecionar(self, posicoes, zoom):
+        coordenadas, offsets = self.variante(zoom)
+        posicoes = np.asarray(posicoes, dtype=np.int64)
+        if len(posicoes) == len(offsets) - 1 and (posicoes == np.arange(len(posicoes))).all():
+            return coordenadas, offsets
+
+        inicios = offsets[posicoes]
+        tamanhos = offsets[posicoes + 1] - inicios
+        novos_offsets = np.zeros(len(posicoes) + 1, dtype=np.int64)
+        np.cumsum(tamanhos, out=novos_offsets[1:])
+        indices = np.repeat(inicios - novos_offsets[:-1], tamanhos) + np.arange(novos_offsets[-1])
+        return coordenadas[indices], novos_offsets
+
+
+# Uma instância por DataFrame em uso; some junto com o DataFrame
+@por_dataframe
+def obter_linhas_simplificadas(dados):
+    return LinhasSimplificadas(dados)
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import pyarrow as pa
+from pyarrow import feather
+
+from waze import config
+
+
+class ArmazemSnapshots:
+    """Cópias em disco (Feather) de uma camada, com um catálogo datado por camada.
+
+    Sem compressão, o arquivo mais recente é lido por memory-map sem cópia;
+    com compressão (padrão), ocupa menos disco e ainda evita o JSON do servidor.
+    """
+
+    def __init__(self, nome, diretorio=config.DIRETORIO_SNAPSHOTS,
+                 compressao=config.COMPRESSAO_SNAPSHOT, manter=config.SNAPSHOTS_MANTER):
+        self.diretorio = os.path.join(diretorio, nome)
+        self.compressao = compressao
+        self.manter = manter
+        self._arquivo_catalogo = os.path.join(self.diretorio, "catalogo.json")
+
+    def catalogo(self):
+        try:
+            with open(self._arquivo_catalogo, encoding="utf-8") as arquivo:
+                return json.load(arquivo)
+        except FileNotFoundError:
+            return []
+
+    def salvar(self, dados, **metadados):
+        os.makedirs(self.diretorio, exist_ok=True)
+        criado_em = datetime.now(timezone.utc)
+        nome_arquivo = f"{criado_em:%Y%m%dT%H%M%S%fZ}.feather"
+        caminho = os.path.join(self.diretorio, nome_arquivo)
+
+        tabela = pa.Table.from_pandas(dados, preserve_index=False)
+        feather.write_feather(tabela, caminho + ".tmp", compression=self.compressao)
+        os.replace(caminho + ".tmp", caminho)
+
+        entrada = {
+            "arquivo": nome_arquivo,
+            "criado_em": criado_em.isoformat(),
+            "registros": len(dados),
+            "bytes": os.path.getsize(caminho),
+            **metadados,
+        }
+        catalogo = self.catalogo() + [entrada]
+
+        # Limitar o histórico, se configurado (0 mantém tudo)
+        if self.manter and len(catalogo) > self.manter:
+            for antiga in catalogo[:-self.manter]:
+                try:
+                    os.remove(os.path.join(self.diretorio, antiga["arquivo"]))
+                except FileNotFoundError:
+                    pass
+            catalogo = catalogo[-self.manter:]
+
+        self._gravar_catalogo(catalogo)
+        return entrada
+
+    # Muda a cada publicação, já que o catálogo é sempre regravado por inteiro; None se ainda não há
+    def versao(self):
+        try:
+            estado = os.stat(self._arquivo_catalogo)
+            return estado.st_mtime_ns, estado.st_size
+        except FileNotFoundError:
+            return None
+
+    def carregar(self, entrada):
+        caminho = os.path.join(self.diretorio, entrada["arquivo"])
+        tabela = feather.read_table(caminho, memory_map=True)
+        # split_blocks evita juntar as colunas numéricas (e copiá-las) num único bloco
+        return tabela.to_pandas(split_blocks=True)
+
+    def ultimo(self):
+        catalogo = self.catalogo()
+        if not catalogo:
+            return None, None
+        entrada = catalogo[-1]
+        return self.carregar(entrada), entrada
+
+    def _gravar_catalogo(self, catalogo):
+        temporario = self._arquivo_catalogo + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(catalogo, arquivo, ensure_ascii=False, indent=1)
+        os.replace(temporario, self._arquivo_catalogo)
+
+
+class LeitorSnapshots:
+    """Última cópia publicada de uma camada, relida só quando o catálogo muda.
+
+    Enquanto nada novo é publicado, devolve sempre o mesmo DataFrame (e, com ele,
+    os índices e agregados já montados sobre ele).
+    """
+
+    def __init__(self, nome, diretorio=config.DIRETORIO_SNAPSHOTS):
+        self.armazem = ArmazemSnapshots(nome, diretorio)
+        self.dados = None
+        self.entrada = None
+        self._versao_catalogo = None
+        self._lock = threading.Lock()
+
+    def atual(self):
+        with self._lock:
+            versao = self.armazem.versao()
+            if versao is None or versao == self._versao_catalogo:
+                return self.dados, self.entrada
+
+            catalogo = self.armazem.catalogo()
+            if catalogo and (self.entrada is None or catalogo[-1]["arquivo"] != self.entrada["arquivo"]):
+                self.dados = self.armazem.carregar(catalogo[-1])
+                self.entrada = catalogo[-1]
+            self._versao_catalogo = versao
+            return self.dados, self.entrada
+
+
+_leitores = {}
+_leitores_lock = threading.Lock()
+
+
+def obter_leitor(nome):
+    with _leitores_lock:
+        if nome not in _leitores:
+            _leitores[nome] = LeitorSnapshots(nome)
+        return _leitores[nome]
+
+
+def idade_segundos(entrada):
+    criado_em = datetime.fromisoformat(entrada["criado_em"])
+    return (datetime.now(timezone.utc) - criado_em).total_seconds()
@@ -0,0 +1,184 @@
+import logging
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+import pyarrow as pa
+
+from waze import config
+from waze.arcgis import baixar_camada, listar_ids
+from waze.cache import chave_camada
+from waze.diagnostico import medir
+from waze.normalizacao import concatenar
+from waze.snapshot import ArmazemSnapshots, idade_segundos
+
+logger = logging.getLogger(__name__)
+
+
+class SincronizadorCamada:
+    """Mantém uma cópia da camada e busca no servidor só o que mudou desde a última vez.
+
+    `preparar` recebe as colunas baixadas (campo -> array) e devolve o DataFrame já tratado;
+    `coluna_id` é o nome da coluna do objectid nesse DataFrame. Com `nome`, cada versão
+    é gravada em disco e o processo, ao reiniciar, parte da última gravada.
+    """
+
+    def __init__(self, url, campos, preparar, coluna_id="objectid", campo_edicao="last_edited_date",
+                 incremental=config.SYNC_INCREMENTAL, nome=None):
+        self.url = url
+        self.campos = list(campos)
+        self.preparar = preparar
+        self.coluna_id = coluna_id
+        self.campo_edicao = campo_edicao
+        self.incremental = incremental
+        self.nome = nome or url
+        self.dados = None
+
+        # Marcas d'água: maior objectid e maior data de edição já recebidos
+        self._max_objectid = None
+        self._max_edicao = None
+        self._lock = threading.Lock()
+
+        # O campo de controle precisa vir na consulta, mesmo que o painel não o use
+        if campo_edicao and campo_edicao not in self.campos:
+            self.campos.append(campo_edicao)
+        if "objectid" not in self.campos:
+            self.campos.append("objectid")
+
+        self.armazem = ArmazemSnapshots(nome) if nome and config.DIRETORIO_SNAPSHOTS else None
+
+    def atualizar(self, tokens):
+        with self._lock, medir("sync.atualizar", camada=self.nome) as etapa:
+            if self.dados is None and self.armazem is not None and self._aquecer():
+                etapa.update(modo="disco", registros=len(self.dados))
+                return self.dados
+
+            anteriores = self.dados
+            if self.dados is None or not self.incremental:
+                etapa["modo"] = "completa"
+                self._carga_completa(tokens)
+            else:
+                etapa["modo"] = "incremental"
+                self._carga_incremental(tokens)
+            etapa["registros"] = len(self.dados)
+
+            # Uma carga completa (ou um delta que se desfez) com o mesmo conteúdo mantém o objeto anterior
+            if anteriores is not None and self.dados is not anteriores and self.dados.equals(anteriores):
+                self.dados = anteriores
+            etapa["mudou"] = self.dados is not anteriores
+
+            # Só uma versão nova vai para o disco
+            if self.armazem is not None and self.dados is not anteriores:
+                self._salvar()
+            return self.dados
+
+    def _preparar(self, colunas):
+        with medir("sync.preparar", camada=self.nome, registros=len(colunas["objectid"])):
+            return self.preparar(colunas)
+
+    # Parte da última cópia em disco; devolve True se ela ainda estiver dentro do TTL
+    def _aquecer(self):
+        try:
+            dados, entrada = self.armazem.ultimo()
+        except (OSError, ValueError, pa.ArrowException) as erro:
+            logger.warning("Erro ao ler a cópia em disco de %s: %s", self.nome, erro)
+            return False
+        if dados is None or entrada.get("campos") != self.campos:
+            return False
+
+        self.dados = dados
+        self._max_objectid = entrada.get("max_objectid")
+        self._max_edicao = entrada.get("max_edicao")
+        return idade_segundos(entrada) < config.CACHE_TTL
+
+    def _salvar(self):
+        try:
+            with medir("snapshot.salvar", camada=self.nome) as etapa:
+                entrada = self.armazem.salvar(self.dados, campos=self.campos,
+                                              max_objectid=self._max_objectid, max_edicao=self._max_edicao)
+                etapa["bytes"] = entrada["bytes"]
+        except (OSError, pa.ArrowException) as erro:
+            # Falha no disco não deve derrubar o painel
+            logger.warning("Erro ao gravar a cópia em disco de %s: %s", self.nome, erro)
+
+    def _carga_completa(self, tokens):
+        all_data = baixar_camada(self.url, self.campos, tokens)
+        self.dados = self._preparar(all_data)
+        self._max_objectid = None
+        self._max_edicao = None
+        self._avancar_marcas(all_data)
+        return self.dados
+
+    def _carga_incremental(self, tokens):
+        # Primeiro os ids vivos: registros criados depois disso chegam no delta e são mantidos
+        ids_vivos = set(listar_ids(self.url, tokens))
+        delta = self._sem_recebidos(baixar_camada(self.url, self.campos, tokens, where=self._where_delta()))
+
+        ids_delta = set(delta["objectid"].tolist())
+        conhecidos = set(self.dados[self.coluna_id])
+        # Ids que não conhecemos e que o delta não trouxe (ex.: camada recarregada no servidor)
+        if ids_vivos - conhecidos - ids_delta:
+            return self._carga_completa(tokens)
+
+        # Remover excluídos e versões antigas dos registros alterados
+        ids_mantidos = ids_vivos - ids_delta
+        atuais = self.dados[self.dados[self.coluna_id].isin(ids_mantidos)]
+        if ids_delta:
+            atuais = concatenar(atuais, self._preparar(delta))
+        elif len(atuais) == len(self.dados):
+            return self.dados  # Nada mudou: manter o mesmo objeto
+
+        self.dados = atuais.reset_index(drop=True)
+        self._avancar_marcas(delta)
+        return self.dados
+
+    def _where_delta(self):
+        condicoes = []
+        if self._max_objectid is not None:
+            condicoes.append(f"objectid > {self._max_objectid}")
+        if self.campo_edicao and self._max_edicao is not None:
+            # >= para não perder edições feitas no mesmo segundo da marca
+            instante = datetime.fromtimestamp(self._max_edicao / 1000, tz=timezone.utc)
+            condicoes.append(f"{self.campo_edicao} >= TIMESTAMP '{instante:%Y-%m-%d %H:%M:%S}'")
+        return " OR ".join(condicoes) or "1=1"
+
+    # O >= da consulta (a data vai só até o segundo) sempre traz de volta os registros da marca.
+    # Ficam de fora os que já temos, editados até a marca (em milissegundos): só sobra o que mudou.
+    def _sem_recebidos(self, delta):
+        if not self.campo_edicao or self._max_edicao is None or len(delta["objectid"]) == 0:
+            return delta
+        edicoes = np.asarray(delta[self.campo_edicao], dtype=np.float64)
+        recebidos = (edicoes <= self._max_edicao) & np.isin(delta["objectid"], self.dados[self.coluna_id].to_numpy())
+        if not recebidos.any():
+            return delta
+        return {campo: coluna[~recebidos] for campo, coluna in delta.items()}
+
+    def _avancar_marcas(self, colunas):
+        self._max_objectid = _maximo(colunas.get("objectid"), self._max_objectid)
+        if self.campo_edicao:
+            self._max_edicao = _maximo(colunas.get(self.campo_edicao), self._max_edicao)
+
+
+# Maior valor entre a marca atual e a coluna (ignorando ausentes), como int
+def _maximo(coluna, atual):
+    if coluna is None or len(coluna) == 0:
+        return atual
+    valores = np.asarray(coluna, dtype=np.float64)
+    valores = valores[~np.isnan(valores)]
+    if len(valores) == 0:
+        return atual
+    maior = int(valores.max())
+    return maior if atual is None or maior > atual else atual
+
+
+# Um sincronizador por camada + campos, compartilhado pelo processo
+_sincronizadores = {}
+_sincronizadores_lock = threading.Lock()
+
+
+def obter_sincronizador(url, campos, preparar, **kwargs):
+    chave = chave_camada(url, campos)
+    with _sincronizadores_lock:
+        if chave not in _sincronizadores:
+            _sincronizadores[chave] = SincronizadorCamada(url, campos, preparar, **kwargs)
+        return _sincronizadores[chave]
@@ -0,0 +1,52 @@
+# Traduções dos códigos do Waze exibidos no painel
+
+traducao = {
+    'ACIDENT_MINOR': 'Acidente Menor',
+    'ACCIDENT_MAJOR': 'Acidente Maior',
+    'NO_SUBTYPE': 'Sem Subtipo',
+    'JAM_MODERATE_TRAFFIC': 'Tráfego Moderado',
+    'JAM_HEAVY_TRAFFIC': 'Tráfego Intenso',
+    'JAM_STAND_STILL_TRAFFIC': 'Tráfego Parado',
+    'JAM_LIGHT_TRAFFIC': 'Tráfego Leve',
+    'HAZARD_ON_ROAD': 'Perigo na Estrada',
+    'HAZARD_ON_SHOULDER': 'Perigo no Acostamento',
+    'HAZARD_WEATHER': 'Condições Climáticas Adversas',
+    'HAZARD_ON_ROAD_OBJECT': 'Objeto na Estrada',
+    'HAZARD_ON_ROAD_POT_HOLE': 'Buraco na Estrada',
+    'HAZARD_ON_ROAD_ROAD_KILL': 'Animal Morto na Estrada',
+    'HAZARD_ON_SHOULDER_CAR_STOPPED': 'Carro Parado no Acostamento',
+    'HAZARD_ON_SHOULDER_ANIMALS': 'Animais no Acostamento',
+    'HAZARD_ON_SHOULDER_MISSING_SIGN': 'Placa Faltando no Acostamento',
+    'HAZARD_WEATHER_FOG': 'Nevoeiro',
+    'HAZARD_WEATHER_HAIL': 'Granizo',
+    'HAZARD_WEATHER_HEAVY_RAIN': 'Chuva Intensa',
+    'HAZARD_WEATHER_HEAVY_SNOW': 'Neve Intensa',
+    'HAZARD_WEATHER_FLOOD': 'Enchente',
+    'HAZARD_WEATHER_MONSOON': 'Monção',
+    'HAZARD_WEATHER_TORNADO': 'Tornado',
+    'HAZARD_WEATHER_HEAT_WAVE': 'Onda de Calor',
+    'HAZARD_WEATHER_HURRICANE': 'Furacão',
+    'HAZARD_WEATHER_FREEZING_RAIN': 'Chuva Congelante',
+    'HAZARD_ON_ROAD_LANE_CLOSED': 'Faixa Fechada na Estrada',
+    'HAZARD_ON_ROAD_OIL': 'Óleo na Estrada',
+    'HAZARD_ON_ROAD_ICE': 'Gelo na Estrada',
+    'HAZARD_ON_ROAD_CONSTRUCTION': 'Obra na Estrada',
+    'HAZARD_ON_ROAD_CAR_STOPPED': 'Carro Parado na Estrada',
+    'HAZARD_ON_ROAD_TRAFFIC_LIGHT_FAULT': 'Semáforo com Defeito',
+    'ROAD_CLOSED_HAZARD': 'Via Fechada por Perigo',
+    'ROAD_CLOSED_CONSTRUCTION': 'Via Fechada por Obras',
+    'ROAD_CLOSED_EVENT': 'Via Fechada por Evento'
+}
+
+traducao_tipo = {
+    'JAM': 'Engarrafamento',
+    'ACCIDENT': 'Acidente',
+    'ROAD_CLOSED': 'Estrada Fechada',
+    'HAZARD': 'Perigo'
+}
+
+traducao_level = {'1': 'Fluxo Livre',
+                  '2': 'Leve',
+                  '3': 'Moderado',
+                  '4': 'Alto',
+                  '5': 'Bloqueado'}
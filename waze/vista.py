@@ -0,0 +1,60 @@
+import math
+
+# Área visível dos mapas interativos, como envelope (oeste, sul, leste, norte) em graus
+
+
+def _mercator(latitude):
+    return math.log(math.tan(math.pi / 4 + math.radians(latitude) / 2))
+
+
+def _latitude(y):
+    return math.degrees(2 * math.atan(math.exp(y)) - math.pi / 2)
+
+
+# Envelope visto por um mapa de largura x altura pixels centrado em `centro` (lat, lon) no zoom dado
+def envelope_inicial(centro, zoom, largura, altura):
+    latitude, longitude = centro
+    graus_por_pixel = 360 / (256 * 2 ** zoom)
+    radianos_por_pixel = 2 * math.pi / (256 * 2 ** zoom)
+    y = _mercator(latitude)
+    return (
+        longitude - largura / 2 * graus_por_pixel,
+        _latitude(y - altura / 2 * radianos_por_pixel),
+        longitude + largura / 2 * graus_por_pixel,
+        _latitude(y + altura / 2 * radianos_por_pixel),
+    )
+
+
+# Envelope a partir do retorno do st_folium ({"bounds": {"_southWest": ..., "_northEast": ...}}), ou None
+def envelope_do_retorno(retorno):
+    limites = (retorno or {}).get("bounds") or {}
+    sudoeste, nordeste = limites.get("_southWest") or {}, limites.get("_northEast") or {}
+    valores = (sudoeste.get("lng"), sudoeste.get("lat"), nordeste.get("lng"), nordeste.get("lat"))
+    if any(valor is None for valor in valores):
+        return None
+    return tuple(float(valor) for valor in valores)
+
+
+# Alarga o envelope em meio bloco de 256 px e o alinha a essa grade: pequenos arrastos
+# caem no mesmo envelope (mesma seleção, mesma entrada de cache)
+def ajustar_envelope(envelope, zoom):
+    passo = 180 / 2 ** zoom
+    oeste, sul, leste, norte = envelope
+    return (
+        max(-180.0, (math.floor(oeste / passo) - 1) * passo),
+        max(-85.0, (math.floor(sul / passo) - 1) * passo),
+        min(180.0, (math.ceil(leste / passo) + 1) * passo),
+        min(85.0, (math.ceil(norte / passo) + 1) * passo),
+    )
+
+
+# Máscara dos pontos (longitude, latitude) dentro do envelope
+def pontos_no_envelope(longitudes, latitudes, envelope):
+    oeste, sul, leste, norte = envelope
+    return (longitudes >= oeste) & (longitudes <= leste) & (latitudes >= sul) & (latitudes <= norte)
+
+
+# Máscara das caixas (oeste, sul, leste, norte) que tocam o envelope
+def caixas_no_envelope(caixas, envelope):
+    oeste, sul, leste, norte = envelope
+    return (caixas[:, 0] <= leste) & (caixas[:, 2] >= oeste) & (caixas[:, 1] <= norte) & (caixas[:, 3] >= sul)